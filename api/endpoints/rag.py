@@ -2,11 +2,12 @@ import os
 import tempfile
 import shutil
 from typing import List, Optional
-from fastapi import APIRouter, File, UploadFile, HTTPException, Query
+from fastapi import APIRouter, File, Form, UploadFile, HTTPException, Query
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
 from core.rag.pipeline import RAGPipeline
+from core.rag.schema import RetrievalFilter
 
 router = APIRouter()
 
@@ -17,22 +18,27 @@ class AskRequest(BaseModel):
     """Request model for ask endpoint"""
     query: str
     doc_ids: Optional[List[str]] = None
+    filters: Optional[RetrievalFilter] = None
     audience: Optional[str] = "general"
 
 class ReportRequest(BaseModel):
     """Request model for report generation"""
     query: Optional[str] = ""
     doc_ids: Optional[List[str]] = None
+    filters: Optional[RetrievalFilter] = None
     style: str = "professional"
     length: str = "medium"
     sections: Optional[List[str]] = None
 
 @router.post("/ingest")
-async def ingest_document(file: UploadFile = File(...)):
+async def ingest_document(file: UploadFile = File(...), source_key: Optional[str] = Form(None)):
     """
     Ingest a document into the RAG system.
     
     Accepts PDF or DOCX files, extracts content, chunks it, and indexes it.
+    Uploading again with the same source_key updates the document in
+    place, embedding only changed chunks. Without a source_key only an
+    identical file is treated as the same document.
     Returns document metadata and ingestion statistics.
     """
     try:
@@ -47,27 +53,37 @@ async def ingest_document(file: UploadFile = File(...)):
                 detail=f"Unsupported file type: {file_ext}. Only PDF and DOCX are supported."
             )
         
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp_file:
-            shutil.copyfileobj(file.file, tmp_file)
-            tmp_path = tmp_file.name
+        # Starlette spools upload bodies over 1 MB to its own temp file. Uploads up to
+        # INGEST_MAX_MEMORY_MB are read into memory so the extractors need no named
+        # file; larger ones are copied to a named temp file
+        max_memory = rag_pipeline.config.ingest_max_memory_mb * 1024 * 1024
+        source = await file.read(max_memory + 1)
+        tmp_path = None
+        if len(source) > max_memory:
+            with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp_file:
+                tmp_file.write(source)
+                shutil.copyfileobj(file.file, tmp_file)
+                tmp_path = tmp_file.name
+            source = tmp_path
         
         try:
             # Ingest document
-            result = rag_pipeline.ingest_document(tmp_path)
+            result = rag_pipeline.ingest_document(source, source_key=source_key, filename=file.filename)
             
             return JSONResponse(content={
                 "message": "Document ingested successfully",
                 "doc_id": result["doc_id"],
+                "source_key": result["source_key"],
                 "title": result["title"],
                 "pages": result["pages"],
                 "chunk_count": result["chunk_count"],
+                "changes": result["changes"],
                 "ingestion_time": result["ingestion_time"]
             })
             
         finally:
             # Clean up temporary file
-            if os.path.exists(tmp_path):
+            if tmp_path and os.path.exists(tmp_path):
                 os.unlink(tmp_path)
                 
     except Exception as e:
@@ -86,15 +102,19 @@ async def ask_question(request: AskRequest):
         
         result = rag_pipeline.ask_question(
             query=request.query,
-            doc_ids=request.doc_ids
+            doc_ids=request.doc_ids,
+            filters=request.filters
         )
         
+        # Retrieval hits become Pydantic models only here, at the API boundary
+        citations = [hit.to_citation() for hit in result["citations"]]
+        
         return JSONResponse(content={
             "query": request.query,
             "answer": result["answer"],
             "confidence": result["confidence"],
-            "citations": [citation.dict() for citation in result["citations"]],
-            "total_sources": len(set(c.doc_id for c in result["citations"]))
+            "citations": [citation.dict() for citation in citations],
+            "total_sources": len(set(c.doc_id for c in citations))
         })
         
     except Exception as e:
@@ -114,13 +134,14 @@ async def generate_report(request: ReportRequest):
             doc_ids=request.doc_ids,
             style=request.style,
             length=request.length,
-            sections=request.sections
+            sections=request.sections,
+            filters=request.filters
         )
         
         return JSONResponse(content={
             "query": result["query"],
             "sections": result["sections"],
-            "citations": [citation.dict() for citation in result["citations"]],
+            "citations": [hit.to_citation().dict() for hit in result["citations"]],
             "metadata": result["metadata"]
         })
         
@@ -0,0 +1,114 @@
+"""
+Chunking throughput (chunks/sec) on the PDFs under samples/.
+
+Documents are extracted once up front and excluded from the timings. The
+legacy path mirrors the old per-item TextChunker, which called
+encoding.encode for every section, table, figure and image and
+encoding.decode for every window; the current path encodes in one
+threaded batch and cuts windows as string slices from token offsets.
+The last line reports how many chunks (vectors) small-chunk coalescing
+saves at --min-tokens.
+
+Usage:
+    python -m benchmarks.bench_chunking --max-docs 5 --threads 1 4 8
+"""
+import argparse
+import contextlib
+import glob
+import io
+import os
+import time
+
+from core.rag.chunking.text_chunker import TextChunker
+from core.rag.schema import ChunkMetadata
+from core.rag.ingestion.extractor_factory import ExtractorFactory
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "samples")
+
+def legacy_windows(chunker: TextChunker, n_tokens: int):
+    """Fixed token windows advancing by max_tokens - overlap_tokens"""
+    start = 0
+    while True:
+        end = min(start + chunker.max_tokens, n_tokens)
+        yield start, end
+        if end == n_tokens:
+            return
+        start = end - chunker.overlap_tokens
+
+def legacy_chunk(chunker: TextChunker, document) -> int:
+    """One encode per item and one decode per window, as before batching"""
+    encoding = chunker.encoding
+    chunks = []
+    for section in document.sections:
+        if not section.content.strip():
+            continue
+        tokens = encoding.encode(section.content)
+        for chunk_num, (start, end) in enumerate(legacy_windows(chunker, len(tokens)), start=1):
+            content = section.content if end - start == len(tokens) else encoding.decode(tokens[start:end])
+            chunks.append({
+                'content': content,
+                'metadata': ChunkMetadata(
+                    doc_id=document.metadata.doc_id,
+                    chunk_id=f"{section.section_id}_chunk_{chunk_num}",
+                    page_start=section.page_start,
+                    page_end=section.page_end,
+                    section_id=section.section_id,
+                    heading_chain=[section.title],
+                    chunk_type="text",
+                    token_count=end - start
+                )
+            })
+
+    for chunk in chunker._create_table_chunks(document) + chunker._create_figure_chunks(document) + \
+            chunker._create_image_chunks(document):
+        chunk['metadata'].token_count = len(encoding.encode(chunk['content']))
+        chunks.append(chunk)
+    return len(chunks)
+
+def current_chunk(chunker: TextChunker, document) -> int:
+    return len(chunker.chunk_document(document))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", default=SAMPLES_DIR)
+    parser.add_argument("--max-docs", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--max-tokens", type=int, default=1600)
+    parser.add_argument("--overlap-tokens", type=int, default=160)
+    parser.add_argument("--min-tokens", type=int, default=128)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.samples, "**", "*.pdf"), recursive=True))[:args.max_docs]
+    documents = []
+    for path in paths:
+        # Extractors print OCR warnings; keep the benchmark output readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            documents.append(ExtractorFactory.get_extractor(path).extract(path))
+    pages = sum(document.metadata.pages for document in documents)
+    print(f"{len(documents)} documents, {pages} pages")
+
+    runs = [("legacy (per-item encode/decode)", legacy_chunk, 1)]
+    runs += [(f"batched, {n} threads", current_chunk, n) for n in args.threads]
+    for label, fn, threads in runs:
+        best = float("inf")
+        with TextChunker(max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens, num_threads=threads) as chunker:
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                chunks = sum(fn(chunker, document) for document in documents)
+                best = min(best, time.perf_counter() - start)
+        print(f"{label:<34} {chunks} chunks in {best * 1000:8.1f} ms  {chunks / best:10.0f} chunks/sec")
+
+    # Vector count with and without small-chunk coalescing
+    counts = {}
+    for min_tokens in (0, args.min_tokens):
+        with TextChunker(max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens, min_tokens=min_tokens) as chunker:
+            types = [c['metadata'].chunk_type for document in documents for c in chunker.chunk_document(document)]
+        counts[min_tokens] = {t: types.count(t) for t in ("text", "table", "figure", "image")}
+    before, after = sum(counts[0].values()), sum(counts[args.min_tokens].values())
+    print(f"coalesced, min_tokens={args.min_tokens}: {before} -> {after} chunks ({1 - after / before:.1%} fewer vectors)")
+    for chunk_type in counts[0]:
+        print(f"  {chunk_type:<7} {counts[0][chunk_type]:6d} -> {counts[args.min_tokens][chunk_type]:6d}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Section assembly time per PDF: bookmark outline (get_toc) vs heuristic scan.
+
+Page layouts are decoded once up front, so only section assembly is
+timed (best of --repeat runs). Only PDFs with a usable outline are
+listed; the rest always take the heuristic path.
+
+Usage:
+    python -m benchmarks.bench_pdf_headings --repeat 20
+"""
+import argparse
+import glob
+import os
+import time
+
+import fitz  # PyMuPDF
+
+from core.rag.ingestion.heading_extractor import HeadingExtractor, PdfSectionBuilder, TocSectionBuilder
+from core.rag.ingestion.pdf_layout import iter_page_layouts
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "samples")
+
+def assemble(builder: PdfSectionBuilder, layouts: list, page_count: int) -> list:
+    """Feed every page to a section builder"""
+    for layout in layouts:
+        builder.add_page(layout)
+    return builder.finish(page_count)
+
+def best_time(make_builder, layouts: list, page_count: int, repeat: int) -> tuple:
+    """(best seconds, sections) over repeat runs"""
+    best, sections = float("inf"), []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        sections = assemble(make_builder(), layouts, page_count)
+        best = min(best, time.perf_counter() - start)
+    return best, sections
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", default=SAMPLES_DIR)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    extractor = HeadingExtractor()
+    total_heuristic = total_outline = 0.0
+    print(f"{'document':<42} {'pages':>5} {'outline':>7} {'sections':>15} {'heuristic':>10} {'outline':>9} {'saved':>8}")
+    for path in sorted(glob.glob(os.path.join(args.samples, "**", "*.pdf"), recursive=True)):
+        with fitz.open(path) as doc:
+            toc = doc.get_toc()
+            if not TocSectionBuilder.usable_entries(toc, len(doc)):
+                continue
+            layouts = list(iter_page_layouts(doc))
+            page_count = len(doc)
+            heuristic, heuristic_sections = best_time(PdfSectionBuilder, layouts, page_count, args.repeat)
+            outline, outline_sections = best_time(lambda: extractor.pdf_section_builder(toc, page_count), layouts, page_count, args.repeat)
+        total_heuristic += heuristic
+        total_outline += outline
+        name = os.path.basename(path)[:42]
+        sections = f"{len(heuristic_sections)} -> {len(outline_sections)}"
+        print(f"{name:<42} {page_count:>5} {len(toc):>7} {sections:>15} {heuristic * 1000:>8.1f}ms {outline * 1000:>7.1f}ms "
+              f"{(heuristic - outline) * 1000:>6.1f}ms")
+    print(f"{'total':<42} {'':>5} {'':>7} {'':>15} {total_heuristic * 1000:>8.1f}ms {total_outline * 1000:>7.1f}ms "
+          f"{(total_heuristic - total_outline) * 1000:>6.1f}ms")
+
+if __name__ == "__main__":
+    main()
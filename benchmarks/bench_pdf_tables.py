@@ -0,0 +1,91 @@
+"""
+Table extraction throughput (pages/sec) of PdfExtractor on the PDFs under samples/.
+
+The legacy path mirrors the old _extract_tables_from_page, which reopened
+the file with pdfplumber for every page (O(pages^2) parsing); the "open
+once" path opens each PDF once and closes every page after use; the
+pre-pass path additionally skips pages without ruling lines in both
+directions (may_contain_table), as PdfExtractor does by default. With
+--memory the peak traced allocation of each path is reported as well
+(slower). --skip-legacy leaves out the slow legacy path.
+
+Usage:
+    python -m benchmarks.bench_pdf_tables --max-docs 5 --memory
+"""
+import argparse
+import glob
+import os
+import time
+import tracemalloc
+
+import fitz  # PyMuPDF
+import pdfplumber
+
+from core.rag.ingestion.pdf_extractor import PdfExtractor
+from core.rag.ingestion.pdf_layout import may_contain_table
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "samples")
+
+def legacy_tables(extractor: PdfExtractor, path: str) -> int:
+    """One pdfplumber.open per page, as before"""
+    with pdfplumber.open(path) as pdf:
+        n_pages = len(pdf.pages)
+    tables = 0
+    for page_num in range(n_pages):
+        with pdfplumber.open(path) as pdf:
+            tables += len(extractor._extract_tables_from_page(pdf.pages[page_num], page_num))
+    return tables
+
+def current_tables(extractor: PdfExtractor, path: str) -> int:
+    """One pdfplumber.open per document, pages closed after use"""
+    tables = 0
+    with pdfplumber.open(path) as pdf:
+        for page_num, page in enumerate(pdf.pages):
+            tables += len(extractor._extract_tables_from_page(page, page_num))
+            page.close()
+    return tables
+
+def prepass_tables(extractor: PdfExtractor, path: str) -> int:
+    """Open once, and only run pdfplumber on pages with ruling lines"""
+    tables = 0
+    with fitz.open(path) as doc, pdfplumber.open(path) as pdf:
+        for page_num, page in enumerate(pdf.pages):
+            if may_contain_table(doc[page_num]):
+                tables += len(extractor._extract_tables_from_page(page, page_num))
+            page.close()
+    return tables
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", default=SAMPLES_DIR)
+    parser.add_argument("--max-docs", type=int, default=5)
+    parser.add_argument("--memory", action="store_true")
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.samples, "**", "*.pdf"), recursive=True))[:args.max_docs]
+    extractor = PdfExtractor()
+
+    paths_to_run = [("legacy (open per page)", legacy_tables), ("open once", current_tables),
+                    ("ruling-line pre-pass", prepass_tables)]
+    if args.skip_legacy:
+        paths_to_run = paths_to_run[1:]
+    for label, fn in paths_to_run:
+        pages = tables = 0
+        elapsed = peak = 0.0
+        for path in paths:
+            with pdfplumber.open(path) as pdf:
+                pages += len(pdf.pages)
+            if args.memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            tables += fn(extractor, path)
+            elapsed += time.perf_counter() - start
+            if args.memory:
+                peak = max(peak, tracemalloc.get_traced_memory()[1] / 2**20)
+                tracemalloc.stop()
+        memory = f"  peak {peak:7.1f} MiB" if args.memory else ""
+        print(f"{label:<24} {pages} pages, {tables} tables in {elapsed:7.2f} s  {pages / elapsed:7.1f} pages/sec{memory}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Per-query allocation microbenchmark for HybridRetriever.
+
+Compares the legacy path, which materialized every candidate of both legs
+as a Pydantic RetrievalResult/ChunkMetadata pair before fusion, with the
+current path that fuses ID/score arrays and builds slotted Hit objects only
+for the final k. Embeddings are faked, so no API key is needed.
+
+Usage:
+    python -m benchmarks.bench_retrieval_alloc --chunks 5000 --queries 50
+"""
+import argparse
+import random
+import tempfile
+import time
+import tracemalloc
+import zlib
+from unittest.mock import Mock, patch
+
+import numpy as np
+
+from core.rag.schema import ChunkMetadata, RetrievalResult
+from core.rag.retrieval.hits import Hit
+
+DIM = 256
+VOCAB = [f"term{i}" for i in range(2000)]
+
+def fake_embeddings(model, input):
+    """Deterministic bag-of-words hashing embedder"""
+    data = []
+    for text in input:
+        vec = np.zeros(DIM, dtype=np.float32)
+        for token in text.lower().split():
+            vec[zlib.crc32(token.encode()) % DIM] += 1.0
+        data.append(Mock(embedding=vec.tolist()))
+    return Mock(data=data)
+
+def make_chunks(n: int, rng: random.Random):
+    chunks = []
+    for i in range(n):
+        doc = i // 50
+        chunks.append({
+            'content': " ".join(rng.choice(VOCAB) for _ in range(120)),
+            'metadata': ChunkMetadata(
+                doc_id=f"doc{doc}",
+                chunk_id=f"sec_{i % 50:03d}_chunk_1",
+                page_start=1, page_end=1,
+                section_id=f"sec_{i % 50:03d}",
+                heading_chain=["Section"],
+                chunk_type="text",
+                token_count=120
+            )
+        })
+    return chunks
+
+def legacy_query(retriever, query: str, k: int):
+    """Materialize every candidate as Pydantic models, as the pre-Hit retriever did"""
+    vector_ids, vector_scores, bm25_ids, bm25_scores = retriever._gather_candidates(query, k)
+    store = retriever.vector_store
+    candidates = [store.get_hit(uid, s).to_result() for uid, s in zip(vector_ids.tolist(), vector_scores.tolist())]
+    candidates += [store.get_hit(uid, s).to_result() for uid, s in zip(bm25_ids.tolist(), bm25_scores.tolist())]
+
+    # Fusion and MMR are shared so the comparison isolates object materialization
+    chunk_uids, scores = retriever._combine_results(vector_ids, vector_scores, bm25_ids, bm25_scores)
+    chunk_uids, scores = retriever._apply_mmr(chunk_uids, scores, k)
+    by_uid = {c.metadata.chunk_uid: c for c in candidates}
+    return [by_uid[uid] for uid in chunk_uids.tolist()]
+
+def current_query(retriever, query: str, k: int):
+    return retriever.retrieve(query, k=k)
+
+def count_constructions(fn, *args):
+    """Run fn and count model/hit objects constructed plus traced peak bytes"""
+    counts = {'pydantic': 0, 'hit': 0}
+    orig_result_init = RetrievalResult.__init__
+    orig_meta_init = ChunkMetadata.__init__
+    orig_hit_init = Hit.__init__
+
+    def result_init(self, **kw):
+        counts['pydantic'] += 1
+        orig_result_init(self, **kw)
+
+    def meta_init(self, **kw):
+        counts['pydantic'] += 1
+        orig_meta_init(self, **kw)
+
+    def hit_init(self, *a, **kw):
+        counts['hit'] += 1
+        orig_hit_init(self, *a, **kw)
+
+    with patch.object(RetrievalResult, '__init__', result_init), \
+         patch.object(ChunkMetadata, '__init__', meta_init), \
+         patch.object(Hit, '__init__', hit_init):
+        tracemalloc.start()
+        fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return counts, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as index_dir, \
+         patch('core.rag.vectorstore.faiss_store.OpenAI') as mock_openai:
+        mock_openai.return_value.embeddings.create.side_effect = fake_embeddings
+
+        from core.rag.vectorstore.faiss_store import FAISSVectorStore
+        from core.rag.retrieval.hybrid_retriever import HybridRetriever
+
+        store = FAISSVectorStore(index_dir=index_dir)
+        store.add_documents(make_chunks(args.chunks, rng))
+        retriever = HybridRetriever(store)
+        queries = [" ".join(rng.choice(VOCAB) for _ in range(6)) for _ in range(args.queries)]
+
+        for label, fn in (("legacy (pydantic per candidate)", legacy_query), ("current (slotted hits)", current_query)):
+            objects, peaks, elapsed = [], [], 0.0
+            for query in queries:
+                counts, peak = count_constructions(fn, retriever, query, args.k)
+                objects.append(counts)
+                peaks.append(peak)
+                start = time.perf_counter()
+                fn(retriever, query, args.k)
+                elapsed += time.perf_counter() - start
+
+            print(f"{label}:")
+            print(f"  pydantic objects/query: {np.mean([c['pydantic'] for c in objects]):.1f}")
+            print(f"  hit objects/query:      {np.mean([c['hit'] for c in objects]):.1f}")
+            print(f"  traced peak/query:      {np.mean(peaks) / 1024:.1f} KiB")
+            print(f"  latency/query:          {elapsed / len(queries) * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ class RAGConfig(BaseSettings):
     
     # Embedding Configuration
     embedding_model: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
+    embedding_batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
     
     # Vector Store Configuration
     vector_store: str = os.getenv("VECTOR_STORE", "faiss")
@@ -17,19 +18,47 @@ class RAGConfig(BaseSettings):
     # Chunking Configuration
     max_chunk_tokens: int = int(os.getenv("MAX_CHUNK_TOKENS", "1600"))
     chunk_overlap_tokens: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", "160"))
+    min_chunk_tokens: int = int(os.getenv("MIN_CHUNK_TOKENS", "128"))  # Smaller adjacent chunks are coalesced; 0 disables
+    tokenizer_threads: int = int(os.getenv("TOKENIZER_THREADS", "8"))
+    dedup_enabled: bool = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+    dedup_near_duplicates: bool = os.getenv("DEDUP_NEAR_DUPLICATES", "false").lower() == "true"  # Shared vectors hide their distinct wording from search
+    dedup_threshold: float = float(os.getenv("DEDUP_THRESHOLD", "0.85"))  # Estimated Jaccard for near duplicates
+    dedup_num_perm: int = int(os.getenv("DEDUP_NUM_PERM", "64"))
+    dedup_bands: int = int(os.getenv("DEDUP_BANDS", "16"))
     
     # Retrieval Configuration
     top_k: int = int(os.getenv("TOP_K", "10"))
+    retrieval_max_candidates: int = int(os.getenv("RETRIEVAL_MAX_CANDIDATES", "1000"))
+    retrieval_mode: str = os.getenv("RETRIEVAL_MODE", "flat")  # flat or hierarchical
+    hierarchical_level: str = os.getenv("HIERARCHICAL_LEVEL", "section")  # document or section
+    hierarchical_fanout: int = int(os.getenv("HIERARCHICAL_FANOUT", "8"))
     use_reranker: bool = os.getenv("USE_RERANKER", "false").lower() == "true"
     reranker_model: str = os.getenv("RERANKER_MODEL", "bge-reranker-large")
+    reranker_top_n: int = int(os.getenv("RERANKER_TOP_N", "50"))
+    reranker_batch_size: int = int(os.getenv("RERANKER_BATCH_SIZE", "16"))
+    reranker_time_budget_ms: float = float(os.getenv("RERANKER_TIME_BUDGET_MS", "300"))
+    reranker_cache_size: int = int(os.getenv("RERANKER_CACHE_SIZE", "4096"))
     
     # Directory Configuration
     data_dir: str = os.getenv("DATA_DIR", "data")
     structured_dir: str = os.getenv("STRUCTURED_DIR", "data/structured")
     index_dir: str = os.getenv("INDEX_DIR", "data/index")
+    text_arena_mmap: bool = os.getenv("TEXT_ARENA_MMAP", "true").lower() == "true"
+    
+    # Extraction Configuration
+    pdf_workers: int = int(os.getenv("PDF_WORKERS", "0"))  # Processes for page-range extraction; 0 uses all CPUs
+    pdf_parallel_min_pages: int = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))  # Smaller PDFs are extracted serially
+    table_scan_all_pages: bool = os.getenv("TABLE_SCAN_ALL_PAGES", "false").lower() == "true"  # Skip the ruling-line pre-pass
+    ingest_max_memory_mb: int = int(os.getenv("INGEST_MAX_MEMORY_MB", "64"))  # Larger uploads are spooled to a temp file
     
     # OCR Configuration
     tesseract_cmd: str = os.getenv("TESSERACT_CMD", "tesseract")
+    ocr_workers: int = int(os.getenv("OCR_WORKERS", "2"))  # OCR processes; 0 runs OCR inline
+    ocr_min_size: int = int(os.getenv("OCR_MIN_SIZE", "24"))  # Images with a shorter side in pixels are skipped
+    ocr_max_aspect: float = float(os.getenv("OCR_MAX_ASPECT", "20"))  # Thinner images (rules, borders) are skipped
+    ocr_cache_path: str = os.getenv("OCR_CACHE_PATH", "data/ocr_cache.jsonl")  # Content hash -> OCR text; empty disables
+    ocr_dpi: int = int(os.getenv("OCR_DPI", "300"))  # Render resolution for pages without a text layer
+    ocr_grayscale: bool = os.getenv("OCR_GRAYSCALE", "true").lower() == "true"
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,186 @@
+import os
+import zlib
+import hashlib
+import numpy as np
+from typing import List, Dict, Optional, Tuple
+
+# Mersenne prime 2^31 - 1 keeps a * h + b inside uint64 for 31-bit hashes
+MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+class ChunkDeduplicator:
+    """
+    Exact and near-duplicate chunk detection for ingest.
+
+    Exact duplicates are found by a content hash. Near duplicates are found
+    with MinHash signatures over word shingles, bucketed by LSH bands; a
+    bucket collision is confirmed when the estimated Jaccard similarity
+    reaches ``threshold``. With ``near_duplicates`` off only exact copies
+    are matched and no signatures are computed. Only canonical chunks (the first copy seen) are
+    registered, so every duplicate resolves to a chunk that owns a vector.
+    """
+
+    def __init__(self, path: str, num_perm: int = 64, bands: int = 16,
+                 threshold: float = 0.85, shingle_size: int = 5, seed: int = 1,
+                 near_duplicates: bool = True):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+
+        self.path = path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.near_duplicates = near_duplicates
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, int(MERSENNE_PRIME), size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, int(MERSENNE_PRIME), size=num_perm).astype(np.uint64)
+        self.clear()
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def clear(self) -> None:
+        """Forget every registered chunk"""
+        self.generation = None
+        self.exact: Dict[bytes, int] = {}
+        self.signatures: Dict[int, np.ndarray] = {}
+        self.digests: Dict[int, bytes] = {}
+        self.buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+
+    def digest(self, text: str) -> bytes:
+        """Exact-match key; whitespace differences are ignored"""
+        return hashlib.blake2b(" ".join(text.split()).encode('utf-8'), digest_size=16).digest()
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature of the text's word shingles, or None if too short"""
+        words = text.lower().split()
+        if len(words) < self.shingle_size:
+            return None
+
+        shingles = {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+        hashes %= MERSENNE_PRIME
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % MERSENNE_PRIME).min(axis=1)
+
+    def find(self, text: str) -> Tuple[Optional[int], bool, bytes, Optional[np.ndarray]]:
+        """
+        Look up a canonical chunk for the text.
+
+        Returns (canonical chunk_uid or None, exact match flag, digest,
+        signature); the digest and signature can be passed to ``add``.
+        """
+        digest = self.digest(text)
+        canonical = self.exact.get(digest)
+        if canonical is not None:
+            return canonical, True, digest, None
+
+        signature = self.signature(text) if self.near_duplicates else None
+        canonical, exact = self.match(digest, signature)
+        return canonical, exact, digest, signature
+
+    def match(self, digest: bytes, signature: Optional[np.ndarray]) -> Tuple[Optional[int], bool]:
+        """Look up a canonical chunk from a precomputed digest and signature"""
+        canonical = self.exact.get(digest)
+        if canonical is not None:
+            return canonical, True
+        if signature is None:
+            return None, False
+
+        best, best_similarity = None, self.threshold
+        for band, key in enumerate(self._band_keys(signature)):
+            for candidate in self.buckets[band].get(key, ()):
+                similarity = float(np.mean(self.signatures[candidate] == signature))
+                if similarity >= best_similarity:
+                    best, best_similarity = candidate, similarity
+        return best, False
+
+    def empty_copy(self) -> 'ChunkDeduplicator':
+        """An empty deduplicator with the same parameters, for chunks not yet indexed"""
+        return ChunkDeduplicator(self.path, num_perm=self.num_perm, bands=self.bands,
+                                 threshold=self.threshold, shingle_size=self.shingle_size, seed=self.seed,
+                                 near_duplicates=self.near_duplicates)
+
+    def add(self, chunk_uid: int, text: str = "", digest: Optional[bytes] = None,
+            signature: Optional[np.ndarray] = None) -> None:
+        """Register a canonical chunk"""
+        digest = digest or self.digest(text)
+        if signature is None and text and self.near_duplicates:
+            signature = self.signature(text)
+
+        self.exact.setdefault(digest, chunk_uid)
+        self.digests[chunk_uid] = digest
+        if signature is not None:
+            self.signatures[chunk_uid] = signature
+            for band, key in enumerate(self._band_keys(signature)):
+                self.buckets[band].setdefault(key, []).append(chunk_uid)
+
+    def remove(self, chunk_uids: List[int]) -> None:
+        """Unregister chunks that were deleted or lost canonical status"""
+        for chunk_uid in chunk_uids:
+            digest = self.digests.pop(chunk_uid, None)
+            if digest is not None and self.exact.get(digest) == chunk_uid:
+                del self.exact[digest]
+
+            signature = self.signatures.pop(chunk_uid, None)
+            if signature is None:
+                continue
+            for band, key in enumerate(self._band_keys(signature)):
+                bucket = self.buckets[band].get(key)
+                if bucket and chunk_uid in bucket:
+                    bucket.remove(chunk_uid)
+                    if not bucket:
+                        del self.buckets[band][key]
+
+    def save(self, generation: int) -> None:
+        """Persist digests and signatures for a store generation"""
+        uids = np.asarray(sorted(self.digests), dtype=np.int64)
+        has_signature = np.asarray([uid in self.signatures for uid in uids.tolist()], dtype=bool)
+        signatures = np.zeros((len(uids), self.num_perm), dtype=np.uint64)
+        for row, uid in enumerate(uids.tolist()):
+            if has_signature[row]:
+                signatures[row] = self.signatures[uid]
+
+        self.generation = generation
+        with open(self.path, 'wb') as f:
+            np.savez(
+                f,
+                generation=np.int64(generation),
+                params=np.asarray(self._params(), dtype=np.int64),
+                uids=uids,
+                digests=np.asarray([self.digests[uid] for uid in uids.tolist()], dtype='S16'),
+                has_signature=has_signature,
+                signatures=signatures
+            )
+
+    def load(self, expected_generation: int) -> bool:
+        """Load persisted state; returns False if missing, stale or built with other parameters"""
+        try:
+            if not os.path.exists(self.path):
+                return False
+
+            with np.load(self.path) as data:
+                if (int(data['generation']) != expected_generation or
+                        data['params'].tolist() != self._params()):
+                    return False
+
+                self.clear()
+                signatures = data['signatures']
+                for row, (uid, digest, has_signature) in enumerate(
+                        zip(data['uids'].tolist(), data['digests'].tolist(), data['has_signature'].tolist())):
+                    self.add(uid, digest=digest.ljust(16, b'\0'), signature=signatures[row] if has_signature else None)
+                self.generation = expected_generation
+            return True
+        except Exception as e:
+            print(f"Error loading dedup index: {e}")
+            return False
+
+    def _params(self) -> List[int]:
+        """Parameters a persisted index must have been built with"""
+        return [self.num_perm, self.bands, self.shingle_size, int(self.near_duplicates)]
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        """LSH bucket key of each band"""
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
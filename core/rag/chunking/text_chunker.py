@@ -1,39 +1,306 @@
+import re
 import tiktoken
-from typing import List, Dict, Any
+import numpy as np
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
+from typing import List, Dict, Any, Callable, Iterator, Sequence, Tuple
 from core.rag.schema import DocumentSchema, DocumentSection, ChunkMetadata
 
+# Window boundaries: a sentence ends at terminal punctuation (plus closing quotes/brackets) before whitespace
+SENTENCE_END = re.compile(r'[.!?]["\')\]]*(?=\s)|\n')
+SENTENCE_START = re.compile(r'[.!?]["\')\]]*\s+|\n\s*')
+WORD_START = re.compile(r'\s+')
+
+_TOKEN_BYTE_LENGTHS: Dict[str, np.ndarray] = {}
+
+def _token_byte_lengths(encoding) -> np.ndarray:
+    """UTF-8 byte length of every token id, built once per encoding"""
+    lengths = _TOKEN_BYTE_LENGTHS.get(encoding.name)
+    if lengths is None:
+        lengths = np.zeros(encoding.n_vocab, dtype=np.int64)
+        for token in range(encoding.n_vocab):
+            try:
+                lengths[token] = len(encoding.decode_single_token_bytes(token))
+            except KeyError:
+                pass  # Unused ids between the ranks and the special tokens
+        _TOKEN_BYTE_LENGTHS[encoding.name] = lengths
+    return lengths
+
 class TextChunker:
     """Hierarchical text chunker with heading awareness"""
     
-    def __init__(self, max_tokens: int = 1600, overlap_tokens: int = 160, model: str = "gpt-4"):
+    # Below this many characters a batch runs inline
+    PARALLEL_MIN_WORK = 200_000
+    
+    # Streaming granularity: sections are encoded and yielded in groups of this size
+    SECTION_GROUP_CHARS = 400_000
+    
+    # Separator between the parts of a coalesced chunk
+    COALESCE_SEPARATOR = "\n\n"
+    
+    def __init__(self, max_tokens: int = 1600, overlap_tokens: int = 160, model: str = "gpt-4",
+                 num_threads: int = 8, min_tokens: int = 0):
         self.max_tokens = max_tokens
         self.overlap_tokens = overlap_tokens
+        self.min_tokens = min_tokens  # Smaller chunks are coalesced with their neighbors; 0 disables
         self.encoding = tiktoken.encoding_for_model(model)
+        self.num_threads = max(1, num_threads)
+        self._executor = None
+    
+    def __enter__(self) -> 'TextChunker':
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self.close()
+    
+    def close(self) -> None:
+        """Shut down the tokenizer pool; a later batch starts a new one"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
     
     def chunk_document(self, document: DocumentSchema) -> List[Dict[str, Any]]:
         """Chunk document into overlapping segments with metadata"""
-        chunks = []
+        return list(self.iter_chunks(document))
+    
+    def iter_chunks(self, document: DocumentSchema) -> Iterator[Dict[str, Any]]:
+        """
+        Yield chunks lazily so embedding can start before chunking finishes.
         
-        for section in document.sections:
-            section_chunks = self._chunk_section(section, document.metadata.doc_id)
-            chunks.extend(section_chunks)
+        Sections are encoded in groups of about SECTION_GROUP_CHARS characters,
+        each in one threaded batch; tables, figures and images are counted
+        together in a final batch. Small chunks are then coalesced.
+        """
+        return self._coalesce(self._iter_raw_chunks(document))
+    
+    def _iter_raw_chunks(self, document: DocumentSchema) -> Iterator[Dict[str, Any]]:
+        """Yield section windows, then table, figure and image chunks"""
+        doc_id = document.metadata.doc_id
+        sections = [section for section in document.sections if section.content.strip()]
         
-        # Add special chunks for tables, figures, images
-        chunks.extend(self._create_table_chunks(document))
-        chunks.extend(self._create_figure_chunks(document))
-        chunks.extend(self._create_image_chunks(document))
+        for group in self._section_groups(sections):
+            token_lists = self._map_batch(self.encoding.encode, [s.content for s in group], [len(s.content) for s in group])
+            for section, tokens in zip(group, token_lists):
+                yield from self._chunk_section(section, doc_id, tokens)
         
-        return chunks
+        # Special chunks for tables, figures, images
+        special_chunks = []
+        special_chunks.extend(self._create_table_chunks(document))
+        special_chunks.extend(self._create_figure_chunks(document))
+        special_chunks.extend(self._create_image_chunks(document))
+        
+        texts = [chunk['content'] for chunk in special_chunks]
+        for chunk, tokens in zip(special_chunks, self._map_batch(self.encoding.encode, texts, [len(t) for t in texts])):
+            chunk['metadata'].token_count = len(tokens)
+            yield chunk
     
-    def _chunk_section(self, section: DocumentSection, doc_id: str) -> List[Dict[str, Any]]:
-        """Chunk a single section"""
-        chunks = []
+    def _coalesce(self, chunks: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Merge runs of adjacent chunks below min_tokens into one chunk.
+        
+        Only chunks of the same type on the same page or in the same section
+        are merged, and a run stops once it reaches min_tokens (or would
+        exceed max_tokens). Windows cut from a longer section are never
+        merged.
+        """
+        if self.min_tokens <= 0:
+            yield from chunks
+            return
+        
+        run, run_tokens = [], 0
+        for chunk in chunks:
+            if run and not self._can_merge(run, run_tokens, chunk):
+                yield self._merge_chunks(run)
+                run, run_tokens = [], 0
+            
+            if not self._is_small(chunk):
+                yield chunk
+                continue
+            
+            run.append(chunk)
+            run_tokens += chunk['metadata'].token_count
+            if run_tokens >= self.min_tokens:
+                yield self._merge_chunks(run)
+                run, run_tokens = [], 0
+        
+        if run:
+            yield self._merge_chunks(run)
+    
+    def _is_small(self, chunk: Dict[str, Any]) -> bool:
+        """Whether a chunk is a coalescing candidate"""
+        return 'parent_text' not in chunk and chunk['metadata'].token_count < self.min_tokens
+    
+    def _can_merge(self, run: List[Dict[str, Any]], run_tokens: int, chunk: Dict[str, Any]) -> bool:
+        """Whether a chunk may join the current run"""
+        last, metadata = run[-1]['metadata'], chunk['metadata']
+        return (self._is_small(chunk) and
+                metadata.chunk_type == last.chunk_type and
+                (metadata.section_id == last.section_id or metadata.page_start == last.page_end) and
+                run_tokens + metadata.token_count <= self.max_tokens)
+    
+    def _merge_chunks(self, run: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Join a run into one chunk.
+        
+        The merged metadata keeps a sub-span map: one entry per part with
+        its character range in the merged content plus its own chunk ID,
+        section, pages, headings and section offsets, so citations can still
+        point at the original part.
+        """
+        if len(run) == 1:
+            return run[0]
+        
+        parts, sub_spans, offset = [], [], 0
+        for chunk in run:
+            metadata = chunk['metadata']
+            if parts:
+                offset += len(self.COALESCE_SEPARATOR)
+            sub_spans.append({
+                'start': offset,
+                'end': offset + len(chunk['content']),
+                'chunk_id': metadata.chunk_id,
+                'section_id': metadata.section_id,
+                'page_start': metadata.page_start,
+                'page_end': metadata.page_end,
+                'heading_chain': metadata.heading_chain,
+                'char_start': metadata.char_start,
+                'char_end': metadata.char_end
+            })
+            parts.append(chunk['content'])
+            offset += len(chunk['content'])
+        
+        content = self.COALESCE_SEPARATOR.join(parts)
+        first = run[0]['metadata']
+        return {
+            'content': content,
+            'metadata': ChunkMetadata(
+                doc_id=first.doc_id,
+                chunk_id=f"{first.chunk_id}_merged_{len(run)}",
+                page_start=min(chunk['metadata'].page_start for chunk in run),
+                page_end=max(chunk['metadata'].page_end for chunk in run),
+                section_id=first.section_id,
+                heading_chain=list(dict.fromkeys(h for chunk in run for h in chunk['metadata'].heading_chain)),
+                chunk_type=first.chunk_type,
+                token_count=len(self.encoding.encode(content)),
+                sub_spans=sub_spans
+            )
+        }
+    
+    def _section_groups(self, sections: List[DocumentSection]) -> Iterator[List[DocumentSection]]:
+        """Consecutive runs of sections holding about SECTION_GROUP_CHARS characters"""
+        group, size = [], 0
+        for section in sections:
+            group.append(section)
+            size += len(section.content)
+            if size >= self.SECTION_GROUP_CHARS:
+                yield group
+                group, size = [], 0
+        if group:
+            yield group
+    
+    def _map_batch(self, fn: Callable, items: Sequence, weights: List[int]) -> List[Any]:
+        """
+        Apply a tiktoken call to a batch, split across the tokenizer threads.
+        
+        tiktoken releases the GIL while encoding, so threads run in parallel.
+        Unlike encode_batch, which starts a new pool and submits one task
+        per string, this reuses one pool (until ``close``) and hands each
+        thread a single contiguous slice of roughly equal work.
+        """
+        total = sum(weights)
+        if self.num_threads == 1 or len(items) < 2 or total < self.PARALLEL_MIN_WORK:
+            return [fn(item) for item in items]
+        
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.num_threads, thread_name_prefix="tokenizer")
+        
+        cumulative = list(accumulate(weights))
+        cuts = [0] + [bisect_left(cumulative, total * i / self.num_threads) for i in range(1, self.num_threads)] + [len(items)]
+        parts = [items[start:end] for start, end in zip(cuts, cuts[1:]) if end > start]
+        
+        results = []
+        for part in self._executor.map(lambda part: [fn(item) for item in part], parts):
+            results.extend(part)
+        return results
+    
+    def _token_char_offsets(self, text: str, tokens: List[int]) -> np.ndarray:
+        """
+        Character offset where each token starts, plus len(text) at the end.
+        
+        Token byte lengths come from a per-encoding lookup table, and byte
+        positions map to characters by counting UTF-8 lead bytes, so the
+        section is never decoded. A token that starts inside a multi-byte
+        character is assigned the next character boundary.
+        """
+        byte_lengths = _token_byte_lengths(self.encoding)[np.asarray(tokens, dtype=np.int64)]
+        byte_starts = np.concatenate(([0], np.cumsum(byte_lengths)))
         
-        if not section.content.strip():
-            return chunks
+        encoded = np.frombuffer(text.encode('utf-8'), dtype=np.uint8)
+        char_at_byte = np.concatenate(([0], np.cumsum((encoded & 0xC0) != 0x80)))
+        return char_at_byte[np.minimum(byte_starts, len(encoded))]
+    
+    def _window_spans(self, text: str, offsets: np.ndarray) -> List[Tuple[int, int, int]]:
+        """
+        Character (start, end) and token count of each overlapping window.
+        
+        Each window covers at most max_tokens tokens. Its end is pulled back to
+        a sentence end (or failing that a word break) within the last
+        overlap_tokens tokens, and the next window starts overlap_tokens before
+        that end, moved forward to the next sentence or word start.
+        """
+        n_tokens = len(offsets) - 1
+        spans = []
+        start_tok, char_start = 0, 0
         
-        # Tokenize the content
-        tokens = self.encoding.encode(section.content)
+        while True:
+            end_tok = min(start_tok + self.max_tokens, n_tokens)
+            if end_tok == n_tokens:
+                char_end = len(text)
+            else:
+                lo = int(offsets[max(start_tok + 1, end_tok - self.overlap_tokens)])
+                char_end = self._boundary_before(text, max(lo, char_start + 1), int(offsets[end_tok]))
+            
+            # Tokens overlapping [char_start, char_end)
+            first_tok = int(np.searchsorted(offsets, char_start, side='right')) - 1
+            last_tok = int(np.searchsorted(offsets, char_end, side='left'))
+            spans.append((char_start, char_end, last_tok - first_tok))
+            if end_tok == n_tokens:
+                return spans
+            
+            # Move start position with overlap
+            start_tok = max(last_tok - self.overlap_tokens, start_tok + 1)
+            hi = int(offsets[min(start_tok + max(1, self.overlap_tokens // 2), last_tok)])
+            char_start = self._boundary_after(text, int(offsets[start_tok]), hi)
+            start_tok = int(np.searchsorted(offsets, char_start, side='right')) - 1
+    
+    def _boundary_before(self, text: str, lo: int, hi: int) -> int:
+        """Last sentence end in text[lo:hi], else last word break, else hi"""
+        last = None
+        for match in SENTENCE_END.finditer(text, lo, hi):
+            last = match
+        if last is not None:
+            return last.end()
+        
+        for pos in range(hi - 1, lo - 1, -1):
+            if text[pos].isspace():
+                return pos
+        return hi
+    
+    def _boundary_after(self, text: str, lo: int, hi: int) -> int:
+        """First sentence start in text[lo:hi], else first word start, else lo"""
+        match = SENTENCE_START.search(text, lo, hi)
+        if match:
+            return match.end()
+        if lo == 0 or text[lo - 1].isspace():
+            return lo
+        
+        match = WORD_START.search(text, lo, hi)
+        return match.end() if match else lo
+    
+    def _chunk_section(self, section: DocumentSection, doc_id: str, tokens: List[int]) -> List[Dict[str, Any]]:
+        """Chunk a single section from its pre-encoded tokens"""
+        chunks = []
         
         if len(tokens) <= self.max_tokens:
             # Section fits in one chunk
@@ -47,22 +314,20 @@ class TextChunker:
                     section_id=section.section_id,
                     heading_chain=[section.title],
                     chunk_type="text",
-                    token_count=len(tokens)
+                    token_count=len(tokens),
+                    char_start=0,
+                    char_end=len(section.content)
                 )
             }
             chunks.append(chunk)
         else:
-            # Split into multiple chunks with overlap
-            chunk_num = 1
-            start_idx = 0
-            
-            while start_idx < len(tokens):
-                end_idx = min(start_idx + self.max_tokens, len(tokens))
-                chunk_tokens = tokens[start_idx:end_idx]
-                chunk_content = self.encoding.decode(chunk_tokens)
-                
+            # Split into multiple chunks with overlap; windows are slices of the section text
+            offsets = self._token_char_offsets(section.content, tokens)
+            spans = self._window_spans(section.content, offsets)
+            for chunk_num, (char_start, char_end, token_count) in enumerate(spans, start=1):
                 chunk = {
-                    'content': chunk_content,
+                    'content': section.content[char_start:char_end],
+                    'parent_text': section.content,  # Lets the vector store keep one copy per section
                     'metadata': ChunkMetadata(
                         doc_id=doc_id,
                         chunk_id=f"{section.section_id}_chunk_{chunk_num}",
@@ -71,39 +336,38 @@ class TextChunker:
                         section_id=section.section_id,
                         heading_chain=[section.title],
                         chunk_type="text",
-                        token_count=len(chunk_tokens)
+                        token_count=token_count,
+                        char_start=char_start,
+                        char_end=char_end
                     )
                 }
                 chunks.append(chunk)
-                
-                # Move start position with overlap
-                start_idx = end_idx - self.overlap_tokens
-                chunk_num += 1
         
         return chunks
     
     def _create_table_chunks(self, document: DocumentSchema) -> List[Dict[str, Any]]:
-        """Create chunks for tables"""
+        """Create chunks for tables, one per row group for tables over max_tokens"""
         chunks = []
         
         for table in document.tables:
             # Convert table to markdown format
-            content = self._table_to_markdown(table)
+            parts = self._table_row_groups(table)
             
-            chunk = {
-                'content': content,
-                'metadata': ChunkMetadata(
-                    doc_id=document.metadata.doc_id,
-                    chunk_id=f"{table.table_id}_chunk",
-                    page_start=table.page,
-                    page_end=table.page,
-                    section_id=table.source_section or "tables",
-                    heading_chain=[table.title or f"Table {table.table_id}"],
-                    chunk_type="table",
-                    token_count=len(self.encoding.encode(content))
-                )
-            }
-            chunks.append(chunk)
+            for part_num, content in enumerate(parts, start=1):
+                chunk = {
+                    'content': content,
+                    'metadata': ChunkMetadata(
+                        doc_id=document.metadata.doc_id,
+                        chunk_id=f"{table.table_id}_chunk" if len(parts) == 1 else f"{table.table_id}_chunk_{part_num}",
+                        page_start=table.page,
+                        page_end=table.page,
+                        section_id=table.source_section or "tables",
+                        heading_chain=[table.title or f"Table {table.table_id}"],
+                        chunk_type="table",
+                        token_count=0  # Counted in _iter_raw_chunks' final batch
+                    )
+                }
+                chunks.append(chunk)
         
         return chunks
     
@@ -127,7 +391,7 @@ class TextChunker:
                     section_id=figure.source_section or "figures",
                     heading_chain=[figure.title or f"Figure {figure.figure_id}"],
                     chunk_type="figure",
-                    token_count=len(self.encoding.encode(content))
+                    token_count=0  # Counted in _iter_raw_chunks' final batch
                 )
             }
             chunks.append(chunk)
@@ -155,7 +419,7 @@ class TextChunker:
                     section_id=image.source_section or "images",
                     heading_chain=[f"Image {image.image_id}"],
                     chunk_type="image",
-                    token_count=len(self.encoding.encode(content))
+                    token_count=0  # Counted in _iter_raw_chunks' final batch
                 )
             }
             chunks.append(chunk)
@@ -164,16 +428,65 @@ class TextChunker:
     
     def _table_to_markdown(self, table) -> str:
         """Convert table to markdown format"""
+        return "".join(self._table_markdown_parts(table))
+    
+    def _table_markdown_parts(self, table) -> List[str]:
+        """Markdown as [title, header, row, row, ...] strings, joined by the caller"""
         if not table.headers and not table.rows:
-            return f"Table {table.table_id}: No data"
-        
-        content = f"Table: {table.title or table.table_id}\n\n"
+            return [f"Table {table.table_id}: No data"]
         
+        header = ""
         if table.headers:
-            content += "| " + " | ".join(table.headers) + " |\n"
-            content += "| " + " | ".join(["---"] * len(table.headers)) + " |\n"
+            header = "".join([
+                "| ", " | ".join(table.headers), " |\n",
+                "| ", " | ".join(["---"] * len(table.headers)), " |\n"
+            ])
+        
+        rows = ["".join(["| ", " | ".join(row), " |\n"]) for row in table.rows]
+        return [self._table_title(table), header] + rows
+    
+    def _table_title(self, table, suffix: str = "") -> str:
+        """Title line of a table's markdown"""
+        return f"Table: {table.title or table.table_id}{suffix}\n\n"
+    
+    def _table_row_groups(self, table) -> List[str]:
+        """
+        Split a table into row groups that each fit max_tokens.
+        
+        The whole table is encoded once and row token counts are read off
+        the token character offsets. Every group repeats the title and
+        header, with the row range appended to the title.
+        """
+        parts = self._table_markdown_parts(table)
+        content = "".join(parts)
+        
+        # A token is at least one byte, so short tables need no encoding
+        if len(parts) < 3 or len(content.encode('utf-8')) <= self.max_tokens:
+            return [content]
+        
+        tokens = self.encoding.encode(content)
+        if len(tokens) <= self.max_tokens:
+            return [content]
+        
+        # Token index at every row boundary
+        offsets = self._token_char_offsets(content, tokens)
+        boundaries = np.cumsum([0] + [len(part) for part in parts])
+        token_at = np.searchsorted(offsets, boundaries, side='left')
+        row_tokens = np.diff(token_at[2:]).tolist()
+        
+        n_rows = len(row_tokens)
+        note_tokens = len(self.encoding.encode(f" (rows {n_rows}-{n_rows} of {n_rows})"))
+        budget = max(1, self.max_tokens - int(token_at[2]) - note_tokens)
         
-        for row in table.rows:
-            content += "| " + " | ".join(row) + " |\n"
+        groups, start, size = [], 0, 0
+        for i, count in enumerate(row_tokens):
+            if i > start and size + count > budget:
+                groups.append((start, i))
+                start, size = i, 0
+            size += count
+        groups.append((start, n_rows))
         
-        return content
\ No newline at end of file
+        return [
+            "".join([self._table_title(table, f" (rows {start + 1}-{end} of {n_rows})"), parts[1]] + parts[2 + start:2 + end])
+            for start, end in groups
+        ]
\ No newline at end of file
@@ -1,6 +1,6 @@
 from typing import List, Dict, Any, Optional
 from openai import OpenAI
-from core.rag.schema import RetrievalResult, Citation
+from core.rag.retrieval.hits import Hit
 from core.config.rag_config import get_rag_config
 
 class ReportGenerator:
@@ -12,7 +12,7 @@ class ReportGenerator:
     
     def generate_report(self, 
                        query: str,
-                       retrieved_docs: List[RetrievalResult],
+                       retrieved_docs: List[Hit],
                        style: str = "professional",
                        length: str = "medium",
                        sections: Optional[List[str]] = None) -> Dict[str, Any]:
@@ -44,11 +44,11 @@ class ReportGenerator:
             "metadata": {
                 "style": style,
                 "length": length,
-                "total_sources": len(set(c.doc_id for c in all_citations))
+                "total_sources": len(set(hit.metadata['doc_id'] for hit in all_citations))
             }
         }
     
-    def generate_answer(self, query: str, retrieved_docs: List[RetrievalResult]) -> Dict[str, Any]:
+    def generate_answer(self, query: str, retrieved_docs: List[Hit]) -> Dict[str, Any]:
         """Generate direct answer to query"""
         
         if not retrieved_docs:
@@ -99,7 +99,7 @@ Answer:"""
     def _generate_section(self, 
                          section_name: str,
                          query: str, 
-                         retrieved_docs: List[RetrievalResult],
+                         retrieved_docs: List[Hit],
                          style: str,
                          length: str) -> tuple:
         """Generate a specific report section"""
@@ -152,38 +152,26 @@ Context:
         
         return content, citations
     
-    def _prepare_context(self, retrieved_docs: List[RetrievalResult]) -> str:
+    def _prepare_context(self, retrieved_docs: List[Hit]) -> str:
         """Prepare context from retrieved documents"""
         context_parts = []
         
         for i, doc in enumerate(retrieved_docs[:10]):  # Limit context size
             context_part = f"""[Source {i+1}]
-Document: {doc.metadata.doc_id}
-Page: {doc.metadata.page_start}
-Section: {', '.join(doc.metadata.heading_chain)}
+Document: {doc.metadata['doc_id']}
+Page: {doc.metadata['page_start']}
+Section: {', '.join(doc.metadata['heading_chain'])}
 Content: {doc.content}
 ---"""
             context_parts.append(context_part)
         
         return "\n\n".join(context_parts)
     
-    def _extract_citations(self, retrieved_docs: List[RetrievalResult]) -> List[Citation]:
-        """Extract citations from retrieved documents"""
-        citations = []
-        
-        for doc in retrieved_docs:
-            citation = Citation(
-                doc_id=doc.metadata.doc_id,
-                page=doc.metadata.page_start,
-                section=', '.join(doc.metadata.heading_chain),
-                chunk_id=doc.metadata.chunk_id,
-                content_preview=doc.content[:200] + "..." if len(doc.content) > 200 else doc.content
-            )
-            citations.append(citation)
-        
-        return citations
+    def _extract_citations(self, retrieved_docs: List[Hit]) -> List[Hit]:
+        """Select the hits to cite; they become Citation models at the API layer"""
+        return list(retrieved_docs)
     
-    def _assess_confidence(self, retrieved_docs: List[RetrievalResult], answer: str) -> str:
+    def _assess_confidence(self, retrieved_docs: List[Hit], answer: str) -> str:
         """Assess confidence in the generated answer"""
         if not retrieved_docs:
             return "low"
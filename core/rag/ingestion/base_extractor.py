@@ -1,13 +1,45 @@
+import io
+import os
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, BinaryIO, Optional, Union
 from core.rag.schema import DocumentSchema
 
+# A file path, the file's contents, or a readable binary file object
+Source = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
+def source_data(source: Source) -> Union[str, bytes, bytearray, memoryview]:
+    """Paths and bytes pass through unchanged; file objects are read from the start"""
+    if isinstance(source, os.PathLike):
+        return os.fspath(source)
+    if isinstance(source, (str, bytes, bytearray, memoryview)):
+        return source
+    if source.seekable():
+        source.seek(0)
+    return source.read()
+
+def binary_file(data: Union[str, bytes, bytearray, memoryview]) -> Union[str, BinaryIO]:
+    """A path as is, or a BytesIO over the bytes (which shares a bytes buffer but copies others)"""
+    return data if isinstance(data, str) else io.BytesIO(data)
+
+def source_name(source: Source, filename: Optional[str] = None) -> str:
+    """File name for metadata: the explicit filename, else the path, else empty"""
+    if filename:
+        return filename
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    return ""
+
 class BaseExtractor(ABC):
     """Base class for document extractors"""
     
     @abstractmethod
-    def extract(self, file_path: str) -> DocumentSchema:
-        """Extract content from document and return structured schema"""
+    def extract(self, source: Source, filename: Optional[str] = None) -> DocumentSchema:
+        """
+        Extract content from a document and return structured schema.
+        
+        ``source`` is a path, the file's bytes or a binary file object;
+        ``filename`` names in-memory sources in the metadata.
+        """
         pass
     
     @abstractmethod
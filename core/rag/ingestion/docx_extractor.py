@@ -1,36 +1,53 @@
 import os
 import uuid
-from typing import List, Dict, Any
+import zipfile
+from typing import List, Dict, Any, Optional
 from docx import Document
 from docx.table import Table
-from docx.oxml.table import CT_Tbl
 from docx.oxml.text.paragraph import CT_P
 from docx.text.paragraph import Paragraph
 from docx.shared import Inches
 
+from core.rag.ingestion.docx_layout import iter_body_blocks
 from core.rag.ingestion.heading_extractor import HeadingExtractor
+from core.rag.ingestion.ocr import ImageOcr
 from core.rag.schema import (
     DocumentSchema, DocumentMetadata, DocumentSection, 
     DocumentTable, DocumentList, DocumentImage
 )
-from core.rag.ingestion.base_extractor import BaseExtractor
+from core.rag.ingestion.base_extractor import BaseExtractor, Source, binary_file, source_data, source_name
+
+# Raster formats PyMuPDF decodes; EMF/WMF drawings and the like are skipped
+OCR_IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tif', '.tiff'}
 
 class DocxExtractor(BaseExtractor):
     """DOCX document extractor"""
     
-    def __init__(self):
+    def __init__(self, ocr_workers: Optional[int] = None):
         self.heading_extractor = HeadingExtractor()
+        self.ocr = ImageOcr.from_config(workers=ocr_workers)
     
-    def extract(self, file_path: str) -> DocumentSchema:
-        """Extract content from DOCX file"""
-        doc = Document(file_path)
+    def extract(self, source: Source, filename: Optional[str] = None) -> DocumentSchema:
+        """Extract content from a DOCX path, bytes or file object"""
+        name = source_name(source, filename)
+        source = source_data(source)
+        doc = Document(binary_file(source))
         doc_id = str(uuid.uuid4())
         
         # Extract metadata
-        metadata = self._extract_metadata(doc, file_path, doc_id)
+        metadata = self._extract_metadata(doc, name, doc_id)
+        
+        # One pass over the body XML, in document order, for both sections and tables
+        paragraphs = []
+        tables = []
+        for block in iter_body_blocks(doc):
+            if block.is_table:
+                tables.append(self._extract_table(Table(block.element, doc), len(tables) + 1))
+            else:
+                paragraphs.append(block)
         
         # Extract headings dynamically
-        detected_headings = self.heading_extractor.extract_docx_headings(doc)
+        detected_headings = self.heading_extractor.extract_docx_headings(doc, paragraphs)
         
         # Convert to DocumentSection objects
         sections = []
@@ -45,19 +62,8 @@ class DocxExtractor(BaseExtractor):
             )
             sections.append(section)
         
-        # Extract tables and other content
-        tables = []
         lists = []
-        images = []
-
-        for element in doc.element.body:
-            if isinstance(element, CT_Tbl):
-                table = Table(element, doc)
-                extracted_table = self._extract_table(table, len(tables) + 1)
-                tables.append(extracted_table)
-
-        # Extract images (simplified - DOCX image extraction is complex)
-        images = self._extract_images(doc, doc_id)
+        images = self._extract_images(source, doc_id)
         
         return DocumentSchema(
             metadata=metadata,
@@ -107,9 +113,36 @@ class DocxExtractor(BaseExtractor):
             page=1
         )
     
-    def _extract_images(self, doc: Document, doc_id: str) -> List[DocumentImage]:
-        """Extract images from DOCX (simplified implementation)"""
+    def _extract_images(self, source, doc_id: str) -> List[DocumentImage]:
+        """OCR the raster images in word/media, reading them from the package (path or bytes) one at a time"""
         images = []
-        # Note: Full DOCX image extraction requires more complex implementation
-        # This is a placeholder for the structure
-        return images
\ No newline at end of file
+        
+        try:
+            with zipfile.ZipFile(binary_file(source)) as package, self.ocr.session() as ocr_session:
+                for info in package.infolist():
+                    name = info.filename
+                    if not name.startswith('word/media/') or os.path.splitext(name)[1].lower() not in OCR_IMAGE_EXTENSIONS:
+                        continue
+                    
+                    # Tiny or thin images and repeats of seen images are not OCRed again
+                    key = ocr_session.submit_bytes(package.read(info))
+                    if key is None:
+                        continue
+                    
+                    image = DocumentImage(
+                        image_id=f"img_{doc_id}_{len(images) + 1}",
+                        filename=os.path.basename(name),
+                        extracted_text="",
+                        source_section="",
+                        page=1
+                    )
+                    images.append((image, key))
+                
+                # Collect OCR results once every image has been queued
+                for image, key in images:
+                    image.extracted_text = ocr_session.text(key)
+        except Exception as e:
+            print(f"Error extracting images from DOCX: {e}")
+            return []
+        
+        return [image for image, _ in images]
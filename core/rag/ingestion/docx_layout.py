@@ -0,0 +1,72 @@
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Tuple
+from lxml import etree
+from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml.ns import nsmap, qn
+
+_P = qn('w:p')
+_TBL = qn('w:tbl')
+
+# Text-bearing children of the paragraph's runs, including runs inside hyperlinks,
+# as python-docx's Paragraph.text reads them; str() of each gives its text
+_RUN_TEXT = etree.XPath(
+    './w:r/*[self::w:t or self::w:tab or self::w:br or self::w:cr or self::w:noBreakHyphen or self::w:ptab]'
+    ' | ./w:hyperlink/w:r/*[self::w:t or self::w:tab or self::w:br or self::w:cr or self::w:noBreakHyphen or self::w:ptab]',
+    namespaces=nsmap
+)
+_STYLE_ID = etree.XPath('string(./w:pPr/w:pStyle/@w:val)', namespaces=nsmap)
+_FIRST_RUN_BOLD = etree.XPath('./w:r[1]/w:rPr/w:b', namespaces=nsmap)
+_TRAILING_NUMBER = re.compile(r'(\d+)$')
+
+@dataclass(slots=True)
+class DocxBlock:
+    """
+    One top-level body element of a DOCX document, in document order.
+
+    Paragraphs carry their text, style name, heading level (N for a
+    "Heading N" style, 1 for other heading styles and "Title", 0 otherwise)
+    and whether the first run is directly bold; tables carry only their
+    ``w:tbl`` element.
+    """
+    element: Any  # CT_P or CT_Tbl
+    is_table: bool = False
+    text: str = ""
+    style: str = ""
+    heading_level: int = 0
+    bold: bool = False
+
+def iter_body_blocks(doc) -> Iterator[DocxBlock]:
+    """Yield the paragraphs and tables of a python-docx Document in one pass over the body XML"""
+    styles = _paragraph_styles(doc)
+    default_style = styles.get('', ('Normal', 0))
+    for element in doc.element.body.iterchildren(_P, _TBL):
+        if element.tag == _TBL:
+            yield DocxBlock(element=element, is_table=True)
+            continue
+        style, level = styles.get(_STYLE_ID(element), default_style)
+        bold = _FIRST_RUN_BOLD(element)
+        yield DocxBlock(
+            element=element,
+            text=''.join(map(str, _RUN_TEXT(element))),
+            style=style,
+            heading_level=level,
+            bold=bool(bold) and bold[0].get(qn('w:val'), 'true') not in ('0', 'false', 'off')
+        )
+
+def _paragraph_styles(doc) -> Dict[str, Tuple[str, int]]:
+    """Style ID -> (name, heading level) for paragraph styles; '' maps to the default style"""
+    styles = {}
+    for style in doc.styles:
+        if style.type != WD_STYLE_TYPE.PARAGRAPH:
+            continue
+        name = style.name or ""
+        level = 0
+        if name.startswith('Heading') or name == 'Title':
+            match = _TRAILING_NUMBER.search(name)
+            level = int(match.group(1)) if match else 1
+        styles[style.style_id] = (name, level)
+    default = doc.styles.default(WD_STYLE_TYPE.PARAGRAPH)
+    if default is not None:
+        styles[''] = styles[default.style_id]
+    return styles
@@ -1,6 +1,7 @@
 import os
+import zipfile
 from typing import Optional
-from core.rag.ingestion.base_extractor import BaseExtractor
+from core.rag.ingestion.base_extractor import BaseExtractor, Source, binary_file, source_data, source_name
 from core.rag.ingestion.docx_extractor import DocxExtractor
 from core.rag.ingestion.pdf_extractor import PdfExtractor
 
@@ -13,16 +14,42 @@ class ExtractorFactory:
     }
     
     @classmethod
-    def get_extractor(cls, file_path: str) -> Optional[BaseExtractor]:
-        """Get appropriate extractor for file"""
-        _, ext = os.path.splitext(file_path)
+    def get_extractor(cls, file_path: Source, filename: Optional[str] = None) -> Optional[BaseExtractor]:
+        """
+        Get appropriate extractor for a path, or for in-memory bytes or a file object.
+        The type comes from the file name's extension; unnamed contents are sniffed.
+        """
+        _, ext = os.path.splitext(source_name(file_path, filename))
         ext = ext.lower().lstrip('.')
+        if not ext and not isinstance(file_path, (str, os.PathLike)):
+            ext = cls.detect_filetype(file_path) or ""
         
         if ext in cls._extractors:
             return cls._extractors[ext]()
         
         return None
     
+    @staticmethod
+    def detect_filetype(source: Source) -> Optional[str]:
+        """'pdf' or 'docx' from a document's leading bytes, None if neither"""
+        data = source_data(source)
+        if isinstance(data, str):
+            with open(data, 'rb') as f:
+                head = f.read(4)
+        else:
+            head = bytes(data[:4])
+        
+        if head == b'%PDF':
+            return 'pdf'
+        if head == b'PK\x03\x04':
+            try:
+                with zipfile.ZipFile(binary_file(data)) as package:
+                    if 'word/document.xml' in package.namelist():
+                        return 'docx'
+            except zipfile.BadZipFile:
+                pass
+        return None
+    
     @classmethod
     def register_extractor(cls, filetype: str, extractor_class: type):
         """Register new extractor for filetype"""
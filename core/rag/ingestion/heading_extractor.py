@@ -1,9 +1,13 @@
 import re
 import os
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterable
 from docx import Document
+import numpy as np
 import fitz  # PyMuPDF
 
+from core.rag.ingestion.docx_layout import DocxBlock, iter_body_blocks
+from core.rag.ingestion.pdf_layout import BOLD_FLAG, PageLayout, body_font, iter_page_layouts
+
 class HeadingExtractor:
     """Extract headings dynamically from documents"""
     
@@ -33,27 +37,28 @@ class HeadingExtractor:
         else:
             raise ValueError(f"Unsupported file type: {file_ext}")
     
-    def extract_docx_headings(self, doc: Document) -> List[Dict[str, Any]]:
-        """Extract headings from DOCX document"""
+    def extract_docx_headings(self, doc: Document, blocks: Optional[Iterable[DocxBlock]] = None) -> List[Dict[str, Any]]:
+        """Extract headings from DOCX document, or from its already walked body blocks"""
         headings = []
         current_section = None
+        current_level = 1
         current_content = []
         section_counter = 1
         
-        for paragraph in doc.paragraphs:
-            text = paragraph.text.strip()
-            if not text:
+        for block in iter_body_blocks(doc) if blocks is None else blocks:
+            text = block.text.strip()
+            if block.is_table or not text:
                 continue
             
             # Check if this paragraph is a heading
-            if self._is_docx_heading(paragraph):
+            if self._is_docx_heading(block):
                 # Save previous section if exists
                 if current_section and current_content:
                     headings.append({
                         'section_id': f'sec_{section_counter:03d}',
                         'heading': current_section,
                         'content': '\n'.join(current_content).strip(),
-                        'level': self._get_docx_heading_level(paragraph),
+                        'level': current_level,
                         'page_start': 1,  # DOCX doesn't have clear page concept
                         'page_end': 1
                     })
@@ -61,6 +66,7 @@ class HeadingExtractor:
                 
                 # Start new section
                 current_section = text
+                current_level = self._get_docx_heading_level(block)
                 current_content = []
             else:
                 # Add to current section content
@@ -86,7 +92,7 @@ class HeadingExtractor:
                 'section_id': f'sec_{section_counter:03d}',
                 'heading': current_section,
                 'content': '\n'.join(current_content).strip(),
-                'level': self._get_docx_heading_level(paragraph),
+                'level': current_level,
                 'page_start': 1,
                 'page_end': 1
             })
@@ -97,69 +103,10 @@ class HeadingExtractor:
         """Extract headings from PDF document"""
         try:
             doc = fitz.open(file_path)
-            headings = []
-            current_section = None
-            current_content = []
-            section_counter = 1
-            
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                blocks = page.get_text("dict")["blocks"]
-                
-                for block in blocks:
-                    if "lines" in block:
-                        for line in block["lines"]:
-                            for span in line["spans"]:
-                                text = span["text"].strip()
-                                if not text:
-                                    continue
-                                
-                                # Check if this looks like a heading
-                                if self._is_pdf_heading(span, text):
-                                    # Save previous section
-                                    if current_section and current_content:
-                                        headings.append({
-                                            'section_id': f'sec_{section_counter:03d}',
-                                            'heading': current_section,
-                                            'content': ' '.join(current_content).strip(),
-                                            'level': self._get_pdf_heading_level(span),
-                                            'page_start': page_num + 1,
-                                            'page_end': page_num + 1
-                                        })
-                                        section_counter += 1
-                                    
-                                    # Start new section
-                                    current_section = text
-                                    current_content = []
-                                else:
-                                    # Add to current section content
-                                    if current_section:
-                                        current_content.append(text)
-                                    else:
-                                        # Content before first heading
-                                        if not headings or headings[0]['heading'] != 'Introduction':
-                                            headings.insert(0, {
-                                                'section_id': 'sec_000',
-                                                'heading': 'Introduction',
-                                                'content': text,
-                                                'level': 1,
-                                                'page_start': page_num + 1,
-                                                'page_end': page_num + 1
-                                            })
-                                        else:
-                                            headings[0]['content'] += ' ' + text
-            
-            # Save final section
-            if current_section and current_content:
-                headings.append({
-                    'section_id': f'sec_{section_counter:03d}',
-                    'heading': current_section,
-                    'content': ' '.join(current_content).strip(),
-                    'level': 1,
-                    'page_start': len(doc),
-                    'page_end': len(doc)
-                })
-            
+            builder = self.pdf_section_builder(doc.get_toc(), len(doc))
+            for layout in iter_page_layouts(doc):
+                builder.add_page(layout)
+            headings = builder.finish(len(doc))
             doc.close()
             return headings
             
@@ -167,6 +114,18 @@ class HeadingExtractor:
             print(f"Error extracting PDF headings: {e}")
             return []
     
+    def pdf_section_builder(self, toc: Optional[List[list]] = None, page_count: int = 0) -> 'PdfSectionBuilder':
+        """
+        Incremental PDF section assembly, fed one page layout at a time.
+        
+        With a usable bookmark outline (``doc.get_toc()``), sections are cut at
+        the bookmarks; otherwise every span is classified heuristically.
+        """
+        entries = TocSectionBuilder.usable_entries(toc or [], page_count)
+        if entries:
+            return TocSectionBuilder(entries)
+        return PdfSectionBuilder()
+    
     def _extract_docx_sections(self, file_path: str) -> Dict[str, str]:
         """Extract sections from DOCX file"""
         try:
@@ -176,13 +135,13 @@ class HeadingExtractor:
             current_heading = None
             current_content = []
             
-            for paragraph in doc.paragraphs:
-                text = paragraph.text.strip()
-                if not text:
+            for block in iter_body_blocks(doc):
+                text = block.text.strip()
+                if block.is_table or not text:
                     continue
                 
                 # Check if this paragraph is a heading
-                if self._is_docx_heading(paragraph):
+                if self._is_docx_heading(block):
                     # Save previous section if exists
                     if current_heading and current_content:
                         sections[current_heading] = '\n'.join(current_content).strip()
@@ -220,44 +179,11 @@ class HeadingExtractor:
         try:
             doc = fitz.open(file_path)
             
-            sections = {}
-            current_heading = None
-            current_content = []
-            
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                blocks = page.get_text("dict")["blocks"]
-                
-                for block in blocks:
-                    if "lines" in block:
-                        for line in block["lines"]:
-                            for span in line["spans"]:
-                                text = span["text"].strip()
-                                if not text:
-                                    continue
-                                
-                                # Check if this looks like a heading
-                                if self._is_pdf_heading(span, text):
-                                    # Save previous section
-                                    if current_heading and current_content:
-                                        sections[current_heading] = ' '.join(current_content).strip()
-                                    
-                                    # Start new section
-                                    current_heading = text
-                                    current_content = []
-                                else:
-                                    # Add to current section content
-                                    if current_heading:
-                                        current_content.append(text)
-                                    else:
-                                        # Content before first heading
-                                        if "Introduction" not in sections:
-                                            sections["Introduction"] = ""
-                                        sections["Introduction"] += text + " "
-            
-            # Save final section
-            if current_heading and current_content:
-                sections[current_heading] = ' '.join(current_content).strip()
+            # Same sections as extract_pdf_headings, keyed by heading
+            builder = self.pdf_section_builder(doc.get_toc(), len(doc))
+            for layout in iter_page_layouts(doc):
+                builder.add_page(layout)
+            sections = {h['heading']: h['content'] for h in builder.finish(len(doc))}
             
             # Fallback if no sections found
             if not sections:
@@ -274,81 +200,26 @@ class HeadingExtractor:
             print(f"Error extracting PDF sections: {e}")
             return {"Document Content": "Error extracting content"}
     
-    def _is_docx_heading(self, paragraph) -> bool:
+    def _is_docx_heading(self, block: DocxBlock) -> bool:
         """Check if DOCX paragraph is a heading"""
-        # Check if it's a built-in heading style
-        if paragraph.style.name.startswith('Heading'):
+        # Check if it's a built-in heading or title style
+        if block.heading_level:
             return True
         
         # Check if it's bold and short (likely a heading)
-        if paragraph.runs:
-            first_run = paragraph.runs[0]
-            text = paragraph.text.strip()
-            if (first_run.bold and 
-                len(text) < 100 and 
-                not text.endswith('.') and
-                len(text.split()) <= 10):
-                return True
-        
-        # Check for numbering patterns
-        text = paragraph.text.strip()
-        if re.match(r'^\d+\.?\s+[A-Z]', text):  # "1. Title" or "1 Title"
-            return True
-        if re.match(r'^\d+\.\d+\.?\s+[A-Z]', text):  # "1.1 Title"
-            return True
-        if re.match(r'^[A-Z]\.?\s+[A-Z]', text):  # "A. Title"
-            return True
-        
-        return False
-    
-    def _is_pdf_heading(self, span: dict, text: str) -> bool:
-        """Check if PDF span is a heading"""
-        # Check font size (headings are usually larger)
-        font_size = span.get('size', 12)
-        if font_size > 14:
-            return True
-        
-        # Check if bold and short
-        font_flags = span.get('flags', 0)
-        is_bold = bool(font_flags & 2**4)  # Bold flag
-        
-        if (is_bold and 
+        text = block.text.strip()
+        if (block.bold and 
             len(text) < 100 and 
             not text.endswith('.') and
             len(text.split()) <= 10):
             return True
         
         # Check for numbering patterns
-        if re.match(r'^\d+\.?\s+[A-Z]', text):  # "1. Title"
-            return True
-        if re.match(r'^\d+\.\d+\.?\s+[A-Z]', text):  # "1.1 Title"
-            return True
-        if re.match(r'^[A-Z]\.?\s+[A-Z]', text):  # "A. Title"
-            return True
-        
-        return False
-    
-    def _get_docx_heading_level(self, paragraph) -> int:
-        """Get heading level from DOCX paragraph"""
-        style_name = paragraph.style.name
-        if 'Heading' in style_name:
-            try:
-                return int(style_name.split()[-1])
-            except:
-                return 1
-        return 1
-    
-    def _get_pdf_heading_level(self, span: dict) -> int:
-        """Get heading level from PDF span based on font size"""
-        font_size = span.get('size', 12)
-        if font_size >= 18:
-            return 1
-        elif font_size >= 16:
-            return 2
-        elif font_size >= 14:
-            return 3
-        else:
-            return 1
+        return _NUMBERED_HEADING.match(text) is not None
+    
+    def _get_docx_heading_level(self, block: DocxBlock) -> int:
+        """Get heading level from DOCX paragraph style"""
+        return block.heading_level or 1
     
     def map_headings_to_sections(self, detected_headings: List[Dict], target_sections: List[str]) -> Dict[str, Dict]:
         """
@@ -499,4 +370,257 @@ class HeadingExtractor:
                 "tone": "Professional and informative",
                 "length": "2-3 paragraphs, 150-250 words",
                 "format": "Well-structured paragraphs that clearly convey the main points and important details"
-            }
\ No newline at end of file
+            }
+
+class PdfSectionBuilder:
+    """
+    Assemble PDF sections from page layouts by classifying spans against the body font.
+    
+    Spans are buffered as pages arrive and classified in one pass by
+    ``finish``, once the document's body font is known. A heading is set at
+    least ``HEADING_SIZE_RATIO`` times the body size, or is short and either
+    bold (when the body is not) or numbered ("1.", "1.1", "A."). Larger sizes
+    rank as higher levels. Text before the first heading goes to an
+    ``Introduction`` section.
+    """
+    
+    HEADING_SIZE_RATIO = 1.15
+    MAX_LEVEL = 3
+    
+    def __init__(self):
+        self.headings = []
+        self.current_content = []
+        self.section_counter = 1
+        self.texts = []
+        self.pages = []
+        self.sizes = []
+        self.flags = []
+    
+    def add_page(self, layout: PageLayout) -> None:
+        """Consume the text spans of one page"""
+        self.add_spans(layout.page_num, layout.spans())
+    
+    def add_spans(self, page_num: int, spans: Iterable[Dict[str, Any]]) -> None:
+        """Consume the spans of a zero-based page; spans need 'text', 'size' and 'flags'"""
+        page = page_num + 1
+        for span in spans:
+            text = span["text"].strip()
+            if text:
+                self.texts.append(text)
+                self.pages.append(page)
+                self.sizes.append(span["size"])
+                self.flags.append(span["flags"])
+    
+    def finish(self, page_count: int) -> List[Dict[str, Any]]:
+        """Classify the buffered spans and return all sections"""
+        section = self._new_section('sec_000', 'Introduction', 1, 1)
+        previous_level = 0
+        for text, page, level in zip(self.texts, self.pages, self._classify()):
+            if (level and previous_level == level and not self.current_content and page == section['page_start']
+                    and not _NUMBERED_HEADING.match(text)):
+                section['heading'] += ' ' + text  # Heading wrapped over several spans; numbered ones start anew
+            elif level:
+                self._keep(section)
+                section = self._new_section('', text, level, page)
+            else:
+                if not self.current_content and section['section_id'] == 'sec_000':
+                    section['page_start'] = page
+                self.current_content.append(text)
+                section['page_end'] = page
+            previous_level = level
+        self._keep(section)
+        return self.headings
+    
+    def _classify(self) -> List[int]:
+        """Heading level of every buffered span, 0 for body text"""
+        if not self.texts:
+            return []
+        sizes = np.array(self.sizes, dtype=float)
+        bold = (np.array(self.flags, dtype=np.int64) & BOLD_FLAG) > 0
+        lengths = np.fromiter(map(len, self.texts), dtype=np.int64, count=len(self.texts))
+        body_size, body_bold = body_font(sizes, bold, lengths)
+        
+        # One regex scan over the whole document finds the numbered spans
+        offsets = np.cumsum(lengths + 1) - lengths - 1
+        starts = np.array([match.start() for match in _NUMBERED_HEADING.finditer('\n'.join(self.texts))], dtype=np.int64)
+        numbered = np.zeros(len(self.texts), dtype=bool)
+        if len(starts):
+            index = np.searchsorted(offsets, starts)
+            hit = index < len(offsets)
+            hit[hit] = offsets[index[hit]] == starts[hit]
+            numbered[index[hit]] = True
+        
+        large = sizes >= body_size * self.HEADING_SIZE_RATIO
+        styled = (lengths < 100) & (numbered | (bold & (not body_bold)))
+        levels = np.zeros(len(self.texts), dtype=np.int64)
+        
+        # Larger sizes are higher levels; body-size headings sit below all of them
+        heading_sizes = np.rint(sizes * 2) / 2
+        ranked = np.unique(heading_sizes[large])[::-1]
+        levels[styled] = len(ranked) + 1
+        levels[large] = np.searchsorted(-ranked, -heading_sizes[large]) + 1
+        np.minimum(levels, self.MAX_LEVEL, out=levels)
+        levels[lengths < 2] = 0  # Drop caps, bullets
+        
+        # Per-span checks only on the few candidates
+        for i in np.flatnonzero(levels):
+            text = self.texts[i]
+            if not _HAS_LETTER.search(text) or (not large[i] and (text.endswith('.') or len(text.split()) > 10)):
+                levels[i] = 0
+        return levels.tolist()
+    
+    def _keep(self, section: Dict[str, Any]) -> None:
+        """Add a section with content to the results, numbering it"""
+        if self.current_content:
+            section['content'] = ' '.join(self.current_content).strip()
+            if not section['section_id']:
+                section['section_id'] = f'sec_{self.section_counter:03d}'
+                self.section_counter += 1
+            self.headings.append(section)
+        self.current_content = []
+    
+    def _new_section(self, section_id: str, heading: str, level: int, page: int) -> Dict[str, Any]:
+        """Section dict in the shape produced by extract_pdf_headings"""
+        return {
+            'section_id': section_id,
+            'heading': heading,
+            'content': '',
+            'level': level,
+            'page_start': page,
+            'page_end': page
+        }
+
+class TocSectionBuilder(PdfSectionBuilder):
+    """
+    Assemble PDF sections from the document's bookmark outline.
+    
+    Spans are only scanned on pages that carry bookmarks, to find where each
+    title is printed; the heading spans start the section and are left out of
+    its content. A bookmark whose title is not found on its page starts at
+    the top of the page if no found bookmark precedes it there, and is
+    ignored otherwise. Text before the first bookmark becomes ``Introduction``.
+    """
+    
+    MAX_TITLE_SPANS = 6
+    
+    def __init__(self, entries: List[Dict[str, Any]]):
+        super().__init__()
+        self.entries_by_page = {}
+        for entry in entries:
+            self.entries_by_page.setdefault(entry['page'], []).append(entry)
+        self.content_pages = None  # (first, last) page with content in the open section
+        self.headings.append(self._new_section('sec_000', 'Introduction', 1, 1))
+        self.current_content = []
+    
+    @staticmethod
+    def usable_entries(toc: List[list], page_count: int) -> List[Dict[str, Any]]:
+        """
+        Outline entries with a title and a page in range, in page order.
+        Empty unless there are at least two and the first is near the front:
+        bookmarks only on late pages (footnotes, appendices) do not outline the document.
+        """
+        entries = []
+        for level, title, page, *_ in toc:
+            normalized = _normalize_title(title)
+            if normalized and 1 <= page <= page_count:
+                entries.append({'level': level, 'title': title.strip(), 'page': page, 'normalized': normalized})
+        entries.sort(key=lambda entry: entry['page'])
+        if len(entries) < 2 or entries[0]['page'] > max(3, page_count // 5):
+            return []
+        return entries
+    
+    def add_spans(self, page_num: int, spans: Iterable[Dict[str, Any]]) -> None:
+        """Consume the spans of a zero-based page, cutting sections at its bookmarks"""
+        page = page_num + 1
+        entries = self.entries_by_page.get(page)
+        if not entries:
+            for span in spans:
+                text = span["text"].strip()
+                if text:
+                    self._append(text, page)
+            return
+        
+        texts = [text for text in (span["text"].strip() for span in spans) if text]
+        starts = self._locate(entries, texts)
+        
+        heading_spans = 0
+        for index, text in enumerate(texts):
+            for entry, span_count in starts.get(index, ()):
+                self._start(entry, page)
+                heading_spans = span_count
+            if heading_spans:
+                heading_spans -= 1
+                continue
+            self._append(text, page)
+        for entry, _ in starts.get(len(texts), ()):
+            self._start(entry, page)
+    
+    def finish(self, page_count: int) -> List[Dict[str, Any]]:
+        """
+        Close the last section and return the sections that have content.
+        Section IDs follow bookmark order, so they stay stable across revisions.
+        """
+        self._close()
+        return [section for section in self.headings if section['content']]
+    
+    def _locate(self, entries: List[Dict[str, Any]], texts: List[str]) -> Dict[int, List[tuple]]:
+        """Span index -> [(entry, heading span count)] for the bookmarks on one page"""
+        starts = {}
+        normalized = [_normalize_title(text) for text in texts]
+        cursor, found = 0, False
+        for entry in entries:
+            match = self._find_title(entry['normalized'], normalized, cursor)
+            if match is not None:
+                index, span_count = match
+                starts.setdefault(index, []).append((entry, span_count))
+                cursor, found = index + span_count, True
+            elif not found:
+                starts.setdefault(0, []).append((entry, 0))
+        return starts
+    
+    def _find_title(self, title: str, normalized: List[str], cursor: int) -> Optional[tuple]:
+        """(first span index, span count) of the first run of spans from cursor that spells title"""
+        for start in range(cursor, len(normalized)):
+            joined = ""
+            for end in range(start, min(start + self.MAX_TITLE_SPANS, len(normalized))):
+                joined += normalized[end]
+                if joined.startswith(title):
+                    return start, end - start + 1
+                if not joined or not title.startswith(joined):
+                    break
+        return None
+    
+    def _start(self, entry: Dict[str, Any], page: int) -> None:
+        """Close the current section and open the one for a bookmark"""
+        self._close()
+        self.headings.append(self._new_section(
+            f'sec_{self.section_counter:03d}', entry['title'], entry['level'], page))
+        self.section_counter += 1
+        self.current_content = []
+    
+    def _append(self, text: str, page: int) -> None:
+        """Add a span's text to the current section"""
+        self.current_content.append(text)
+        first = self.content_pages[0] if self.content_pages else page
+        self.content_pages = (first, page)
+    
+    def _close(self) -> None:
+        """Write the buffered content into the open section"""
+        section = self.headings[-1]
+        section['content'] = ' '.join(self.current_content).strip()
+        if self.content_pages:
+            first, last = self.content_pages
+            if section['section_id'] == 'sec_000':
+                section['page_start'] = first
+            section['page_end'] = max(section['page_start'], last)
+        self.current_content = []
+        self.content_pages = None
+
+# "1. Title", "1 Title", "1.1 Title", "A. Title"; spans are scanned joined by newlines, which the gap may not cross
+_NUMBERED_HEADING = re.compile(r'^(?:\d+(?:\.\d+)?|[A-Z])\.?[^\S\n]+[A-Z]', re.MULTILINE)
+_HAS_LETTER = re.compile(r'[^\W\d_]')
+_NON_ALNUM = re.compile(r'[\W_]+')
+
+def _normalize_title(text: str) -> str:
+    """Lowercase alphanumerics only, so outline titles match printed text across spacing and punctuation"""
+    return _NON_ALNUM.sub('', text.lower())
@@ -0,0 +1,221 @@
+import os
+import json
+import hashlib
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+import fitz  # PyMuPDF
+from PIL import Image
+import pytesseract
+
+from core.config.rag_config import get_rag_config
+
+def ocr_samples(mode: str, width: int, height: int, stride: int, samples, tesseract_cmd: str) -> str:
+    """OCR raw pixel samples; PIL wraps the buffer instead of decoding an encoded image"""
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    image = Image.frombuffer(mode, (width, height), samples, "raw", mode, stride, 1)
+    try:
+        return pytesseract.image_to_string(image).strip()
+    except Exception as e:
+        # Some pytesseract errors cannot be unpickled and would break the pool
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+class ImageOcr:
+    """
+    OCR for embedded images with filtering, deduplication and a persistent cache.
+
+    Images are keyed by a hash of their raw (still encoded) stream, so a logo
+    repeated on every page or in every document is decoded and recognized
+    once. Results, including empty ones, are appended to a JSON-lines cache
+    at ``cache_path``. OCR runs in a pool of ``workers`` processes, or inline
+    when ``workers`` is 0.
+    """
+
+    def __init__(self, workers: int = 2, min_size: int = 24, max_aspect: float = 20.0,
+                 cache_path: Optional[str] = None, tesseract_cmd: str = "tesseract"):
+        self.workers = workers
+        self.min_size = min_size
+        self.max_aspect = max_aspect
+        self.cache_path = cache_path
+        self.tesseract_cmd = tesseract_cmd
+        self.cache = self._load_cache()
+
+    @classmethod
+    def from_config(cls, workers: Optional[int] = None) -> 'ImageOcr':
+        """OCR settings from the RAG config; ``workers`` overrides OCR_WORKERS"""
+        config = get_rag_config()
+        return cls(
+            workers=config.ocr_workers if workers is None else workers,
+            min_size=config.ocr_min_size,
+            max_aspect=config.ocr_max_aspect,
+            cache_path=config.ocr_cache_path,
+            tesseract_cmd=config.tesseract_cmd
+        )
+
+    def accepts(self, width: int, height: int) -> bool:
+        """Whether an image is large and square enough to hold readable text"""
+        short, long = min(width, height), max(width, height)
+        return short >= self.min_size and long <= short * self.max_aspect
+
+    def session(self) -> 'OcrSession':
+        """Start OCR for one document; use as a context manager"""
+        return OcrSession(self)
+
+    def image_key(self, pdf_doc, xref: int) -> str:
+        """Content hash of an image's raw stream and soft mask"""
+        digest = hashlib.blake2b(pdf_doc.xref_stream_raw(xref) or b"", digest_size=16)
+        smask = pdf_doc.xref_get_key(xref, "SMask")
+        if smask[0] == "xref":
+            digest.update(pdf_doc.xref_stream_raw(int(smask[1].split()[0])) or b"")
+        return digest.hexdigest()
+
+    def record(self, key: str, text: str) -> None:
+        """Cache an OCR result in memory and on disk"""
+        self.cache[key] = text
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            with open(self.cache_path, 'a') as f:
+                f.write(json.dumps({'key': key, 'text': text}) + "\n")
+        except OSError as e:
+            print(f"Error writing OCR cache: {e}")
+
+    def _load_cache(self) -> Dict[str, str]:
+        """Load cached OCR results; later lines win"""
+        cache = {}
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return cache
+        with open(self.cache_path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Torn write from an interrupted run
+                cache[entry['key']] = entry['text']
+        return cache
+
+class OcrSession:
+    """Per-document OCR: submit images while walking pages, read texts afterwards"""
+
+    def __init__(self, ocr: ImageOcr):
+        self.ocr = ocr
+        self.executor = None
+        self.inline = ocr.workers <= 0
+        self.keys = {}  # xref -> content key, None if filtered
+        self.pending = {}  # content key -> Future
+        self.failed = set()
+
+    def __enter__(self) -> 'OcrSession':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def submit(self, pdf_doc, image_info: Tuple) -> Optional[str]:
+        """
+        Queue OCR for a ``page.get_images(full=True)`` entry.
+
+        Returns the image's content key, or None if the image is filtered out
+        (too small, too elongated, or not decodable).
+        """
+        xref, width, height = image_info[0], image_info[2], image_info[3]
+        if not self.ocr.accepts(width, height):
+            return None
+
+        if xref in self.keys:
+            return self.keys[xref]
+
+        key = self.ocr.image_key(pdf_doc, xref)
+        self.keys[xref] = key
+        if key in self.ocr.cache or key in self.pending:
+            return key
+
+        try:
+            pix = fitz.Pixmap(pdf_doc, xref)
+        except Exception as e:
+            print(f"Error decoding image {xref}: {e}")
+            self.keys[xref] = None
+            return None
+
+        self.keys[xref] = self._queue(key, pix)
+        return self.keys[xref]
+
+    def submit_bytes(self, data: bytes) -> Optional[str]:
+        """
+        Queue OCR for an encoded image file (PNG, JPEG, GIF, BMP, TIFF).
+
+        The key hashes the file bytes, so a JPEG shares its key with the same
+        image embedded in a PDF. Returns None if the image is filtered out.
+        """
+        key = hashlib.blake2b(data, digest_size=16).hexdigest()
+        if key in self.ocr.cache or key in self.pending:
+            return key
+
+        try:
+            pix = fitz.Pixmap(data)
+        except Exception as e:
+            print(f"Error decoding image: {e}")
+            return None
+
+        if not self.ocr.accepts(pix.width, pix.height):
+            return None
+        return self._queue(key, pix)
+
+    def text(self, key: str) -> str:
+        """OCR text for a submitted key; empty if OCR failed"""
+        if key in self.ocr.cache:
+            return self.ocr.cache[key]
+        if key in self.failed:
+            return ""
+        try:
+            text = self.pending.pop(key).result()
+        except Exception as e:
+            print(f"OCR failed for image: {e}")
+            self.failed.add(key)
+            return ""
+        self.ocr.record(key, text)
+        return text
+
+    def _queue(self, key: str, pix) -> Optional[str]:
+        """Convert a decoded pixmap to gray or RGB without alpha and start its OCR"""
+        try:
+            if pix.colorspace is None:
+                return None  # Stencil mask: shape only, nothing to read
+            if pix.colorspace.name not in (fitz.csGRAY.name, fitz.csRGB.name):
+                pix = fitz.Pixmap(fitz.csRGB, pix)  # CMYK, ICC, separations
+            if pix.alpha:
+                pix = fitz.Pixmap(pix, 0)
+        except Exception as e:
+            print(f"Error converting image: {e}")
+            return None
+
+        mode = "L" if pix.n == 1 else "RGB"
+        self.pending[key] = self._run(mode, pix.width, pix.height, pix.stride, pix)
+        return key
+
+    def _run(self, mode: str, width: int, height: int, stride: int, pix) -> Future:
+        """OCR inline over the pixmap's own buffer, or ship its samples to the pool"""
+        if self.inline:
+            future = Future()
+            try:
+                future.set_result(ocr_samples(mode, width, height, stride, pix.samples_mv, self.ocr.tesseract_cmd))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.ocr.workers)
+
+        # Bound the decoded samples queued for the pool
+        in_flight = [future for future in self.pending.values() if not future.done()]
+        if len(in_flight) >= self.ocr.workers * 2:
+            wait(in_flight, return_when=FIRST_COMPLETED)
+        try:
+            return self.executor.submit(ocr_samples, mode, width, height, stride, pix.samples, self.ocr.tesseract_cmd)
+        except BrokenProcessPool as e:
+            print(f"OCR process pool failed, running OCR inline: {e}")
+            self.inline = True
+            return self._run(mode, width, height, stride, pix)
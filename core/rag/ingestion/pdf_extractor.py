@@ -1,41 +1,84 @@
 import os
 import uuid
-import fitz  # PyMuPDF
 import pdfplumber
-from typing import List, Dict, Any
-from PIL import Image
-import pytesseract
-import io
+from typing import List, Dict, Any, Optional
+from concurrent.futures import ProcessPoolExecutor
 
-from core.rag.ingestion.heading_extractor import HeadingExtractor
+from core.rag.ingestion.heading_extractor import HeadingExtractor, PdfSectionBuilder
+from core.rag.ingestion.ocr import ImageOcr, OcrSession
+from core.rag.ingestion.pdf_layout import (
+    PageLayout, iter_page_layouts, may_contain_table, open_pdf, page_ranges, pdf_worker_count
+)
 from core.rag.schema import (
     DocumentSchema, DocumentMetadata, DocumentSection, 
     DocumentTable, DocumentFigure, DocumentImage
 )
-from core.rag.ingestion.base_extractor import BaseExtractor
+from core.rag.ingestion.base_extractor import BaseExtractor, Source, binary_file, source_data, source_name
+from core.config.rag_config import get_rag_config
+
+# Document path or bytes, set once per pool worker so in-memory PDFs are not re-sent with every range
+_worker_source = None
+
+def _set_worker_source(source) -> None:
+    """Process pool initializer"""
+    global _worker_source
+    _worker_source = source
+
+def _extract_page_range(doc_id: str, start: int, stop: int, scan_all_tables: bool) -> Dict[str, Any]:
+    """Process pool entry point: extract one page range with its own file handles"""
+    extractor = PdfExtractor(workers=1, ocr_workers=0, scan_all_tables=scan_all_tables)
+    return extractor._extract_pages(_worker_source, doc_id, start, stop)
 
 class PdfExtractor(BaseExtractor):
     """PDF document extractor"""
     
-    def __init__(self):
+    def __init__(self, workers: Optional[int] = None, parallel_min_pages: Optional[int] = None,
+                 ocr_workers: Optional[int] = None, scan_all_tables: Optional[bool] = None):
+        config = get_rag_config()
         self.heading_extractor = HeadingExtractor()
+        self.workers = config.pdf_workers if workers is None else workers
+        self.parallel_min_pages = config.pdf_parallel_min_pages if parallel_min_pages is None else parallel_min_pages
+        self.scan_all_tables = config.table_scan_all_pages if scan_all_tables is None else scan_all_tables
+        self.ocr = ImageOcr.from_config(workers=ocr_workers)
     
-    def extract(self, file_path: str) -> DocumentSchema:
-        """Extract content from PDF file"""
+    def extract(self, source: Source, filename: Optional[str] = None) -> DocumentSchema:
+        """Extract content from a PDF path, bytes or file object"""
         doc_id = str(uuid.uuid4())
+        name = source_name(source, filename)
+        source = source_data(source)
         
         # Use PyMuPDF for text and images, pdfplumber for tables
-        pdf_doc = fitz.open(file_path)
+        pdf_doc = open_pdf(source)
+        page_count = len(pdf_doc)
         
         # Extract metadata
-        metadata = self._extract_metadata(pdf_doc, file_path, doc_id)
+        metadata = self._extract_metadata(pdf_doc, name, doc_id)
+        toc = pdf_doc.get_toc()
+        pdf_doc.close()
         
-        # Extract headings dynamically
-        detected_headings = self.heading_extractor.extract_pdf_headings(file_path)
+        # Sections are assembled here, in page order, so a section that continues
+        # across a page-range boundary is stitched exactly as in a serial pass
+        section_builder = self.heading_extractor.pdf_section_builder(toc, page_count)
+        tables = []
+        figures = []
+        images = []
+        
+        workers = pdf_worker_count(self.workers, page_count, self.parallel_min_pages)
+        results = None
+        if workers > 1:
+            results = self._extract_parallel(source, doc_id, page_count, workers)
+        if results is None:
+            results = [self._extract_pages(source, doc_id, 0, page_count, section_builder)]
+        
+        for result in results:
+            for page_num, spans in result['spans']:
+                section_builder.add_spans(page_num, spans)
+            tables.extend(result['tables'])
+            images.extend(result['images'])
         
         # Convert to DocumentSection objects
         sections = []
-        for heading_data in detected_headings:
+        for heading_data in section_builder.finish(page_count):
             section = DocumentSection(
                 section_id=heading_data['section_id'],
                 title=heading_data['heading'],
@@ -46,25 +89,6 @@ class PdfExtractor(BaseExtractor):
             )
             sections.append(section)
         
-        # Extract tables, figures, and images
-        tables = []
-        figures = []
-        images = []
-
-        # Process each page
-        for page_num in range(len(pdf_doc)):
-            page = pdf_doc[page_num]
-
-            # Extract tables using pdfplumber
-            page_tables = self._extract_tables_from_page(file_path, page_num)
-            tables.extend(page_tables)
-            
-            # Extract images
-            page_images = self._extract_images_from_page(page, page_num, doc_id)
-            images.extend(page_images)
-        
-        pdf_doc.close()
-        
         return DocumentSchema(
             metadata=metadata,
             sections=sections,
@@ -73,6 +97,69 @@ class PdfExtractor(BaseExtractor):
             images=images
         )
     
+    def _extract_parallel(self, source, doc_id: str, page_count: int, workers: int) -> Optional[List[Dict[str, Any]]]:
+        """Extract page ranges in a process pool; None if the pool fails"""
+        ranges = page_ranges(page_count, workers)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_set_worker_source, initargs=(source,)) as executor:
+                futures = [executor.submit(_extract_page_range, doc_id, start, stop, self.scan_all_tables)
+                           for start, stop in ranges]
+                return [future.result() for future in futures]
+        except Exception as e:
+            print(f"Parallel PDF extraction failed, falling back to a single process: {e}")
+            return None
+    
+    def _extract_pages(self, source, doc_id: str, start: int, stop: int,
+                       section_builder: Optional[PdfSectionBuilder] = None) -> Dict[str, Any]:
+        """
+        Extract tables, images and text spans from pages start..stop of a PDF path or bytes.
+        
+        Each page's layout is decoded once and shared by section assembly,
+        table detection and image extraction. Spans go straight to
+        ``section_builder`` when given; otherwise they are returned
+        (text, size and flags only) for the caller to assemble.
+        """
+        spans = []
+        tables = []
+        images = []
+        
+        pdf_doc = open_pdf(source)
+        # pdfplumber parses the file once for all pages; OCR runs in the background meanwhile
+        with pdfplumber.open(binary_file(source)) as plumber_pdf, self.ocr.session() as ocr_session:
+            for layout in iter_page_layouts(pdf_doc, start, stop):
+                page_num = layout.page_num
+                if section_builder is not None:
+                    section_builder.add_page(layout)
+                else:
+                    spans.append((page_num, [
+                        {'text': span['text'], 'size': span['size'], 'flags': span['flags']}
+                        for span in layout.spans()
+                    ]))
+                
+                # Extract tables using pdfplumber, only on pages with text and ruling lines
+                # in both directions unless full scanning is forced: pdfplumber's line
+                # strategy cannot find a table elsewhere
+                if page_num < len(plumber_pdf.pages) and (
+                        self.scan_all_tables or (layout.has_text and may_contain_table(layout.page))):
+                    plumber_page = plumber_pdf.pages[page_num]
+                    page_tables = self._extract_tables_from_page(plumber_page, page_num)
+                    tables.extend(page_tables)
+                    
+                    # Drop the page's parsed objects so memory stays flat across pages
+                    plumber_page.close()
+                
+                # Extract images
+                page_images = self._extract_images_from_page(layout, doc_id, ocr_session)
+                images.extend(page_images)
+            
+            # Collect OCR results once every page has been queued
+            for image, key in images:
+                image.extracted_text = ocr_session.text(key)
+        
+        images = [image for image, _ in images]
+        pdf_doc.close()
+        return {'spans': spans, 'tables': tables, 'images': images}
+    
     def supports_filetype(self, filetype: str) -> bool:
         """Check if supports PDF files"""
         return filetype.lower() in ['.pdf', 'pdf']
@@ -91,66 +178,51 @@ class PdfExtractor(BaseExtractor):
             pages=len(pdf_doc)
         )
     
-    def _extract_tables_from_page(self, file_path: str, page_num: int) -> List[DocumentTable]:
-        """Extract tables from a specific page using pdfplumber"""
+    def _extract_tables_from_page(self, page, page_num: int) -> List[DocumentTable]:
+        """Extract tables from an open pdfplumber page"""
         tables = []
         
         try:
-            with pdfplumber.open(file_path) as pdf:
-                if page_num < len(pdf.pages):
-                    page = pdf.pages[page_num]
-                    page_tables = page.extract_tables()
+            page_tables = page.extract_tables()
+            
+            for i, table_data in enumerate(page_tables):
+                if table_data and len(table_data) > 0:
+                    headers = table_data[0] if table_data[0] else []
+                    rows = table_data[1:] if len(table_data) > 1 else []
                     
-                    for i, table_data in enumerate(page_tables):
-                        if table_data and len(table_data) > 0:
-                            headers = table_data[0] if table_data[0] else []
-                            rows = table_data[1:] if len(table_data) > 1 else []
-                            
-                            table = DocumentTable(
-                                table_id=f"table_p{page_num + 1}_{i + 1}",
-                                headers=[str(h) if h else "" for h in headers],
-                                rows=[[str(cell) if cell else "" for cell in row] for row in rows],
-                                source_section="",
-                                page=page_num + 1
-                            )
-                            tables.append(table)
+                    table = DocumentTable(
+                        table_id=f"table_p{page_num + 1}_{i + 1}",
+                        headers=[str(h) if h else "" for h in headers],
+                        rows=[[str(cell) if cell else "" for cell in row] for row in rows],
+                        source_section="",
+                        page=page_num + 1
+                    )
+                    tables.append(table)
         except Exception as e:
             print(f"Error extracting tables from page {page_num}: {e}")
         
         return tables
     
-    def _extract_images_from_page(self, page, page_num: int, doc_id: str) -> List[DocumentImage]:
-        """Extract images from a PDF page"""
+    def _extract_images_from_page(self, layout: PageLayout, doc_id: str, ocr_session: OcrSession) -> List[tuple]:
+        """Queue OCR for a page's images; returns (image, OCR key) pairs, text filled in by the caller"""
         images = []
+        page_num = layout.page_num
         
         try:
-            image_list = page.get_images()
-            
-            for img_index, img in enumerate(image_list):
-                xref = img[0]
-                pix = fitz.Pixmap(page.parent, xref)
-                
-                if pix.n - pix.alpha < 4:  # GRAY or RGB
-                    img_data = pix.tobytes("png")
-                    
-                    # OCR the image
-                    ocr_text = ""
-                    try:
-                        pil_image = Image.open(io.BytesIO(img_data))
-                        ocr_text = pytesseract.image_to_string(pil_image)
-                    except Exception as e:
-                        print(f"OCR failed for image: {e}")
-                    
-                    image = DocumentImage(
-                        image_id=f"img_{doc_id}_p{page_num + 1}_{img_index + 1}",
-                        filename=f"image_p{page_num + 1}_{img_index + 1}.png",
-                        extracted_text=ocr_text.strip(),
-                        source_section="",
-                        page=page_num + 1
-                    )
-                    images.append(image)
+            for img_index, img in enumerate(layout.images):
+                # Tiny or thin images (rules, bullets) and repeats of seen images are not OCRed again
+                key = ocr_session.submit(layout.page.parent, img)
+                if key is None:
+                    continue
                 
-                pix = None
+                image = DocumentImage(
+                    image_id=f"img_{doc_id}_p{page_num + 1}_{img_index + 1}",
+                    filename=f"image_p{page_num + 1}_{img_index + 1}.png",
+                    extracted_text="",
+                    source_section="",
+                    page=page_num + 1
+                )
+                images.append((image, key))
         except Exception as e:
             print(f"Error extracting images from page {page_num}: {e}")
         
@@ -0,0 +1,113 @@
+import os
+from dataclasses import dataclass
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import numpy as np
+import fitz  # PyMuPDF
+
+# Text layout only: image blocks are listed through PageLayout.images instead,
+# so get_text("dict") does not decode and copy every embedded image
+TEXT_DICT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+# Span flag set for bold fonts
+BOLD_FLAG = fitz.TEXT_FONT_BOLD
+
+@dataclass(slots=True)
+class PageLayout:
+    """
+    One PDF page decoded once and shared by every extraction step.
+
+    ``blocks`` is the page's ``get_text("dict")`` block list and ``images``
+    its ``get_images(full=True)`` list; both are read-only for consumers.
+    """
+    page_num: int  # zero-based
+    page: Any  # fitz.Page
+    blocks: List[Dict[str, Any]]
+    images: List[tuple]
+
+    @property
+    def has_text(self) -> bool:
+        """Whether the page has any text block"""
+        return any("lines" in block for block in self.blocks)
+
+    def spans(self) -> Iterator[Dict[str, Any]]:
+        """Text spans in reading order"""
+        for block in self.blocks:
+            for line in block.get("lines", ()):
+                yield from line["spans"]
+
+def open_pdf(source) -> Any:
+    """Open a fitz document from a path or from in-memory bytes without copying them to disk"""
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+def iter_page_layouts(pdf_doc, start: int = 0, stop: Optional[int] = None) -> Iterator[PageLayout]:
+    """Yield the layout of pages start..stop of an open fitz document, parsing each once"""
+    stop = len(pdf_doc) if stop is None else min(stop, len(pdf_doc))
+    for page_num in range(start, stop):
+        page = pdf_doc[page_num]
+        yield PageLayout(
+            page_num=page_num,
+            page=page,
+            blocks=page.get_text("dict", flags=TEXT_DICT_FLAGS)["blocks"],
+            images=page.get_images(full=True)
+        )
+
+def pdf_worker_count(workers: int, page_count: int, min_pages: int) -> int:
+    """Processes to use for a PDF of page_count pages; 1 means extract serially"""
+    if page_count < max(min_pages, 2):
+        return 1
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    return max(1, min(workers, page_count))
+
+def page_ranges(page_count: int, workers: int, ranges_per_worker: int = 4) -> List[Tuple[int, int]]:
+    """Split pages into contiguous (start, stop) ranges, several per worker to even out slow pages"""
+    parts = max(1, min(page_count, workers * ranges_per_worker))
+    bounds = [page_count * i // parts for i in range(parts + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(parts)]
+
+def may_contain_table(page, min_length: float = 1.0) -> bool:
+    """
+    Whether a fitz page has ruling edges in both directions.
+
+    pdfplumber's default "lines" table strategy builds cells only from line,
+    rect and curve edges, so a page without at least two horizontal and two
+    vertical edges of min_length (its prefilter) cannot yield a table. Edges
+    are counted generously (a diagonal line counts as vertical, as it does
+    in pdfplumber) so no table page is skipped.
+    """
+    horizontal = vertical = 0
+    for path in page.get_cdrawings():
+        for item in path["items"]:
+            kind = item[0]
+            if kind == "re":
+                x0, y0, x1, y1 = item[1]
+                if abs(x1 - x0) >= min_length:
+                    horizontal += 2
+                if abs(y1 - y0) >= min_length:
+                    vertical += 2
+            else:
+                if kind == "qu":
+                    upper_left, upper_right, lower_left, lower_right = item[1]
+                    points = (upper_left, upper_right, lower_right, lower_left, upper_left)
+                else:
+                    points = item[1:]  # line ends or bezier points, as pdfplumber sees them
+                for (x0, y0), (x1, y1) in zip(points, points[1:]):
+                    if abs(y1 - y0) < 0.01:
+                        horizontal += abs(x1 - x0) >= min_length
+                    elif abs(y1 - y0) >= min_length or abs(x1 - x0) >= min_length:
+                        vertical += 1
+            if horizontal >= 2 and vertical >= 2:
+                return True
+    return False
+
+def body_font(sizes: np.ndarray, bold: np.ndarray, weights: np.ndarray) -> Tuple[float, bool]:
+    """
+    The document's body font as (size, bold): the most common pair by
+    character count, with sizes rounded to the nearest half point.
+    """
+    if not len(sizes):
+        return 12.0, False
+    keys = np.rint(sizes * 2).astype(np.int64) * 2 + bold
+    key = int(np.bincount(keys, weights=weights).argmax())
+    return key // 2 / 2, bool(key % 2)
@@ -1,14 +1,17 @@
 import os
 import json
+import hashlib
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
+from core.rag.ingestion.base_extractor import Source, source_data, source_name
 from core.rag.ingestion.extractor_factory import ExtractorFactory
 from core.rag.chunking.text_chunker import TextChunker
 from core.rag.vectorstore.vectorstore_factory import VectorStoreFactory
 from core.rag.retrieval.hybrid_retriever import HybridRetriever
+from core.rag.retrieval.reranker import CrossEncoderReranker
 from core.rag.generation.report_generator import ReportGenerator
-from core.rag.schema import DocumentSchema
+from core.rag.schema import DocumentSchema, RetrievalFilter
 from core.config.rag_config import get_rag_config
 
 class RAGPipeline:
@@ -20,63 +23,167 @@ class RAGPipeline:
         # Initialize components
         self.chunker = TextChunker(
             max_tokens=self.config.max_chunk_tokens,
-            overlap_tokens=self.config.chunk_overlap_tokens
+            overlap_tokens=self.config.chunk_overlap_tokens,
+            num_threads=self.config.tokenizer_threads,
+            min_tokens=self.config.min_chunk_tokens
         )
         self.vector_store = VectorStoreFactory.create_vectorstore()
-        self.retriever = HybridRetriever(self.vector_store)
+        self.reranker = None
+        if self.config.use_reranker:
+            self.reranker = CrossEncoderReranker(
+                model_name=self.config.reranker_model,
+                top_n=self.config.reranker_top_n,
+                batch_size=self.config.reranker_batch_size,
+                time_budget_ms=self.config.reranker_time_budget_ms,
+                cache_size=self.config.reranker_cache_size
+            )
+        self.retriever = HybridRetriever(self.vector_store, reranker=self.reranker)
         self.generator = ReportGenerator()
         
         # Ensure directories exist
         os.makedirs(self.config.data_dir, exist_ok=True)
         os.makedirs(self.config.structured_dir, exist_ok=True)
         os.makedirs(self.config.index_dir, exist_ok=True)
+        
+        # Stable source key -> doc_id, so re-ingesting a document updates it in place
+        self.sources_path = os.path.join(self.config.index_dir, "sources.json")
     
-    def ingest_document(self, file_path: str) -> Dict[str, Any]:
-        """Ingest a document through the full pipeline"""
+    def ingest_document(self, file_path: Source, source_key: Optional[str] = None,
+                        filename: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Ingest a document through the full pipeline.
+        
+        ``file_path`` may also be the document's bytes or a binary file
+        object, named by ``filename``. Bytes are extracted without a temp
+        file; a file object is read into bytes first.
+        Documents are identified by ``source_key``; without one the key is a
+        hash of the file's bytes, so only an identical file matches. If the
+        key was ingested before, the new version keeps the old doc_id and
+        only its new or changed chunks are embedded.
+        """
+        name = source_name(file_path, filename)
+        file_path = source_data(file_path)
         
         # Step 1: Extract content
-        extractor = ExtractorFactory.get_extractor(file_path)
+        extractor = ExtractorFactory.get_extractor(file_path, filename)
         if not extractor:
-            raise ValueError(f"No extractor available for file: {file_path}")
+            raise ValueError(f"No extractor available for file: {name or 'in-memory document'}")
         
-        document = extractor.extract(file_path)
+        document = extractor.extract(file_path, filename=filename)
         
-        # Step 2: Save structured document
-        structured_path = os.path.join(
-            self.config.structured_dir, 
-            f"{document.metadata.doc_id}.json"
-        )
-        with open(structured_path, 'w') as f:
-            json.dump(document.dict(), f, indent=2)
+        source_key = source_key or self._content_key(file_path)
+        sources = self._load_sources()
+        previous = self._load_structured(sources.get(source_key))
+        document.metadata.source_key = source_key
+        if previous is not None:
+            document.metadata.doc_id = previous.metadata.doc_id
         
-        # Step 3: Chunk document
-        chunks = self.chunker.chunk_document(document)
+        # Step 2-3: Chunk lazily and embed/index in bounded micro-batches
+        changes = None
+        if previous is None:
+            chunk_count = self.vector_store.add_documents_stream(
+                self.chunker.iter_chunks(document),
+                batch_size=self.config.embedding_batch_size
+            )
+        else:
+            # Unchanged sections produce identical text chunks, so they are not re-chunked,
+            # unless a stored chunk coalesced them with a changed section
+            unchanged = self._unchanged_sections(previous, document)
+            unchanged = self.vector_store.stable_sections(document.metadata.doc_id, unchanged)
+            changed = document.copy(update={
+                'sections': [section for section in document.sections if section.section_id not in unchanged]
+            })
+            changes = self.vector_store.update_document(
+                document.metadata.doc_id,
+                self.chunker.iter_chunks(changed),
+                keep_sections=sorted(unchanged),
+                batch_size=self.config.embedding_batch_size
+            )
+            changes['sections_changed'] = len(changed.sections)
+            chunk_count = changes['added'] + changes['unchanged']
         
-        # Step 4: Add to vector store
-        self.vector_store.add_documents(chunks)
+        # Step 4: Save the structured document once the store holds it, so a failed
+        # update leaves the previous revision as the baseline for the retry
+        structured_path = self._save_structured(document)
+        sources[source_key] = document.metadata.doc_id
+        self._save_sources(sources)
         
         # Step 5: Update retriever index
         self.retriever.update_index()
         
         return {
             "doc_id": document.metadata.doc_id,
+            "source_key": source_key,
             "title": document.metadata.title,
             "pages": document.metadata.pages,
-            "chunk_count": len(chunks),
+            "chunk_count": chunk_count,
+            "changes": changes,
             "structured_path": structured_path,
             "ingestion_time": datetime.now().isoformat()
         }
     
+    def _content_key(self, data) -> str:
+        """Default source key: a hash of the document's bytes, read from disk for a path"""
+        digest = hashlib.sha256()
+        if isinstance(data, str):
+            with open(data, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+        else:
+            digest.update(data)
+        return f"sha256:{digest.hexdigest()}"
+    
+    def _unchanged_sections(self, previous: DocumentSchema, document: DocumentSchema) -> set:
+        """IDs of sections whose hash matches the stored version"""
+        previous_hashes = {section.section_id: self._section_hash(section) for section in previous.sections}
+        return {section.section_id for section in document.sections
+                if previous_hashes.get(section.section_id) == self._section_hash(section)}
+    
+    def _section_hash(self, section) -> str:
+        """Hash of everything a section's text chunks are derived from"""
+        return hashlib.sha1(json.dumps(section.dict(), sort_keys=True).encode('utf-8')).hexdigest()
+    
+    def _save_structured(self, document: DocumentSchema) -> str:
+        """Atomically write a structured document; returns its path"""
+        structured_path = os.path.join(self.config.structured_dir, f"{document.metadata.doc_id}.json")
+        tmp_path = f"{structured_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(document.dict(), f, indent=2)
+        os.replace(tmp_path, structured_path)
+        return structured_path
+    
+    def _load_structured(self, doc_id: Optional[str]) -> Optional[DocumentSchema]:
+        """Load a previously saved structured document"""
+        if not doc_id:
+            return None
+        structured_path = os.path.join(self.config.structured_dir, f"{doc_id}.json")
+        if not os.path.exists(structured_path):
+            return None
+        return DocumentSchema.parse_file(structured_path)
+    
+    def _load_sources(self) -> Dict[str, str]:
+        """Load the source key registry"""
+        if not os.path.exists(self.sources_path):
+            return {}
+        with open(self.sources_path, 'r') as f:
+            return json.load(f)
+    
+    def _save_sources(self, sources: Dict[str, str]) -> None:
+        """Persist the source key registry"""
+        with open(self.sources_path, 'w') as f:
+            json.dump(sources, f, indent=2)
+    
     def ask_question(self, 
                     query: str, 
                     doc_ids: Optional[List[str]] = None,
-                    k: int = None) -> Dict[str, Any]:
+                    k: int = None,
+                    filters: Optional[RetrievalFilter] = None) -> Dict[str, Any]:
         """Ask a question and get grounded answer"""
         
         k = k or self.config.top_k
         
         # Retrieve relevant documents
-        retrieved_docs = self.retriever.retrieve(query, k=k, doc_ids=doc_ids)
+        retrieved_docs = self.retriever.retrieve(query, k=k, doc_ids=doc_ids, filters=filters)
         
         # Generate answer
         result = self.generator.generate_answer(query, retrieved_docs)
@@ -88,7 +195,8 @@ class RAGPipeline:
                        doc_ids: Optional[List[str]] = None,
                        style: str = "professional",
                        length: str = "medium",
-                       sections: Optional[List[str]] = None) -> Dict[str, Any]:
+                       sections: Optional[List[str]] = None,
+                       filters: Optional[RetrievalFilter] = None) -> Dict[str, Any]:
         """Generate structured report"""
         
         # If no query provided, use generic report query
@@ -96,7 +204,7 @@ class RAGPipeline:
             query = "Provide a comprehensive analysis of the key information, findings, and recommendations from the documents."
         
         # Retrieve relevant documents
-        retrieved_docs = self.retriever.retrieve(query, k=20, doc_ids=doc_ids)
+        retrieved_docs = self.retriever.retrieve(query, k=20, doc_ids=doc_ids, filters=filters)
         
         # Generate report
         report = self.generator.generate_report(
@@ -128,8 +236,13 @@ class RAGPipeline:
                 "embedding_model": self.config.embedding_model,
                 "max_chunk_tokens": self.config.max_chunk_tokens,
                 "chunk_overlap_tokens": self.config.chunk_overlap_tokens,
-                "top_k": self.config.top_k
+                "min_chunk_tokens": self.config.min_chunk_tokens,
+                "top_k": self.config.top_k,
+                "retrieval_mode": self.config.retrieval_mode,
+                "use_reranker": self.config.use_reranker
             },
+            "retrieval": self.retriever.stats,
+            "reranker": self.reranker.stats if self.reranker else None,
             "timestamp": datetime.now().isoformat()
         }
     
@@ -147,6 +260,12 @@ class RAGPipeline:
                 os.remove(structured_path)
                 deleted_files.append(structured_path)
         
+        # Forget the source keys of deleted documents
+        sources = self._load_sources()
+        remaining = {key: doc_id for key, doc_id in sources.items() if doc_id not in doc_ids}
+        if len(remaining) != len(sources):
+            self._save_sources(remaining)
+        
         # Update retriever
         self.retriever.update_index()
         
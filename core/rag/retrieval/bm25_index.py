@@ -0,0 +1,166 @@
+import os
+import json
+import numpy as np
+from collections import Counter
+from typing import List, Dict, Iterable, Optional
+
+class BM25Index:
+    """
+    Okapi BM25 index persisted as memory-mapped NumPy arrays.
+
+    Postings are stored in CSR layout: for term id ``t`` the documents
+    containing it are ``posting_docs[term_offsets[t]:term_offsets[t + 1]]``
+    with matching term frequencies in ``posting_tfs``. Scores match
+    ``rank_bm25.BM25Okapi`` for the same tokenization and parameters.
+    """
+
+    FORMAT_VERSION = 1
+    ARRAYS = ('term_offsets', 'posting_docs', 'posting_tfs', 'doc_lens', 'idf', 'chunk_ids')
+
+    def __init__(self, index_dir: str, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.index_dir = index_dir
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        self.generation = None
+        self.vocab: Dict[str, int] = {}
+        self.avgdl = 0.0
+        self.term_offsets = None
+        self.posting_docs = None
+        self.posting_tfs = None
+        self.doc_lens = None
+        self.idf = None
+        self.chunk_ids = None
+        self._length_norm = None
+
+        self.meta_path = os.path.join(self.index_dir, "meta.json")
+        self.vocab_path = os.path.join(self.index_dir, "vocab.json")
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        """Tokenize text for BM25 indexing and querying"""
+        return text.lower().split()
+
+    @property
+    def n_docs(self) -> int:
+        return 0 if self.doc_lens is None else len(self.doc_lens)
+
+    def build(self, chunk_ids: List[int], token_lists: Iterable[List[str]], generation: int) -> None:
+        """Build postings, document lengths and IDF table from tokenized chunks"""
+        vocab: Dict[str, int] = {}
+        post_terms, post_docs, post_tfs, doc_lens = [], [], [], []
+
+        for row, tokens in enumerate(token_lists):
+            doc_lens.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                post_terms.append(vocab.setdefault(term, len(vocab)))
+                post_docs.append(row)
+                post_tfs.append(tf)
+
+        terms = np.asarray(post_terms, dtype=np.int32)
+        order = np.argsort(terms, kind='stable')
+        doc_freqs = np.bincount(terms, minlength=len(vocab))
+
+        self.vocab = vocab
+        self.term_offsets = np.concatenate(([0], np.cumsum(doc_freqs))).astype(np.int64)
+        self.posting_docs = np.asarray(post_docs, dtype=np.int32)[order]
+        self.posting_tfs = np.asarray(post_tfs, dtype=np.int32)[order]
+        self.doc_lens = np.asarray(doc_lens, dtype=np.int32)
+        self.chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        self.idf = self._compute_idf(doc_freqs, len(doc_lens))
+        self.avgdl = float(self.doc_lens.mean()) if len(doc_lens) else 0.0
+        self.generation = generation
+        self._length_norm = None
+
+    def save(self) -> None:
+        """Write the index to disk; meta.json is written last and marks it valid"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        if os.path.exists(self.meta_path):
+            os.remove(self.meta_path)
+
+        # Arrays may be memory-mapped by this or another process, so they are
+        # replaced rather than truncated and rewritten in place
+        for name in self.ARRAYS:
+            path = os.path.join(self.index_dir, f"{name}.npy")
+            with open(f"{path}.tmp", 'wb') as f:
+                np.save(f, getattr(self, name))
+            os.replace(f"{path}.tmp", path)
+
+        terms = [None] * len(self.vocab)
+        for term, term_id in self.vocab.items():
+            terms[term_id] = term
+        with open(f"{self.vocab_path}.tmp", 'w') as f:
+            json.dump(terms, f)
+        os.replace(f"{self.vocab_path}.tmp", self.vocab_path)
+
+        with open(self.meta_path, 'w') as f:
+            json.dump({
+                'format_version': self.FORMAT_VERSION,
+                'generation': self.generation,
+                'n_docs': self.n_docs,
+                'avgdl': self.avgdl,
+                'k1': self.k1,
+                'b': self.b,
+                'epsilon': self.epsilon
+            }, f)
+
+    def load(self, expected_generation: Optional[int]) -> bool:
+        """Memory-map a stored index; returns False if missing or stale"""
+        try:
+            if expected_generation is None or not os.path.exists(self.meta_path):
+                return False
+
+            with open(self.meta_path, 'r') as f:
+                meta = json.load(f)
+
+            if (meta.get('format_version') != self.FORMAT_VERSION or
+                    meta.get('generation') != expected_generation or
+                    (meta['k1'], meta['b'], meta['epsilon']) != (self.k1, self.b, self.epsilon)):
+                return False
+
+            for name in self.ARRAYS:
+                setattr(self, name, np.load(os.path.join(self.index_dir, f"{name}.npy"), mmap_mode='r'))
+
+            with open(self.vocab_path, 'r') as f:
+                self.vocab = {term: term_id for term_id, term in enumerate(json.load(f))}
+
+            self.avgdl = meta['avgdl']
+            self.generation = meta['generation']
+            self._length_norm = None
+            return True
+        except Exception as e:
+            print(f"Error loading BM25 index: {e}")
+            return False
+
+    def get_scores(self, query_tokens: List[str], row_mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Score indexed chunks against the query tokens; rows outside row_mask stay 0"""
+        scores = np.zeros(self.n_docs, dtype=np.float64)
+        if not self.n_docs:
+            return scores
+
+        if self._length_norm is None:
+            self._length_norm = self.k1 * (1 - self.b + self.b * self.doc_lens / (self.avgdl or 1.0))
+
+        for token in query_tokens:
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                continue
+
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs = self.posting_docs[start:end]
+            tfs = self.posting_tfs[start:end]
+            if row_mask is not None:
+                keep = row_mask[docs]
+                docs, tfs = docs[keep], tfs[keep]
+            scores[docs] += self.idf[term_id] * (tfs * (self.k1 + 1) / (tfs + self._length_norm[docs]))
+
+        return scores
+
+    def _compute_idf(self, doc_freqs: np.ndarray, n_docs: int) -> np.ndarray:
+        """Okapi IDF with negative values floored at epsilon * average IDF"""
+        idf = np.log(n_docs - doc_freqs + 0.5) - np.log(doc_freqs + 0.5)
+        if len(idf):
+            average_idf = float(idf.sum()) / len(idf)
+            idf[idf < 0] = self.epsilon * average_idf
+        return idf.astype(np.float64)
@@ -0,0 +1,42 @@
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional
+
+from core.rag.schema import RetrievalResult, ChunkMetadata, Citation
+
+@dataclass(slots=True)
+class Hit:
+    """
+    Lightweight retrieval candidate used on the hot path.
+
+    ``metadata`` is the vector store's stored metadata dict and is shared,
+    not copied, so hits must be treated as read-only. Convert to the
+    Pydantic models only where they are serialized (``api/endpoints/rag.py``).
+    """
+    chunk_uid: int
+    score: float
+    content: str
+    metadata: Dict[str, Any]
+    sources: Optional[List[Dict[str, Any]]] = None  # Other copies of deduplicated text
+
+    def to_result(self) -> RetrievalResult:
+        """Convert to the Pydantic retrieval result"""
+        return RetrievalResult(
+            content=self.content,
+            score=self.score,
+            metadata=ChunkMetadata(**self.metadata)
+        )
+
+    def to_citation(self) -> Citation:
+        """Convert to a Pydantic citation"""
+        return Citation(
+            doc_id=self.metadata['doc_id'],
+            page=self.metadata['page_start'],
+            section=', '.join(self.metadata['heading_chain']),
+            chunk_id=self.metadata['chunk_id'],
+            content_preview=self.content[:200] + "..." if len(self.content) > 200 else self.content,
+            section_id=self.metadata['section_id'],
+            char_start=self.metadata.get('char_start'),
+            char_end=self.metadata.get('char_end'),
+            also_found_in=self.sources or [],
+            sub_spans=self.metadata.get('sub_spans') or []
+        )
@@ -1,199 +1,306 @@
-import math
-from typing import List, Dict, Any, Optional
-from rank_bm25 import BM25Okapi
-from collections import defaultdict
+import os
+import numpy as np
+from typing import List, Optional, Tuple
 
 from core.rag.vectorstore.base_vectorstore import BaseVectorStore
-from core.rag.schema import RetrievalResult
+from core.rag.retrieval.bm25_index import BM25Index
+from core.rag.retrieval.reranker import CrossEncoderReranker
+from core.rag.retrieval.hits import Hit
+from core.rag.schema import RetrievalFilter
+from core.config.rag_config import get_rag_config
+
+EMPTY_IDS = np.empty(0, dtype=np.int64)
+EMPTY_SCORES = np.empty(0, dtype=np.float64)
 
 class HybridRetriever:
     """Hybrid retrieval combining BM25 and vector search"""
-    
-    def __init__(self, vector_store: BaseVectorStore, alpha: float = 0.5):
+
+    def __init__(self, vector_store: BaseVectorStore, alpha: float = 0.5,
+                 reranker: Optional[CrossEncoderReranker] = None,
+                 max_candidates: Optional[int] = None,
+                 mode: Optional[str] = None,
+                 level: Optional[str] = None,
+                 fanout: Optional[int] = None):
+        config = get_rag_config()
         self.vector_store = vector_store
         self.alpha = alpha  # Weight for vector search (1-alpha for BM25)
-        self.bm25_index = None
-        self.bm25_docs = []
-        self.bm25_metadata = []
-        
-        self._build_bm25_index()
-    
-    def retrieve(self, query: str, k: int = 10, doc_ids: Optional[List[str]] = None) -> List[RetrievalResult]:
+        self.reranker = reranker
+        self.max_candidates = max_candidates or config.retrieval_max_candidates
+
+        # Coarse-to-fine routing through document or section centroids
+        self.mode = mode or config.retrieval_mode
+        self.level = level or config.hierarchical_level
+        self.fanout = fanout or config.hierarchical_fanout
+
+        # Candidate expansion metrics reported through RAGPipeline.get_status
+        self.stats = {'queries': 0, 'expansion_rounds_total': 0, 'max_expansion_rounds': 0, 'underfilled': 0}
+        self.last_expansion_rounds = 0
+
+        index_dir = getattr(vector_store, 'index_dir', None) or config.index_dir
+        self.bm25_index = BM25Index(os.path.join(index_dir, "bm25"))
+
+        self._load_bm25_index()
+
+    def retrieve(self, query: str, k: int = 10, doc_ids: Optional[List[str]] = None,
+                 filters: Optional[RetrievalFilter] = None) -> List[Hit]:
         """Perform hybrid retrieval"""
-        # Vector search
-        vector_results = self.vector_store.similarity_search(query, k=k*2, doc_ids=doc_ids)
-        
-        # BM25 search
-        bm25_results = self._bm25_search(query, k=k*2, doc_ids=doc_ids)
-        
+        # Compile the filter once; both legs only score chunks it allows
+        filters = (filters or RetrievalFilter()).merge_doc_ids(doc_ids)
+        allowed_ids = self.vector_store.filter_ids(filters) if not filters.is_empty() else None
+
+        # In hierarchical mode only chunks inside the best-matching groups are searched
+        query_vector = self.vector_store.embed_query(query)
+        if self.mode == "hierarchical" and query_vector is not None:
+            allowed_ids = self.vector_store.route_ids(query_vector, self.level, self.fanout, allowed_ids)
+
+        vector_ids, vector_scores, bm25_ids, bm25_scores = self._gather_candidates(query, k, allowed_ids, query_vector)
+
         # Combine and re-rank
-        combined_results = self._combine_results(vector_results, bm25_results)
-        
-        # Apply MMR for diversity
-        final_results = self._apply_mmr(combined_results, query, k)
-        
-        return final_results
-    
-    def _build_bm25_index(self):
-        """Build BM25 index from vector store metadata"""
+        chunk_uids, scores = self._combine_results(vector_ids, vector_scores, bm25_ids, bm25_scores)
+        chunk_uids, scores = self._drop_unknown(chunk_uids, scores)
+
+        # Optional cross-encoder pass over the fused head
+        if self.reranker is not None and len(chunk_uids):
+            chunk_uids, scores = self._rerank_and_diversify(query, chunk_uids, scores, k)
+        else:
+            # Apply MMR for diversity
+            chunk_uids, scores = self._apply_mmr(chunk_uids, scores, k)
+
+        return [self.vector_store.get_hit(chunk_uid, score)
+                for chunk_uid, score in zip(chunk_uids.tolist(), scores.tolist())]
+
+    def _load_bm25_index(self):
+        """Memory-map the persisted BM25 index, rebuilding it only if stale"""
+        generation = self.vector_store.get_stats().get('generation')
+        if self.bm25_index.load(generation):
+            return
+        self._build_bm25_index(generation)
+
+    def _build_bm25_index(self, generation: Optional[int] = None):
+        """Build BM25 index from vector store metadata and persist it"""
         try:
-            # Get all documents from vector store
-            stats = self.vector_store.get_stats()
-            if stats['total_chunks'] == 0:
-                return
-            
             # For FAISS store, we need to access metadata directly
-            if hasattr(self.vector_store, 'metadata'):
-                self.bm25_docs = []
-                self.bm25_metadata = []
-                
-                for chunk_data in self.vector_store.metadata.values():
-                    content = chunk_data['content']
-                    # Tokenize for BM25
-                    tokens = content.lower().split()
-                    self.bm25_docs.append(tokens)
-                    self.bm25_metadata.append(chunk_data)
-                
-                if self.bm25_docs:
-                    self.bm25_index = BM25Okapi(self.bm25_docs)
+            if not hasattr(self.vector_store, 'metadata'):
+                return
+
+            # Text is read from the store's arena one chunk at a time; duplicates
+            # are scored through their canonical chunk, like in the vector leg
+            chunk_ids = [int(chunk_id) for chunk_id, chunk_data in self.vector_store.metadata.items()
+                         if 'duplicate_of' not in chunk_data]
+            token_lists = (BM25Index.tokenize(self.vector_store.get_content(chunk_id)) for chunk_id in chunk_ids)
+
+            self.bm25_index.build(chunk_ids, token_lists, generation)
+            if generation is not None:
+                self.bm25_index.save()
         except Exception as e:
             print(f"Error building BM25 index: {e}")
-            self.bm25_index = None
-    
-    def _bm25_search(self, query: str, k: int, doc_ids: Optional[List[str]] = None) -> List[RetrievalResult]:
-        """Perform BM25 search"""
-        if not self.bm25_index or not self.bm25_docs:
-            return []
-        
-        query_tokens = query.lower().split()
-        scores = self.bm25_index.get_scores(query_tokens)
-        
+
+    def _gather_candidates(self, query: str, k: int, allowed_ids: Optional[np.ndarray] = None,
+                           query_vector: Optional[np.ndarray] = None) -> tuple:
+        """
+        Collect candidates from both legs, growing the depth geometrically.
+
+        Deduplication across legs and zero-score BM25 matches can leave fewer
+        than k candidates at the initial depth of k*2. Each round doubles the
+        depth and only materializes the newly reached ranks; the query
+        embedding and the BM25 score vector are computed once and reused.
+        """
+        total_chunks = self.vector_store.get_stats().get('total_chunks', 0)
+        if allowed_ids is not None:
+            total_chunks = min(total_chunks, len(allowed_ids))
+        max_depth = max(min(self.max_candidates, total_chunks), k * 2)
+
+        if query_vector is None:
+            query_vector = self.vector_store.embed_query(query)
+        bm25_scores = None
+        if self.bm25_index.n_docs:
+            row_mask = None
+            if allowed_ids is not None:
+                row_mask = np.isin(self.bm25_index.chunk_ids, self.vector_store.canonical_ids(allowed_ids))
+            bm25_scores = self.bm25_index.get_scores(BM25Index.tokenize(query), row_mask)
+
+        vector_ids, vector_scores, bm25_ids, bm25_scores_out = [], [], [], []
+        seen = set()
+        depth, offset, rounds = k * 2, 0, 0
+
+        while True:
+            rounds += 1
+
+            if query_vector is not None:
+                ids, scores = self.vector_store.search_ids(query_vector, k=depth, allowed_ids=allowed_ids, offset=offset)
+                vector_ids.append(ids)
+                vector_scores.append(scores)
+                seen.update(ids.tolist())
+
+            ids, scores = self._bm25_search(bm25_scores, k=depth, offset=offset)
+            ids = self.vector_store.resolve_ids(ids, allowed_ids)
+            bm25_ids.append(ids)
+            bm25_scores_out.append(scores)
+            seen.update(ids.tolist())
+
+            if len(seen) >= k or depth >= max_depth:
+                break
+
+            offset, depth = depth, min(depth * 2, max_depth)
+
+        self.last_expansion_rounds = rounds
+        self.stats['queries'] += 1
+        self.stats['expansion_rounds_total'] += rounds
+        self.stats['max_expansion_rounds'] = max(self.stats['max_expansion_rounds'], rounds)
+        if len(seen) < k:
+            self.stats['underfilled'] += 1
+
+        return (
+            np.concatenate(vector_ids) if vector_ids else EMPTY_IDS,
+            np.concatenate(vector_scores).astype(np.float64) if vector_scores else EMPTY_SCORES,
+            np.concatenate(bm25_ids),
+            np.concatenate(bm25_scores_out)
+        )
+
+    def _bm25_search(self, scores: Optional[np.ndarray], k: int, offset: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (chunk_uids, scores) for BM25 ranks offset..k of a precomputed score vector"""
+        if scores is None or offset >= len(scores):
+            return EMPTY_IDS, EMPTY_SCORES
+
         # Get top-k results
-        top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
-        
-        results = []
-        for idx in top_indices:
-            if scores[idx] <= 0:
-                continue
-                
-            chunk_data = self.bm25_metadata[idx]
-            
-            # Filter by doc_ids if specified
-            if doc_ids and chunk_data['metadata']['doc_id'] not in doc_ids:
-                continue
-            
-            result = RetrievalResult(
-                content=chunk_data['content'],
-                score=float(scores[idx]),
-                metadata=chunk_data['metadata']
-            )
-            results.append(result)
-        
-        return results
-    
-    def _combine_results(self, vector_results: List[RetrievalResult], bm25_results: List[RetrievalResult]) -> List[RetrievalResult]:
-        """Combine vector and BM25 results with weighted scoring"""
+        k = min(k, len(scores))
+        top_indices = np.argpartition(-scores, k - 1)[:k]
+        top_indices = top_indices[np.argsort(-scores[top_indices], kind='stable')][offset:]
+        top_indices = top_indices[scores[top_indices] > 0]
+
+        chunk_uids = np.asarray(self.bm25_index.chunk_ids[top_indices], dtype=np.int64)
+        return chunk_uids, scores[top_indices]
+
+    def _combine_results(self, vector_ids: np.ndarray, vector_scores: np.ndarray,
+                         bm25_ids: np.ndarray, bm25_scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Fuse both legs by global chunk ID with weighted, normalized scores"""
+        vector_ids, vector_scores = self._first_occurrences(vector_ids, vector_scores)
+        bm25_ids, bm25_scores = self._first_occurrences(bm25_ids, bm25_scores)
+
         # Normalize scores
-        vector_results = self._normalize_scores(vector_results)
-        bm25_results = self._normalize_scores(bm25_results)
-        
-        # Combine by chunk_id
-        combined_scores = defaultdict(lambda: {'vector': 0, 'bm25': 0, 'result': None})
-        
-        for result in vector_results:
-            chunk_id = result.metadata.chunk_id
-            combined_scores[chunk_id]['vector'] = result.score
-            combined_scores[chunk_id]['result'] = result
-        
-        for result in bm25_results:
-            chunk_id = result.metadata.chunk_id
-            combined_scores[chunk_id]['bm25'] = result.score
-            if combined_scores[chunk_id]['result'] is None:
-                combined_scores[chunk_id]['result'] = result
-        
-        # Calculate hybrid scores
-        final_results = []
-        for chunk_id, scores in combined_scores.items():
-            hybrid_score = (self.alpha * scores['vector'] + 
-                          (1 - self.alpha) * scores['bm25'])
-            
-            result = scores['result']
-            result.score = hybrid_score
-            final_results.append(result)
-        
-        # Sort by hybrid score
-        final_results.sort(key=lambda x: x.score, reverse=True)
-        return final_results
-    
-    def _normalize_scores(self, results: List[RetrievalResult]) -> List[RetrievalResult]:
+        weighted = np.concatenate((
+            self.alpha * self._normalize_scores(vector_scores),
+            (1 - self.alpha) * self._normalize_scores(bm25_scores)
+        ))
+        chunk_uids = np.concatenate((vector_ids, bm25_ids))
+        if not len(chunk_uids):
+            return EMPTY_IDS, EMPTY_SCORES
+
+        # Sum per chunk ID; ties keep the vector-then-BM25 arrival order
+        unique_ids, inverse = np.unique(chunk_uids, return_inverse=True)
+        fused = np.bincount(inverse, weights=weighted, minlength=len(unique_ids))
+        first_seen = np.full(len(unique_ids), len(chunk_uids))
+        np.minimum.at(first_seen, inverse, np.arange(len(chunk_uids)))
+
+        order = np.lexsort((first_seen, -fused))
+        return unique_ids[order], fused[order]
+
+    def _drop_unknown(self, chunk_uids: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Skip IDs without stored metadata, e.g. a vector left behind by an interrupted save"""
+        known = np.fromiter((self.vector_store.get_metadata(uid) is not None for uid in chunk_uids.tolist()),
+                            dtype=bool, count=len(chunk_uids))
+        if known.all():
+            return chunk_uids, scores
+        return chunk_uids[known], scores[known]
+
+    def _first_occurrences(self, chunk_uids: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Drop repeated IDs within one leg, keeping the best-ranked occurrence"""
+        _, first = np.unique(chunk_uids, return_index=True)
+        if len(first) == len(chunk_uids):
+            return chunk_uids, scores
+        first.sort()
+        return chunk_uids[first], scores[first]
+
+    def _normalize_scores(self, scores: np.ndarray) -> np.ndarray:
         """Normalize scores to 0-1 range"""
-        if not results:
-            return results
-        
-        scores = [r.score for r in results]
-        min_score = min(scores)
-        max_score = max(scores)
-        
+        if not len(scores):
+            return scores
+
+        min_score = scores.min()
+        max_score = scores.max()
+
         if max_score == min_score:
-            for result in results:
-                result.score = 1.0
-        else:
-            for result in results:
-                result.score = (result.score - min_score) / (max_score - min_score)
-        
-        return results
-    
-    def _apply_mmr(self, results: List[RetrievalResult], query: str, k: int, lambda_param: float = 0.7) -> List[RetrievalResult]:
-        """Apply Maximal Marginal Relevance for diversity"""
-        if len(results) <= k:
-            return results
-        
-        selected = []
-        remaining = results.copy()
-        
+            return np.ones_like(scores, dtype=np.float64)
+        return (scores - min_score) / (max_score - min_score)
+
+    def _rerank_and_diversify(self, query: str, chunk_uids: np.ndarray, scores: np.ndarray,
+                              k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rerank the fused head and apply MMR to it alone.
+
+        Cross-encoder and fused scores are on different scales, so the fused
+        tail never competes in MMR; it only fills slots the head cannot.
+        """
+        top_n = self.reranker.top_n
+        head_ids, head_scores = self._rerank(query, chunk_uids[:top_n], scores[:top_n])
+        head_ids, head_scores = self._apply_mmr(head_ids, head_scores, k)
+
+        missing = k - len(head_ids)
+        if missing <= 0:
+            return head_ids, head_scores
+        return (np.concatenate((head_ids, chunk_uids[top_n:top_n + missing])),
+                np.concatenate((head_scores, scores[top_n:top_n + missing])))
+
+    def _rerank(self, query: str, chunk_uids: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Run the cross-encoder over materialized hits"""
+        head = [self.vector_store.get_hit(chunk_uid, score)
+                for chunk_uid, score in zip(chunk_uids.tolist(), scores.tolist())]
+
+        head = self.reranker.rerank(query, head)
+
+        head_ids = np.fromiter((r.chunk_uid for r in head), dtype=np.int64, count=len(head))
+        head_scores = np.fromiter((r.score for r in head), dtype=np.float64, count=len(head))
+        return head_ids, head_scores
+
+    def _apply_mmr(self, chunk_uids: np.ndarray, scores: np.ndarray, k: int,
+                   lambda_param: float = 0.7) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Apply Maximal Marginal Relevance for diversity.
+
+        Relevance is min-max normalized first, so lambda weighs fused 0-1
+        scores and unbounded cross-encoder scores the same way. Callers must
+        not mix the two scales in one call.
+        """
+        if len(chunk_uids) <= k:
+            return chunk_uids, scores
+
+        relevance = self._normalize_scores(scores)
+
+        token_sets = [set(self.vector_store.get_content(uid).lower().split()) for uid in chunk_uids.tolist()]
+        remaining = np.ones(len(chunk_uids), dtype=bool)
+        max_similarity = np.zeros(len(chunk_uids), dtype=np.float64)
+
         # Select first result (highest score)
-        if remaining:
-            selected.append(remaining.pop(0))
-        
-        # Select remaining results using MMR
-        while len(selected) < k and remaining:
-            mmr_scores = []
-            
-            for candidate in remaining:
-                # Relevance score
-                relevance = candidate.score
-                
-                # Diversity score (minimum similarity to selected)
-                max_similarity = 0
-                for selected_result in selected:
-                    similarity = self._calculate_similarity(candidate.content, selected_result.content)
-                    max_similarity = max(max_similarity, similarity)
-                
-                # MMR score
-                mmr_score = lambda_param * relevance - (1 - lambda_param) * max_similarity
-                mmr_scores.append((mmr_score, candidate))
-            
-            # Select best MMR score
-            mmr_scores.sort(key=lambda x: x[0], reverse=True)
-            best_candidate = mmr_scores[0][1]
-            selected.append(best_candidate)
-            remaining.remove(best_candidate)
-        
-        return selected
-    
-    def _calculate_similarity(self, text1: str, text2: str) -> float:
-        """Calculate simple similarity between two texts"""
-        words1 = set(text1.lower().split())
-        words2 = set(text2.lower().split())
-        
+        selected = [0]
+        remaining[0] = False
+
+        # Only similarities to the newest selection can raise a candidate's max
+        while len(selected) < k and remaining.any():
+            newest = token_sets[selected[-1]]
+            for idx in np.flatnonzero(remaining).tolist():
+                similarity = self._calculate_similarity(token_sets[idx], newest)
+                if similarity > max_similarity[idx]:
+                    max_similarity[idx] = similarity
+
+            mmr_scores = lambda_param * relevance - (1 - lambda_param) * max_similarity
+            mmr_scores[~remaining] = -np.inf
+            best = int(np.argmax(mmr_scores))
+            selected.append(best)
+            remaining[best] = False
+
+        selected = np.asarray(selected, dtype=np.int64)
+        return chunk_uids[selected], scores[selected]
+
+    def _calculate_similarity(self, words1: set, words2: set) -> float:
+        """Calculate Jaccard similarity between two token sets"""
         if not words1 or not words2:
             return 0.0
-        
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
-        
-        return len(intersection) / len(union) if union else 0.0
-    
+
+        intersection = len(words1 & words2)
+        union = len(words1) + len(words2) - intersection
+
+        return intersection / union if union else 0.0
+
     def update_index(self):
         """Update BM25 index when vector store changes"""
-        self._build_bm25_index()
\ No newline at end of file
+        self._load_bm25_index()
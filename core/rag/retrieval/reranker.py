@@ -0,0 +1,112 @@
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from core.rag.retrieval.hits import Hit
+
+class CrossEncoderReranker:
+    """Latency-budgeted cross-encoder reranker for fused retrieval candidates"""
+
+    def __init__(self,
+                 model_name: str = "bge-reranker-large",
+                 top_n: int = 50,
+                 batch_size: int = 16,
+                 time_budget_ms: float = 300.0,
+                 cache_size: int = 4096,
+                 model=None):
+        self.model_name = model_name
+        self.top_n = top_n
+        self.batch_size = max(1, batch_size)
+        self.time_budget_ms = time_budget_ms
+        self.cache_size = cache_size
+        self.model = model
+        self._cache: "OrderedDict[Tuple[str, int], float]" = OrderedDict()
+        self._load_failed = False
+
+        # Counters reported through RAGPipeline.get_status
+        self.stats = {'requests': 0, 'budget_exhausted': 0, 'cache_hits': 0, 'scored_pairs': 0}
+
+    def rerank(self, query: str, results: List[Hit]) -> List[Hit]:
+        """
+        Rerank the top-N fused results with the cross-encoder.
+
+        Candidates are scored in fixed-size batches. If the time budget runs
+        out before every candidate is scored, the fused order is returned
+        unchanged so that request latency stays bounded.
+        """
+        if not results or not self._ensure_model():
+            return results
+
+        self.stats['requests'] += 1
+        deadline = time.perf_counter() + self.time_budget_ms / 1000.0
+
+        head = results[:self.top_n]
+        tail = results[self.top_n:]
+
+        scores: List[Optional[float]] = []
+        pending = []
+        for i, result in enumerate(head):
+            cached = self._cache_get((query, result.chunk_uid))
+            scores.append(cached)
+            if cached is None:
+                pending.append(i)
+            else:
+                self.stats['cache_hits'] += 1
+
+        for start in range(0, len(pending), self.batch_size):
+            if time.perf_counter() >= deadline:
+                self.stats['budget_exhausted'] += 1
+                return results
+
+            batch = pending[start:start + self.batch_size]
+            batch_scores = self.model.predict(
+                [(query, head[i].content) for i in batch],
+                batch_size=self.batch_size,
+                show_progress_bar=False
+            )
+            for i, score in zip(batch, batch_scores):
+                score = float(score)
+                scores[i] = score
+                self._cache_put((query, head[i].chunk_uid), score)
+            self.stats['scored_pairs'] += len(batch)
+
+        # Raw cross-encoder scores (often logits) replace the fused scores of the head
+        for result, score in zip(head, scores):
+            result.score = score
+
+        head.sort(key=lambda x: x.score, reverse=True)
+        return head + tail
+
+    def _ensure_model(self) -> bool:
+        """Lazily load the cross-encoder on CPU"""
+        if self.model is not None:
+            return True
+        if self._load_failed:
+            return False
+
+        try:
+            from sentence_transformers import CrossEncoder
+
+            # Bare model names refer to the BAAI reranker family on the HF hub
+            model_name = self.model_name if "/" in self.model_name else f"BAAI/{self.model_name}"
+            self.model = CrossEncoder(model_name, device="cpu")
+            return True
+        except Exception as e:
+            print(f"Error loading reranker model {self.model_name}: {e}")
+            self._load_failed = True
+            return False
+
+    def _cache_get(self, key: Tuple[str, int]) -> Optional[float]:
+        """Look up a cached score, refreshing its LRU position"""
+        score = self._cache.get(key)
+        if score is not None:
+            self._cache.move_to_end(key)
+        return score
+
+    def _cache_put(self, key: Tuple[str, int], score: float) -> None:
+        """Store a score, evicting the least recently used entries"""
+        self._cache[key] = score
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
@@ -9,6 +9,7 @@ class DocumentMetadata(BaseModel):
     date: str = ""
     source_path: str = ""
     doc_id: str = ""
+    source_key: str = ""  # Stable identity across re-ingests of the same document
     filetype: str = ""
     pages: int = 0
 
@@ -117,6 +118,32 @@ class ChunkMetadata(BaseModel):
     heading_chain: List[str]
     chunk_type: str  # text, table, figure, image
     token_count: int
+    chunk_uid: Optional[int] = None  # Global int64 ID assigned by the vector store
+    char_start: Optional[int] = None  # Character offsets into the section content
+    char_end: Optional[int] = None
+    sub_spans: Optional[List[Dict[str, Any]]] = None  # Parts of a coalesced chunk, see TextChunker._merge_chunks
+
+class RetrievalFilter(BaseModel):
+    """Chunk attribute filter pushed down into both retrieval legs"""
+    doc_ids: Optional[List[str]] = None
+    chunk_types: Optional[List[str]] = None  # text, table, figure, image
+    page_min: Optional[int] = None
+    page_max: Optional[int] = None
+    section_prefix: Optional[str] = None  # Matches section_id or heading path
+    min_tokens: Optional[int] = None
+    max_tokens: Optional[int] = None
+    
+    def is_empty(self) -> bool:
+        """True when no constraint is set"""
+        return all(value is None for value in self.dict().values())
+    
+    def merge_doc_ids(self, doc_ids: Optional[List[str]]) -> "RetrievalFilter":
+        """Intersect the filter with a plain doc_ids restriction"""
+        if not doc_ids:
+            return self
+        if self.doc_ids is not None:
+            doc_ids = [doc_id for doc_id in self.doc_ids if doc_id in doc_ids]
+        return self.copy(update={'doc_ids': list(doc_ids)})
 
 class RetrievalResult(BaseModel):
     """Retrieval result with metadata"""
@@ -130,4 +157,9 @@ class Citation(BaseModel):
     page: int
     section: str
     chunk_id: str
-    content_preview: str
\ No newline at end of file
+    content_preview: str
+    section_id: Optional[str] = None
+    char_start: Optional[int] = None  # Span of the cited text within the structured section
+    char_end: Optional[int] = None
+    also_found_in: List[Dict[str, Any]] = []  # Other documents containing the same (deduplicated) text
+    sub_spans: List[Dict[str, Any]] = []  # Original parts of a coalesced chunk
\ No newline at end of file
@@ -0,0 +1,121 @@
+import numpy as np
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+from core.rag.schema import RetrievalFilter
+
+class ChunkAttributeIndex:
+    """
+    Columnar copy of chunk metadata aligned with global chunk IDs.
+
+    Each row holds one chunk; string attributes are dictionary-encoded so a
+    filter is evaluated against the (small) vocabulary once and then as a
+    vectorized lookup over the code column. Rows are kept in ascending
+    chunk ID order: IDs are assigned monotonically and never reused, and
+    chunks whose metadata changes are rewritten in place by ``update``.
+    """
+
+    def __init__(self):
+        self.chunk_uids = np.empty(0, dtype=np.int64)
+        self.doc_codes = np.empty(0, dtype=np.int32)
+        self.type_codes = np.empty(0, dtype=np.int32)
+        self.section_codes = np.empty(0, dtype=np.int32)
+        self.page_start = np.empty(0, dtype=np.int32)
+        self.page_end = np.empty(0, dtype=np.int32)
+        self.token_count = np.empty(0, dtype=np.int32)
+
+        # Dictionaries for the encoded string columns
+        self.doc_vocab: Dict[str, int] = {}
+        self.type_vocab: Dict[str, int] = {}
+        self.section_vocab: Dict[Tuple[str, str], int] = {}  # (section_id, heading path)
+
+    def __len__(self) -> int:
+        return len(self.chunk_uids)
+
+    def rebuild(self, items: Iterable[Tuple[int, Dict[str, Any]]]) -> None:
+        """Rebuild every column from (chunk_uid, metadata dict) pairs"""
+        self.__init__()
+        items = sorted(items, key=lambda item: item[0])
+        self.append([uid for uid, _ in items], [metadata for _, metadata in items])
+
+    def append(self, chunk_uids: List[int], metadatas: List[Dict[str, Any]]) -> None:
+        """Append rows for newly added chunks, whose IDs are above every existing row"""
+        if not chunk_uids:
+            return
+
+        self.chunk_uids = np.concatenate((self.chunk_uids, np.asarray(chunk_uids, dtype=np.int64)))
+        for name, column in self._encode(metadatas).items():
+            setattr(self, name, np.concatenate((getattr(self, name), column)))
+
+    def update(self, chunk_uids: List[int], metadatas: List[Dict[str, Any]]) -> None:
+        """Rewrite the rows of existing chunks in place"""
+        if not chunk_uids:
+            return
+
+        rows = np.searchsorted(self.chunk_uids, np.asarray(chunk_uids, dtype=np.int64))
+        for name, column in self._encode(metadatas).items():
+            getattr(self, name)[rows] = column
+
+    def _encode(self, metadatas: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        """Column values for metadata dicts, growing the vocabularies as needed"""
+        doc_codes = [self.doc_vocab.setdefault(m['doc_id'], len(self.doc_vocab)) for m in metadatas]
+        type_codes = [self.type_vocab.setdefault(m['chunk_type'], len(self.type_vocab)) for m in metadatas]
+        section_codes = [
+            self.section_vocab.setdefault(
+                (m['section_id'], " / ".join(m.get('heading_chain') or [])), len(self.section_vocab)
+            )
+            for m in metadatas
+        ]
+        return {
+            'doc_codes': np.asarray(doc_codes, dtype=np.int32),
+            'type_codes': np.asarray(type_codes, dtype=np.int32),
+            'section_codes': np.asarray(section_codes, dtype=np.int32),
+            'page_start': np.asarray([m['page_start'] for m in metadatas], dtype=np.int32),
+            'page_end': np.asarray([m['page_end'] for m in metadatas], dtype=np.int32),
+            'token_count': np.asarray([m['token_count'] for m in metadatas], dtype=np.int32)
+        }
+
+    def remove(self, chunk_uids: List[int]) -> None:
+        """Drop rows for deleted chunks, preserving order"""
+        keep = ~np.isin(self.chunk_uids, np.asarray(chunk_uids, dtype=np.int64))
+        for name in ('chunk_uids', 'doc_codes', 'type_codes', 'section_codes', 'page_start', 'page_end', 'token_count'):
+            setattr(self, name, getattr(self, name)[keep])
+
+    def mask(self, filters: RetrievalFilter) -> np.ndarray:
+        """Compile a filter expression to a boolean mask over the rows"""
+        mask = np.ones(len(self), dtype=bool)
+
+        if filters.doc_ids is not None:
+            mask &= self._codes_in(self.doc_codes, self.doc_vocab, set(filters.doc_ids))
+        if filters.chunk_types is not None:
+            mask &= self._codes_in(self.type_codes, self.type_vocab, set(filters.chunk_types))
+        if filters.section_prefix:
+            prefix = filters.section_prefix.lower()
+            matching = {key for key in self.section_vocab
+                        if key[0].lower().startswith(prefix) or key[1].lower().startswith(prefix)}
+            mask &= self._codes_in(self.section_codes, self.section_vocab, matching)
+
+        # Page ranges select chunks that overlap [page_min, page_max]
+        if filters.page_min is not None:
+            mask &= self.page_end >= filters.page_min
+        if filters.page_max is not None:
+            mask &= self.page_start <= filters.page_max
+        if filters.min_tokens is not None:
+            mask &= self.token_count >= filters.min_tokens
+        if filters.max_tokens is not None:
+            mask &= self.token_count <= filters.max_tokens
+
+        return mask
+
+    def select(self, filters: Optional[RetrievalFilter]) -> Optional[np.ndarray]:
+        """Return the chunk IDs passing a filter, or None when nothing is filtered"""
+        if filters is None or filters.is_empty():
+            return None
+        return self.chunk_uids[self.mask(filters)]
+
+    def _codes_in(self, codes: np.ndarray, vocab: Dict[Any, int], values: set) -> np.ndarray:
+        """Vectorized membership test of a dictionary-encoded column"""
+        lookup = np.zeros(len(vocab) + 1, dtype=bool)
+        for value, code in vocab.items():
+            if value in values:
+                lookup[code] = True
+        return lookup[codes]
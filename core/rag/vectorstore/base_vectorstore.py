@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
-from core.rag.schema import RetrievalResult
+from typing import List, Dict, Any, Iterable, Optional
+import numpy as np
+from core.rag.schema import RetrievalResult, RetrievalFilter
+from core.rag.retrieval.hits import Hit
 
 class BaseVectorStore(ABC):
     """Base class for vector stores"""
@@ -10,11 +12,80 @@ class BaseVectorStore(ABC):
         """Add document chunks to the vector store"""
         pass
     
+    def add_documents_stream(self, chunks: Iterable[Dict[str, Any]], batch_size: Optional[int] = None) -> int:
+        """Add chunks from an iterator; returns the number of chunks added"""
+        chunks = list(chunks)
+        self.add_documents(chunks)
+        return len(chunks)
+    
+    @abstractmethod
+    def update_document(self, doc_id: str, chunks: Iterable[Dict[str, Any]],
+                        keep_sections: Optional[List[str]] = None,
+                        batch_size: Optional[int] = None) -> Dict[str, int]:
+        """Re-index a revised document, embedding only new or changed chunks"""
+        pass
+    
     @abstractmethod
-    def similarity_search(self, query: str, k: int = 10, doc_ids: Optional[List[str]] = None) -> List[RetrievalResult]:
+    def stable_sections(self, doc_id: str, sections: Iterable[str]) -> set:
+        """Subset of unchanged sections whose stored chunks can be kept on re-ingest"""
+        pass
+    
+    @abstractmethod
+    def similarity_search(self, query: str, k: int = 10, doc_ids: Optional[List[str]] = None,
+                          filters: Optional[RetrievalFilter] = None) -> List[RetrievalResult]:
         """Perform similarity search"""
         pass
     
+    def embed_query(self, query: str) -> Optional[np.ndarray]:
+        """Embed a query for repeated searches; None if unsupported"""
+        return None
+    
+    @abstractmethod
+    def search_by_vector(self, query_vector: np.ndarray, k: int = 10,
+                         allowed_ids: Optional[np.ndarray] = None, offset: int = 0) -> List[RetrievalResult]:
+        """Search with a precomputed query vector, skipping the first `offset` ranks"""
+        pass
+    
+    @abstractmethod
+    def search_ids(self, query_vector: np.ndarray, k: int = 10,
+                   allowed_ids: Optional[np.ndarray] = None, offset: int = 0) -> tuple:
+        """Return (chunk_uids, scores) arrays for ranks offset..k, restricted to allowed_ids"""
+        pass
+    
+    @abstractmethod
+    def filter_ids(self, filters: Optional[RetrievalFilter]) -> Optional[np.ndarray]:
+        """Compile a filter to the chunk IDs it allows; None means unfiltered"""
+        pass
+    
+    def canonical_ids(self, chunk_uids: np.ndarray) -> np.ndarray:
+        """Map chunk IDs to the IDs that own their vectors; identity without deduplication"""
+        return chunk_uids
+    
+    def resolve_ids(self, chunk_uids: np.ndarray, allowed_ids: Optional[np.ndarray] = None) -> np.ndarray:
+        """Map canonical result IDs back into allowed_ids; identity without deduplication"""
+        return chunk_uids
+    
+    @abstractmethod
+    def route_ids(self, query_vector: np.ndarray, level: str = "section", fanout: int = 8,
+                  allowed_ids: Optional[np.ndarray] = None) -> np.ndarray:
+        """Chunk IDs inside the documents or sections whose centroids best match the query"""
+        pass
+    
+    @abstractmethod
+    def get_metadata(self, chunk_uid: int) -> Optional[Dict[str, Any]]:
+        """Get stored chunk metadata by global chunk ID"""
+        pass
+    
+    @abstractmethod
+    def get_content(self, chunk_uid: int) -> str:
+        """Get stored chunk text by global chunk ID"""
+        pass
+    
+    @abstractmethod
+    def get_hit(self, chunk_uid: int, score: float) -> Optional[Hit]:
+        """Materialize a lightweight hit for a global chunk ID; None if it is unknown"""
+        pass
+    
     @abstractmethod
     def delete_documents(self, doc_ids: List[str]) -> None:
         """Delete documents from vector store"""
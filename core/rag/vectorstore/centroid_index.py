@@ -0,0 +1,129 @@
+import os
+import numpy as np
+from typing import List, Dict, Optional
+
+class CentroidIndex:
+    """
+    Mean chunk embedding per group (document or section) for coarse routing.
+
+    Per-group vector sums and counts are kept so new chunks fold in without
+    revisiting old ones. Each chunk's group is recorded alongside its global
+    chunk ID, which lets a routing decision expand back into chunk IDs.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.clear()
+
+    def __len__(self) -> int:
+        return int((self.counts > 0).sum())
+
+    def clear(self) -> None:
+        """Drop every group"""
+        self.generation = None
+        self.keys: List[str] = []
+        self.key_codes: Dict[str, int] = {}
+        self.sums = None
+        self.counts = np.empty(0, dtype=np.int64)
+        self.chunk_uids = np.empty(0, dtype=np.int64)
+        self.chunk_groups = np.empty(0, dtype=np.int32)
+        self._centroids = None
+
+    def add(self, chunk_uids: List[int], keys: List[str], vectors: np.ndarray) -> None:
+        """Fold normalized chunk vectors into their group sums"""
+        if not len(chunk_uids):
+            return
+
+        groups = np.asarray([self.key_codes.setdefault(key, len(self.key_codes)) for key in keys], dtype=np.int32)
+        self.keys.extend(list(self.key_codes)[len(self.keys):])
+
+        n_groups, dim = len(self.keys), vectors.shape[1]
+        if self.sums is None:
+            self.sums = np.zeros((0, dim), dtype=np.float64)
+        if n_groups > len(self.sums):
+            self.sums = np.vstack((self.sums, np.zeros((n_groups - len(self.sums), dim), dtype=np.float64)))
+            self.counts = np.concatenate((self.counts, np.zeros(n_groups - len(self.counts), dtype=np.int64)))
+
+        np.add.at(self.sums, groups, vectors.astype(np.float64))
+        np.add.at(self.counts, groups, 1)
+        self.chunk_uids = np.concatenate((self.chunk_uids, np.asarray(chunk_uids, dtype=np.int64)))
+        self.chunk_groups = np.concatenate((self.chunk_groups, groups))
+        self._centroids = None
+
+    def rebuild(self, chunk_uids: List[int], keys: List[str], vectors: np.ndarray) -> None:
+        """Recompute every centroid from scratch"""
+        self.clear()
+        self.add(chunk_uids, keys, vectors)
+
+    def route(self, query_vector: np.ndarray, fanout: int,
+              allowed_ids: Optional[np.ndarray] = None) -> np.ndarray:
+        """Return chunk IDs inside the `fanout` groups nearest to the query"""
+        if self.sums is None or not len(self.chunk_uids):
+            return np.empty(0, dtype=np.int64)
+
+        # Only groups that still hold an allowed chunk can be selected
+        member = np.ones(len(self.chunk_uids), dtype=bool)
+        if allowed_ids is not None:
+            member = np.isin(self.chunk_uids, allowed_ids)
+        candidates = np.zeros(len(self.keys), dtype=bool)
+        candidates[self.chunk_groups[member]] = True
+        candidates &= self.counts > 0
+        if not candidates.any():
+            return np.empty(0, dtype=np.int64)
+
+        scores = self.centroids() @ query_vector.reshape(-1).astype(np.float32)
+        scores[~candidates] = -np.inf
+        fanout = min(fanout, int(candidates.sum()))
+        selected = np.argpartition(-scores, fanout - 1)[:fanout]
+
+        member &= np.isin(self.chunk_groups, selected)
+        return self.chunk_uids[member]
+
+    def centroids(self) -> np.ndarray:
+        """Normalized mean vectors, one row per group"""
+        if self._centroids is None:
+            means = self.sums / np.maximum(self.counts, 1)[:, None]
+            norms = np.linalg.norm(means, axis=1, keepdims=True)
+            self._centroids = (means / np.where(norms > 0, norms, 1.0)).astype(np.float32)
+        return self._centroids
+
+    def save(self, generation: int) -> None:
+        """Persist sums, counts and chunk assignments for a store generation"""
+        if self.sums is None:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+
+        self.generation = generation
+        with open(self.path, 'wb') as f:
+            np.savez(
+                f,
+                generation=np.int64(generation),
+                keys=np.asarray(self.keys, dtype=str),
+                sums=self.sums,
+                counts=self.counts,
+                chunk_uids=self.chunk_uids,
+                chunk_groups=self.chunk_groups
+            )
+
+    def load(self, expected_generation: int) -> bool:
+        """Load persisted centroids; returns False if missing or stale"""
+        try:
+            if not os.path.exists(self.path):
+                return False
+
+            with np.load(self.path) as data:
+                if int(data['generation']) != expected_generation:
+                    return False
+                self.clear()
+                self.keys = data['keys'].tolist()
+                self.key_codes = {key: code for code, key in enumerate(self.keys)}
+                self.sums = data['sums']
+                self.counts = data['counts']
+                self.chunk_uids = data['chunk_uids']
+                self.chunk_groups = data['chunk_groups']
+                self.generation = expected_generation
+            return True
+        except Exception as e:
+            print(f"Error loading centroids: {e}")
+            return False
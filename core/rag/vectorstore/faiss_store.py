@@ -1,13 +1,20 @@
 import os
 import json
-import pickle
+import hashlib
 import numpy as np
 import faiss
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from openai import OpenAI
 
 from core.rag.vectorstore.base_vectorstore import BaseVectorStore
-from core.rag.schema import RetrievalResult, ChunkMetadata
+from core.rag.vectorstore.attribute_index import ChunkAttributeIndex
+from core.rag.vectorstore.centroid_index import CentroidIndex
+from core.rag.vectorstore.text_arena import TextArena
+from core.rag.chunking.dedup import ChunkDeduplicator
+from core.rag.schema import RetrievalResult, RetrievalFilter
+from core.rag.retrieval.hits import Hit
 from core.config.rag_config import get_rag_config
 
 class FAISSVectorStore(BaseVectorStore):
@@ -22,121 +29,574 @@ class FAISSVectorStore(BaseVectorStore):
         
         self.index_path = os.path.join(self.index_dir, "faiss.index")
         self.metadata_path = os.path.join(self.index_dir, "metadata.json")
+        self.manifest_path = os.path.join(self.index_dir, "manifest.json")
+        
+        # Chunk text lives once in the arena; metadata keeps (offset, length) spans
+        self.arena = TextArena(os.path.join(self.index_dir, "text_arena.bin"), use_mmap=self.config.text_arena_mmap)
         
         # Initialize or load index
         self.index = None
         self.metadata = {}
         self.doc_count = 0
+        self.generation = 0  # Bumped on every mutation; derived indexes key off it
+        self.next_chunk_uid = 0  # Global int64 chunk IDs, never reused
+        self.attributes = ChunkAttributeIndex()  # Columnar metadata for filter pushdown
+        
+        # Document and section centroids for coarse-to-fine retrieval
+        self.centroids = {
+            'document': CentroidIndex(os.path.join(self.index_dir, "doc_centroids.npz")),
+            'section': CentroidIndex(os.path.join(self.index_dir, "section_centroids.npz"))
+        }
+        
+        # Duplicate chunks get no vector of their own and point at a canonical chunk
+        self.dedup = None
+        if self.config.dedup_enabled:
+            self.dedup = ChunkDeduplicator(
+                os.path.join(self.index_dir, "dedup.npz"),
+                num_perm=self.config.dedup_num_perm,
+                bands=self.config.dedup_bands,
+                threshold=self.config.dedup_threshold,
+                near_duplicates=self.config.dedup_near_duplicates
+            )
+        self.canonical_of: Dict[int, int] = {}  # duplicate chunk_uid -> canonical chunk_uid
+        self.duplicates: Dict[int, List[int]] = {}  # canonical chunk_uid -> duplicate chunk_uids
+        self._duplicate_arrays = None
         
         self._load_index()
     
     def add_documents(self, chunks: List[Dict[str, Any]]) -> None:
         """Add document chunks to FAISS index"""
-        if not chunks:
-            return
+        self.add_documents_stream(chunks)
+    
+    def add_documents_stream(self, chunks: Iterable[Dict[str, Any]], batch_size: Optional[int] = None) -> int:
+        """
+        Embed and index chunks pulled from an iterator in bounded micro-batches.
+        
+        While one batch is being embedded on a worker thread, the next batch is
+        pulled from the iterator (running the chunker), so at most two batches
+        are held at a time. The index is saved
+        once, after the iterator is exhausted. Returns the number of chunks added.
+        
+        Chunks that duplicate an already seen chunk are not embedded; they
+        share the canonical chunk's vector (see ``_plan_batch``). If any batch
+        fails, the store is rolled back to its last saved state and the error
+        is re-raised.
+        """
+        try:
+            added = self._stream_batches(chunks, batch_size)
+        except Exception:
+            self._rollback()
+            raise
+        if added:
+            self.generation += 1
+            self._save_index()
+        return added
+    
+    def update_document(self, doc_id: str, chunks: Iterable[Dict[str, Any]],
+                        keep_sections: Optional[List[str]] = None,
+                        batch_size: Optional[int] = None) -> Dict[str, int]:
+        """
+        Re-index a revised document in place, embedding only what changed.
+        
+        Stored text chunks of ``doc_id`` whose sections are all in
+        ``keep_sections`` are left untouched; the caller must not pass them
+        again (see ``stable_sections``). Every other incoming chunk is matched by content hash
+        against the remaining stored chunks: a match keeps its chunk ID and
+        vector and only takes the new metadata, anything unmatched is embedded
+        as usual, and stored chunks left unmatched are tombstoned. A failure
+        rolls the store back to its last saved state.
+        """
+        try:
+            return self._update_document(doc_id, chunks, keep_sections, batch_size)
+        except Exception:
+            self._rollback()
+            raise
+    
+    def _update_document(self, doc_id: str, chunks: Iterable[Dict[str, Any]],
+                         keep_sections: Optional[List[str]],
+                         batch_size: Optional[int]) -> Dict[str, int]:
+        """Body of update_document; may leave partial state behind on failure"""
+        keep_sections = set(keep_sections or [])
+        stored: Dict[bytes, List[int]] = {}
+        kept = 0
+        for chunk_uid, chunk_data in self.metadata.items():
+            metadata = chunk_data['metadata']
+            if metadata['doc_id'] != doc_id:
+                continue
+            if metadata['chunk_type'] == 'text' and self._chunk_sections(metadata) <= keep_sections:
+                kept += 1
+                continue
+            digest = self._content_digest(self.arena.read(*chunk_data['text']))
+            stored.setdefault(digest, []).append(int(chunk_uid))
+        
+        matched = []
+        
+        def changed_chunks():
+            for chunk in chunks:
+                candidates = stored.get(self._content_digest(chunk['content']))
+                if not candidates:
+                    yield chunk
+                    continue
+                chunk_uid = candidates.pop(0)
+                chunk['metadata'].chunk_uid = chunk_uid
+                self.metadata[str(chunk_uid)]['metadata'] = chunk['metadata'].dict()
+                matched.append(chunk_uid)
+        
+        added = self._stream_batches(changed_chunks(), batch_size)
+        removed = [chunk_uid for chunk_uids in stored.values() for chunk_uid in chunk_uids]
+        
+        # Matched chunks may have moved pages or sections
+        if matched:
+            self.attributes.update(matched, [self.metadata[str(uid)]['metadata'] for uid in matched])
+        if removed:
+            self._remove_chunks(removed)
+        elif matched:
+            self._rebuild_centroids()
+        
+        if added or removed or matched:
+            self.generation += 1
+            self._save_index()
+        return {'added': added, 'unchanged': kept + len(matched), 'removed': len(removed)}
+    
+    def stable_sections(self, doc_id: str, sections: Iterable[str]) -> set:
+        """
+        Largest subset of sections that can be kept on re-ingest.
+        
+        A coalesced text chunk can span several sections, so a section is
+        only stable if every stored chunk it shares is made of stable sections.
+        """
+        stable = set(sections)
+        groups = [self._chunk_sections(chunk_data['metadata']) for chunk_data in self.metadata.values()
+                  if chunk_data['metadata']['doc_id'] == doc_id and chunk_data['metadata']['chunk_type'] == 'text']
+        groups = [group for group in groups if len(group) > 1]
+        
+        changed = True
+        while changed:
+            changed = False
+            for group in groups:
+                if group & stable and not group <= stable:
+                    stable -= group
+                    changed = True
+        return stable
+    
+    def _chunk_sections(self, metadata: Dict[str, Any]) -> set:
+        """Sections a stored chunk was built from"""
+        if metadata.get('sub_spans'):
+            return {span['section_id'] for span in metadata['sub_spans']}
+        return {metadata['section_id']}
+    
+    def _stream_batches(self, chunks: Iterable[Dict[str, Any]], batch_size: Optional[int] = None) -> int:
+        """Embed and index chunks batch by batch without saving; returns the number added"""
+        batches = self._batched(chunks, batch_size or self.config.embedding_batch_size)
+        parents = {}  # Sections already interned in the arena, shared across batches
+        added = 0
+        
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding") as executor:
+            batch = next(batches, None)
+            plan, pending = self._submit_batch(executor, batch) if batch else (None, None)
+            
+            while batch is not None:
+                # The chunker fills the next batch while this one is embedded
+                next_batch = next(batches, None)
+                embeddings = pending.result() if pending is not None else []
+                
+                # Index before planning the next batch so it sees this batch's canonicals
+                self._index_batch(batch, plan, embeddings, parents)
+                added += len(batch)
+                
+                batch = next_batch
+                plan, pending = self._submit_batch(executor, batch) if batch is not None else (None, None)
         
-        # Generate embeddings
-        texts = [chunk['content'] for chunk in chunks]
-        embeddings = self._get_embeddings(texts)
+        return added
+    
+    def _batched(self, chunks: Iterable[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+        """Group an iterator of chunks into lists of at most batch_size"""
+        iterator = iter(chunks)
+        while True:
+            batch = list(islice(iterator, max(1, batch_size)))
+            if not batch:
+                return
+            yield batch
+    
+    def _submit_batch(self, executor: ThreadPoolExecutor, chunks: List[Dict[str, Any]]) -> tuple:
+        """Plan a batch and start embedding its canonical chunks; returns (plan, future or None)"""
+        plan = self._plan_batch(chunks)
+        texts = [chunk['content'] for chunk, (canonical, _, _, _) in zip(chunks, plan) if canonical is None]
+        return plan, executor.submit(self._get_embeddings, texts) if texts else None
+    
+    def _plan_batch(self, chunks: List[Dict[str, Any]]) -> List[Tuple[Optional[int], bool, Optional[bytes], Any]]:
+        """
+        Assign global IDs and look up duplicates before anything is embedded.
         
-        # Initialize index if needed
-        if self.index is None:
-            dimension = len(embeddings[0])
-            self.index = faiss.IndexFlatIP(dimension)  # Inner product for cosine similarity
+        Returns one (canonical chunk_uid or None, exact match, digest,
+        signature) tuple per chunk. Nothing is registered with the
+        deduplicator until ``_index_batch`` has indexed the canonical chunk;
+        copies within the batch are matched against a staging deduplicator.
+        """
+        plan = []
+        staged = self.dedup.empty_copy() if self.dedup is not None else None
+        for chunk in chunks:
+            # Intern every chunk to a global ID shared by FAISS, BM25 and metadata
+            chunk_uid = self.next_chunk_uid
+            self.next_chunk_uid += 1
+            chunk['metadata'].chunk_uid = chunk_uid
+            
+            if self.dedup is None:
+                plan.append((None, False, None, None))
+                continue
+            
+            canonical, exact, digest, signature = self.dedup.find(chunk['content'])
+            if canonical is None:
+                canonical, exact = staged.match(digest, signature)
+                if canonical is None:
+                    staged.add(chunk_uid, digest=digest, signature=signature)
+            plan.append((canonical, exact, digest, signature))
+        return plan
+    
+    def _index_batch(self, chunks: List[Dict[str, Any]], plan: List[tuple],
+                     embeddings: List[List[float]], parents: Dict) -> None:
+        """Add one embedded batch to FAISS, the arena and the derived indexes"""
+        chunk_uids = [chunk['metadata'].chunk_uid for chunk in chunks]
+        canonical_rows = [row for row, (canonical, _, _, _) in enumerate(plan) if canonical is None]
+        
+        if embeddings:
+            # Initialize index if needed
+            if self.index is None:
+                self.index = self._new_index(len(embeddings[0]))
+            
+            # Normalize embeddings for cosine similarity
+            embeddings_array = np.array(embeddings).astype('float32')
+            faiss.normalize_L2(embeddings_array)
+            self.index.add_with_ids(embeddings_array, np.asarray([chunk_uids[row] for row in canonical_rows], dtype='int64'))
         
-        # Normalize embeddings for cosine similarity
-        embeddings_array = np.array(embeddings).astype('float32')
-        faiss.normalize_L2(embeddings_array)
+        # Canonical chunks own a vector now, so later chunks may resolve to them
+        if self.dedup is not None:
+            for row in canonical_rows:
+                _, _, digest, signature = plan[row]
+                self.dedup.add(chunk_uids[row], digest=digest, signature=signature)
         
-        # Add to index
-        start_id = len(self.metadata)
-        self.index.add(embeddings_array)
+        # Exact duplicates reuse the canonical text; near duplicates keep their own wording
+        spans = iter(self._intern_texts([chunk for chunk, (_, exact, _, _) in zip(chunks, plan) if not exact], parents))
         
         # Store metadata
-        for i, chunk in enumerate(chunks):
-            chunk_id = start_id + i
-            self.metadata[str(chunk_id)] = {
-                'content': chunk['content'],
+        for chunk_uid, chunk, (canonical, exact, _, _) in zip(chunk_uids, chunks, plan):
+            entry = {
+                'text': list(self.metadata[str(canonical)]['text'] if exact else next(spans)),
                 'metadata': chunk['metadata'].dict()
             }
+            if canonical is not None:
+                entry['duplicate_of'] = canonical
+                self.canonical_of[chunk_uid] = canonical
+                self.duplicates.setdefault(canonical, []).append(chunk_uid)
+                self._duplicate_arrays = None
+            self.metadata[str(chunk_uid)] = entry
+        self.attributes.append(chunk_uids, [self.metadata[str(uid)]['metadata'] for uid in chunk_uids])
+        
+        # Duplicates join their own document's centroids with the canonical vector
+        vectors = np.empty((len(chunks), self.index.d), dtype='float32')
+        if embeddings:
+            vectors[canonical_rows] = embeddings_array
+        for row, (canonical, _, _, _) in enumerate(plan):
+            if canonical is not None:
+                vectors[row] = self.index.reconstruct(canonical)
+        self._add_centroids(chunk_uids, vectors)
         
         self.doc_count += len(chunks)
-        self._save_index()
     
-    def similarity_search(self, query: str, k: int = 10, doc_ids: Optional[List[str]] = None) -> List[RetrievalResult]:
+    def similarity_search(self, query: str, k: int = 10, doc_ids: Optional[List[str]] = None,
+                          filters: Optional[RetrievalFilter] = None) -> List[RetrievalResult]:
         """Perform similarity search"""
         if self.index is None or self.index.ntotal == 0:
             return []
         
-        # Get query embedding
+        filters = (filters or RetrievalFilter()).merge_doc_ids(doc_ids)
+        return self.search_by_vector(self.embed_query(query), k=k, allowed_ids=self.filter_ids(filters))
+    
+    def embed_query(self, query: str) -> Optional[np.ndarray]:
+        """Embed and normalize a query so it can be searched repeatedly"""
+        if self.index is None or self.index.ntotal == 0:
+            return None
+        
         query_embedding = self._get_embeddings([query])[0]
         query_vector = np.array([query_embedding]).astype('float32')
         faiss.normalize_L2(query_vector)
+        return query_vector
+    
+    def search_by_vector(self, query_vector: np.ndarray, k: int = 10,
+                         allowed_ids: Optional[np.ndarray] = None, offset: int = 0) -> List[RetrievalResult]:
+        """Search with a precomputed query vector, skipping the first `offset` ranks"""
+        chunk_uids, scores = self.search_ids(query_vector, k=k, allowed_ids=allowed_ids, offset=offset)
+        hits = (self.get_hit(chunk_uid, score) for chunk_uid, score in zip(chunk_uids.tolist(), scores.tolist()))
+        return [hit.to_result() for hit in hits if hit is not None]
+    
+    def search_ids(self, query_vector: np.ndarray, k: int = 10,
+                   allowed_ids: Optional[np.ndarray] = None, offset: int = 0) -> tuple:
+        """Return (chunk_uids, scores) arrays for ranks offset..k, restricted to allowed_ids"""
+        if (self.index is None or self.index.ntotal == 0 or query_vector is None or
+                (allowed_ids is not None and not len(allowed_ids))):
+            return np.empty(0, dtype='int64'), np.empty(0, dtype='float32')
         
-        # Search
-        scores, indices = self.index.search(query_vector, min(k, self.index.ntotal))
+        # Search; the ID selector skips filtered chunks inside the scan
+        if allowed_ids is None:
+            scores, indices = self.index.search(query_vector, min(k, self.index.ntotal))
+        else:
+            # Allowed duplicates are searched through their canonical vector
+            vector_ids = self.canonical_ids(allowed_ids)
+            selector = faiss.IDSelectorBatch(np.ascontiguousarray(vector_ids, dtype='int64'))
+            params = faiss.SearchParameters(sel=selector)
+            scores, indices = self.index.search(query_vector, min(k, len(vector_ids)), params=params)
+        scores, indices = scores[0][offset:], indices[0][offset:]
         
-        results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx == -1:  # FAISS returns -1 for invalid indices
-                continue
-                
-            chunk_data = self.metadata.get(str(idx))
-            if not chunk_data:
-                continue
-            
-            # Filter by doc_ids if specified
-            if doc_ids and chunk_data['metadata']['doc_id'] not in doc_ids:
-                continue
-            
-            result = RetrievalResult(
-                content=chunk_data['content'],
-                score=float(score),
-                metadata=ChunkMetadata(**chunk_data['metadata'])
-            )
-            results.append(result)
+        # FAISS returns -1 for invalid indices
+        keep = indices != -1
+        return self.resolve_ids(indices[keep], allowed_ids), scores[keep]
+    
+    def canonical_ids(self, chunk_uids: np.ndarray) -> np.ndarray:
+        """Map chunk IDs to the unique canonical IDs that own their vectors"""
+        if not self.canonical_of:
+            return chunk_uids
+        
+        if self._duplicate_arrays is None:
+            duplicate_uids = np.fromiter(self.canonical_of, dtype=np.int64, count=len(self.canonical_of))
+            order = np.argsort(duplicate_uids)
+            canonical_uids = np.fromiter(self.canonical_of.values(), dtype=np.int64, count=len(self.canonical_of))
+            self._duplicate_arrays = (duplicate_uids[order], canonical_uids[order])
+        duplicate_uids, canonical_uids = self._duplicate_arrays
         
-        return results
+        chunk_uids = np.asarray(chunk_uids, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(duplicate_uids, chunk_uids), len(duplicate_uids) - 1)
+        is_duplicate = duplicate_uids[positions] == chunk_uids
+        return np.unique(np.where(is_duplicate, canonical_uids[positions], chunk_uids))
+    
+    def resolve_ids(self, chunk_uids: np.ndarray, allowed_ids: Optional[np.ndarray] = None) -> np.ndarray:
+        """Replace canonical IDs outside allowed_ids with their first allowed duplicate"""
+        if allowed_ids is None or not self.duplicates or not len(chunk_uids):
+            return chunk_uids
+        
+        chunk_uids = np.array(chunk_uids, dtype=np.int64)
+        for row in np.flatnonzero(~np.isin(chunk_uids, allowed_ids)).tolist():
+            duplicates = np.asarray(self.duplicates.get(int(chunk_uids[row]), []), dtype=np.int64)
+            allowed = duplicates[np.isin(duplicates, allowed_ids)]
+            if len(allowed):
+                chunk_uids[row] = allowed[0]
+        return chunk_uids
+    
+    def filter_ids(self, filters: Optional[RetrievalFilter]) -> Optional[np.ndarray]:
+        """Compile a filter to the chunk IDs it allows; None means unfiltered"""
+        return self.attributes.select(filters)
+    
+    def route_ids(self, query_vector: np.ndarray, level: str = "section", fanout: int = 8,
+                  allowed_ids: Optional[np.ndarray] = None) -> np.ndarray:
+        """Chunk IDs inside the documents or sections whose centroids best match the query"""
+        if level not in self.centroids:
+            raise ValueError(f"Unknown centroid level: {level}")
+        return self.centroids[level].route(query_vector, fanout, allowed_ids)
+    
+    def get_metadata(self, chunk_uid: int) -> Optional[Dict[str, Any]]:
+        """Get stored chunk metadata by global chunk ID"""
+        chunk_data = self.metadata.get(str(chunk_uid))
+        return chunk_data['metadata'] if chunk_data else None
+    
+    def get_content(self, chunk_uid: int) -> str:
+        """Get stored chunk text by global chunk ID"""
+        chunk_data = self.metadata.get(str(chunk_uid))
+        return self.arena.read(*chunk_data['text']) if chunk_data else ""
+    
+    def get_hit(self, chunk_uid: int, score: float) -> Optional[Hit]:
+        """Materialize a lightweight hit for a global chunk ID; None if it has no metadata"""
+        chunk_data = self.metadata.get(str(chunk_uid))
+        if chunk_data is None:
+            return None
+        
+        # Other documents holding the same text are reported for citation
+        canonical = self.canonical_of.get(chunk_uid, chunk_uid)
+        sources = None
+        if canonical in self.duplicates:
+            sources = [self._source(uid) for uid in [canonical] + self.duplicates[canonical] if uid != chunk_uid]
+        return Hit(chunk_uid, float(score), self.arena.read(*chunk_data['text']), chunk_data['metadata'], sources)
+    
+    def _source(self, chunk_uid: int) -> Dict[str, Any]:
+        """Provenance of one copy of a duplicated chunk"""
+        metadata = self.metadata[str(chunk_uid)]['metadata']
+        return {'doc_id': metadata['doc_id'], 'page': metadata['page_start'], 'chunk_id': metadata['chunk_id']}
     
     def delete_documents(self, doc_ids: List[str]) -> None:
-        """Delete documents from vector store (rebuild index)"""
+        """Delete documents from vector store by removing their chunk IDs"""
         if not self.metadata:
             return
         
-        # Filter out chunks from deleted documents
-        filtered_metadata = {}
-        filtered_chunks = []
-        
-        for chunk_id, chunk_data in self.metadata.items():
-            if chunk_data['metadata']['doc_id'] not in doc_ids:
-                filtered_metadata[str(len(filtered_chunks))] = chunk_data
-                filtered_chunks.append(chunk_data)
+        removed = [int(chunk_uid) for chunk_uid, chunk_data in self.metadata.items()
+                   if chunk_data['metadata']['doc_id'] in doc_ids]
+        if not removed:
+            return
         
-        # Rebuild index
-        self.metadata = filtered_metadata
-        self.index = None
+        self._remove_chunks(removed)
+        self.generation += 1
+        self._save_index()
+    
+    def _remove_chunks(self, removed: List[int]) -> None:
+        """Drop chunks from FAISS, metadata and every derived index"""
+        # Vectors stay addressed by ID, so nothing has to be re-embedded
+        if self.dedup is not None:
+            self.dedup.remove(removed)
+        self._promote_duplicates(set(removed))
+        if self.index is not None:
+            self.index.remove_ids(np.array(removed, dtype='int64'))
+        for chunk_uid in removed:
+            del self.metadata[str(chunk_uid)]
+        self._rebuild_duplicate_links()
+        self.attributes.remove(removed)
+        self._rebuild_centroids()
+        self._compact_arena()
         
-        if filtered_chunks:
-            # Re-add remaining chunks
-            chunks_for_reindex = []
-            for chunk_data in filtered_chunks:
-                chunks_for_reindex.append({
-                    'content': chunk_data['content'],
-                    'metadata': ChunkMetadata(**chunk_data['metadata'])
-                })
-            self.add_documents(chunks_for_reindex)
-        else:
-            self.doc_count = 0
-            self._save_index()
+        self.doc_count = len(set(chunk['metadata']['doc_id'] for chunk in self.metadata.values()))
     
     def get_stats(self) -> Dict[str, Any]:
         """Get vector store statistics"""
         return {
             'total_chunks': self.index.ntotal if self.index else 0,
+            'duplicate_chunks': len(self.canonical_of),
             'doc_count': len(set(chunk['metadata']['doc_id'] for chunk in self.metadata.values())),
-            'index_size_mb': os.path.getsize(self.index_path) / (1024 * 1024) if os.path.exists(self.index_path) else 0
+            'index_size_mb': os.path.getsize(self.index_path) / (1024 * 1024) if os.path.exists(self.index_path) else 0,
+            'generation': self.generation
+        }
+    
+    def _intern_texts(self, chunks: List[Dict[str, Any]], parents: Optional[Dict] = None) -> List[tuple]:
+        """
+        Append chunk text to the arena and return one (offset, length) span per chunk.
+        
+        Windows cut from a longer section carry it as 'parent_text' and
+        record their character offsets in it. The section is appended once
+        and each window becomes a view into it.
+        """
+        spans = []
+        parents = {} if parents is None else parents  # id(parent_text) -> [offset, char cursor, byte cursor, parent]
+        
+        for chunk in chunks:
+            content = chunk['content']
+            parent = chunk.get('parent_text')
+            char_start = chunk['metadata'].char_start
+            
+            if parent and char_start is not None:
+                state = parents.get(id(parent))
+                if state is None:
+                    # The parent is kept referenced so its id() cannot be reused mid-stream
+                    state = parents[id(parent)] = [self.arena.append(parent)[0], 0, 0, parent]
+                
+                # Advance the byte cursor incrementally instead of re-encoding the prefix
+                if char_start >= state[1]:
+                    state[2] += len(parent[state[1]:char_start].encode('utf-8'))
+                else:
+                    state[2] = len(parent[:char_start].encode('utf-8'))
+                state[1] = char_start
+                spans.append((state[0] + state[2], len(content.encode('utf-8'))))
+                continue
+            
+            spans.append(self.arena.append(content))
+        
+        return spans
+    
+    def _content_digest(self, text: str) -> bytes:
+        """Hash used to recognize unchanged chunks on re-ingest"""
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+    
+    def _promote_duplicates(self, removed: set) -> None:
+        """Hand the vector of each removed canonical chunk to its first surviving duplicate"""
+        for canonical in removed:
+            survivors = [uid for uid in self.duplicates.get(canonical, []) if uid not in removed]
+            if not survivors:
+                continue
+            
+            head = survivors[0]
+            self.index.add_with_ids(self.index.reconstruct(canonical).reshape(1, -1), np.array([head], dtype='int64'))
+            del self.metadata[str(head)]['duplicate_of']
+            for uid in survivors[1:]:
+                self.metadata[str(uid)]['duplicate_of'] = head
+            if self.dedup is not None:
+                self.dedup.add(head, self.get_content(head))
+    
+    def _rebuild_duplicate_links(self) -> None:
+        """Derive the duplicate maps from the 'duplicate_of' entries in metadata"""
+        self.canonical_of = {int(uid): chunk_data['duplicate_of'] for uid, chunk_data in self.metadata.items()
+                             if 'duplicate_of' in chunk_data}
+        self.duplicates = {}
+        for uid, canonical in sorted(self.canonical_of.items()):
+            self.duplicates.setdefault(canonical, []).append(uid)
+        self._duplicate_arrays = None
+    
+    def _rebuild_dedup(self) -> None:
+        """Re-register every canonical chunk from the arena text"""
+        self.dedup.clear()
+        for uid, chunk_data in self.metadata.items():
+            if 'duplicate_of' not in chunk_data:
+                self.dedup.add(int(uid), self.arena.read(*chunk_data['text']))
+    
+    def _compact_arena(self) -> None:
+        """Drop arena bytes no longer referenced by any chunk"""
+        entries = list(self.metadata.values())
+        new_offsets = self.arena.compact([tuple(entry['text']) for entry in entries],
+                                         self.arena.path_for(self.generation + 1))
+        for entry, offset in zip(entries, new_offsets):
+            entry['text'][0] = offset
+    
+    def _migrate_inline_content(self) -> bool:
+        """Move legacy inline 'content' strings into the arena"""
+        migrated = False
+        for chunk_data in self.metadata.values():
+            if 'content' in chunk_data:
+                chunk_data['text'] = list(self.arena.append(chunk_data.pop('content')))
+                migrated = True
+        return migrated
+    
+    def _centroid_keys(self, chunk_uids: List[int]) -> Dict[str, List[str]]:
+        """Document and section group keys for chunk IDs"""
+        metadatas = [self.metadata[str(uid)]['metadata'] for uid in chunk_uids]
+        return {
+            'document': [m['doc_id'] for m in metadatas],
+            # section_id values repeat across documents, so sections are keyed per document
+            'section': [f"{m['doc_id']}::{m['section_id']}" for m in metadatas]
         }
     
+    def _add_centroids(self, chunk_uids: List[int], vectors: np.ndarray) -> None:
+        """Fold newly added normalized vectors into the centroids"""
+        for level, keys in self._centroid_keys(chunk_uids).items():
+            self.centroids[level].add(chunk_uids, keys, vectors)
+    
+    def _rebuild_centroids(self) -> None:
+        """Recompute centroids from the vectors held in the index"""
+        if self.index is None or self.index.ntotal == 0:
+            for centroid_index in self.centroids.values():
+                centroid_index.clear()
+            return
+        
+        chunk_uids = faiss.vector_to_array(self.index.id_map).tolist()
+        vectors = self.index.index.reconstruct_n(0, self.index.ntotal)
+        
+        # Duplicates count towards their own groups with the canonical vector
+        if self.canonical_of:
+            rows = {uid: row for row, uid in enumerate(chunk_uids)}
+            duplicates = [(uid, canonical) for uid, canonical in self.canonical_of.items() if canonical in rows]
+            chunk_uids = chunk_uids + [uid for uid, _ in duplicates]
+            vectors = np.vstack((vectors, vectors[[rows[canonical] for _, canonical in duplicates]]))
+        for level, keys in self._centroid_keys(chunk_uids).items():
+            self.centroids[level].rebuild(chunk_uids, keys, vectors)
+    
+    def _new_index(self, dimension: int):
+        """Create an empty ID-mapped inner product index (cosine on normalized vectors)"""
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+    
+    def _migrate_positional_index(self) -> None:
+        """Convert a legacy position-addressed index to global chunk IDs"""
+        flat = self.index
+        vectors = flat.reconstruct_n(0, flat.ntotal) if flat.ntotal else None
+        
+        # Legacy metadata keys are FAISS positions, so they carry over as IDs
+        self.index = self._new_index(flat.d)
+        if vectors is not None:
+            self.index.add_with_ids(vectors, np.arange(flat.ntotal, dtype='int64'))
+        for chunk_uid, chunk_data in self.metadata.items():
+            chunk_data['metadata']['chunk_uid'] = int(chunk_uid)
+    
     def _get_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings using OpenAI API"""
         response = self.client.embeddings.create(
@@ -154,13 +614,56 @@ class FAISSVectorStore(BaseVectorStore):
             if os.path.exists(self.metadata_path):
                 with open(self.metadata_path, 'r') as f:
                     self.metadata = json.load(f)
+            
+            manifest = {}
+            if os.path.exists(self.manifest_path):
+                with open(self.manifest_path, 'r') as f:
+                    manifest = json.load(f)
+                    self.generation = manifest.get('generation', 0)
+                    self.next_chunk_uid = manifest.get('next_chunk_uid', 0)
+            
+            # The manifest names the arena file the saved spans point into
+            self.arena.load(os.path.join(self.index_dir, manifest.get('arena', os.path.basename(self.arena.base_path))))
+            if self._migrate_inline_content():
+                self.arena.save()
+            
+            if self.index is not None and not isinstance(self.index, faiss.IndexIDMap2):
+                self._migrate_positional_index()
+            
+            if self.metadata:
+                self.next_chunk_uid = max(self.next_chunk_uid, max(int(k) for k in self.metadata) + 1)
+            self.attributes.rebuild((int(k), chunk['metadata']) for k, chunk in self.metadata.items())
+            self._rebuild_duplicate_links()
+            
+            if self.dedup is not None and not self.dedup.load(self.generation):
+                self._rebuild_dedup()
+            
+            if not all(centroid_index.load(self.generation) for centroid_index in self.centroids.values()):
+                self._rebuild_centroids()
                     
             self.doc_count = len(set(chunk['metadata']['doc_id'] for chunk in self.metadata.values()))
         except Exception as e:
             print(f"Error loading index: {e}")
-            self.index = None
-            self.metadata = {}
-            self.doc_count = 0
+            self._clear()
+    
+    def _clear(self) -> None:
+        """Reset the in-memory store to empty"""
+        self.index = None
+        self.metadata = {}
+        self.doc_count = 0
+        self.generation = 0
+        self.next_chunk_uid = 0
+        self.attributes = ChunkAttributeIndex()
+        for centroid_index in self.centroids.values():
+            centroid_index.clear()
+        if self.dedup is not None:
+            self.dedup.clear()
+        self._rebuild_duplicate_links()
+    
+    def _rollback(self) -> None:
+        """Discard unsaved changes by reloading the last saved state"""
+        self._clear()
+        self._load_index()
     
     def _save_index(self) -> None:
         """Save index and metadata to disk"""
@@ -168,7 +671,23 @@ class FAISSVectorStore(BaseVectorStore):
             if self.index is not None:
                 faiss.write_index(self.index, self.index_path)
             
-            with open(self.metadata_path, 'w') as f:
+            # Spans in metadata must never point past the end of the persisted arena
+            self.arena.save()
+            
+            for centroid_index in self.centroids.values():
+                centroid_index.save(self.generation)
+            if self.dedup is not None:
+                self.dedup.save(self.generation)
+            
+            # Metadata spans and the arena they point into are switched together, once
+            # both files are fully written; a compacted-away arena is deleted only then
+            with open(f"{self.metadata_path}.tmp", 'w') as f:
                 json.dump(self.metadata, f, indent=2)
+            with open(f"{self.manifest_path}.tmp", 'w') as f:
+                json.dump({'generation': self.generation, 'next_chunk_uid': self.next_chunk_uid,
+                           'arena': os.path.basename(self.arena.path)}, f)
+            os.replace(f"{self.metadata_path}.tmp", self.metadata_path)
+            os.replace(f"{self.manifest_path}.tmp", self.manifest_path)
+            self.arena.remove_stale()
         except Exception as e:
             print(f"Error saving index: {e}")
\ No newline at end of file
@@ -0,0 +1,133 @@
+import os
+import glob
+import mmap
+from typing import List, Optional, Tuple
+
+class TextArena:
+    """
+    Append-only UTF-8 byte arena holding chunk and section text.
+
+    Text is addressed by (byte offset, byte length) spans, so overlapping
+    chunk windows can share one copy of their section. The persisted part is
+    memory-mapped (or read once when mmap is disabled); text appended since
+    the last save is held in a pending buffer until it is flushed.
+
+    Compaction writes a new generation-suffixed file instead of rewriting
+    the current one, so spans saved against the old file stay valid until
+    the caller has saved the new spans and calls ``remove_stale``.
+    """
+
+    def __init__(self, path: str, use_mmap: bool = True):
+        self.base_path = path
+        self.path = path
+        self.use_mmap = use_mmap
+        self._file = None
+        self._data = b""
+        self._persisted = 0
+        self._pending = bytearray()
+
+    def __len__(self) -> int:
+        return self._persisted + len(self._pending)
+
+    def append(self, text: str) -> Tuple[int, int]:
+        """Store text and return its (offset, length) span in bytes"""
+        encoded = text.encode('utf-8')
+        offset = len(self)
+        self._pending += encoded
+        return offset, len(encoded)
+
+    def read(self, offset: int, length: int) -> str:
+        """Decode the text stored at a span"""
+        if offset >= self._persisted:
+            offset -= self._persisted
+            return self._pending[offset:offset + length].decode('utf-8')
+        return self._data[offset:offset + length].decode('utf-8')
+
+    def path_for(self, generation: int) -> str:
+        """File name of the arena compacted in a store generation"""
+        root, ext = os.path.splitext(self.base_path)
+        return f"{root}.{generation}{ext}"
+
+    def load(self, path: Optional[str] = None) -> None:
+        """Map the persisted arena at path (the current file by default), if any"""
+        self._close()
+        self._pending = bytearray()
+        if path is not None:
+            self.path = path
+        if not os.path.exists(self.path):
+            return
+
+        self._persisted = os.path.getsize(self.path)
+        if not self._persisted:
+            return
+
+        if self.use_mmap:
+            self._file = open(self.path, 'rb')
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            with open(self.path, 'rb') as f:
+                self._data = f.read()
+
+    def save(self) -> None:
+        """Flush pending text to the end of the arena file"""
+        if not self._pending and os.path.exists(self.path):
+            return
+
+        with open(self.path, 'ab') as f:
+            f.write(self._pending)
+        self.load()
+
+    def compact(self, spans: List[Tuple[int, int]], path: str) -> List[int]:
+        """
+        Copy the bytes covered by live spans to a new arena file and switch to it.
+
+        Overlapping or adjacent spans (windows of one section) are merged so
+        shared text is still stored once. The current file is left untouched.
+        Returns the new offset of every span, in input order.
+        """
+        if os.path.abspath(path) == os.path.abspath(self.path):
+            raise ValueError("Compacted arena must be written to a new file")
+        self.save()
+
+        order = sorted(range(len(spans)), key=lambda i: spans[i][0])
+        new_offsets = [0] * len(spans)
+        out = bytearray()
+        merged_start = merged_end = new_start = -1
+
+        for i in order:
+            start, length = spans[i]
+            end = start + length
+            if start <= merged_end:
+                if end > merged_end:
+                    out += self._data[merged_end:end]
+                    merged_end = end
+            else:
+                merged_start, merged_end, new_start = start, end, len(out)
+                out += self._data[start:end]
+            new_offsets[i] = new_start + (start - merged_start)
+
+        with open(path, 'wb') as f:
+            f.write(out)
+        self.load(path)
+        return new_offsets
+
+    def remove_stale(self) -> None:
+        """Delete arena files other than the current one"""
+        root, ext = os.path.splitext(self.base_path)
+        current = os.path.abspath(self.path)
+        for path in glob.glob(f"{glob.escape(root)}*{ext}"):
+            if os.path.abspath(path) != current:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"Error removing stale text arena {path}: {e}")
+
+    def _close(self) -> None:
+        """Release the current mapping"""
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._data = b""
+        self._persisted = 0
@@ -1,32 +1,113 @@
 import os
 from docx import Document
 import fitz
-from PIL import Image
-import pytesseract
-import io
+from typing import List, Optional
+from concurrent.futures import ProcessPoolExecutor
 
-def extract_text_from_pdf(path: str) -> str:
+from core.config.rag_config import get_rag_config
+from core.rag.ingestion.ocr import ocr_samples
+from core.rag.ingestion.pdf_layout import page_ranges, pdf_worker_count
+
+def extract_text_from_pdf(path: str, workers: Optional[int] = None, min_pages: Optional[int] = None) -> str:
     """
     Extracts text from PDF.
     1. Extracts selectable text directly using PyMuPDF.
     2. Falls back to OCR for image-only pages using pytesseract.
+    Large PDFs are split into page ranges extracted in a process pool
+    (PDF_WORKERS / PDF_PARALLEL_MIN_PAGES). Image-only pages are rendered
+    at OCR_DPI and OCRed concurrently (OCR_WORKERS); fully scanned
+    documents skip text extraction and go straight to OCR.
+    """
+    config = get_rag_config()
+    workers = config.pdf_workers if workers is None else workers
+    min_pages = config.pdf_parallel_min_pages if min_pages is None else min_pages
+
+    with fitz.open(path) as doc:
+        page_count = len(doc)
+        scanned = _is_scanned(doc)
+
+    if scanned:
+        page_texts = [None] * page_count
+    else:
+        page_texts = None
+        workers = pdf_worker_count(workers, page_count, min_pages)
+        if workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    futures = [executor.submit(_extract_text_range, path, start, stop)
+                               for start, stop in page_ranges(page_count, workers)]
+                    page_texts = [text for future in futures for text in future.result()]
+            except Exception as e:
+                print(f"Parallel PDF text extraction failed, falling back to a single process: {e}")
+        if page_texts is None:
+            page_texts = _extract_text_range(path, 0, page_count)
+
+    # Fallback: OCR for scanned pages
+    scanned_pages = [page_num for page_num, text in enumerate(page_texts) if text is None]
+    if scanned_pages:
+        ocr_texts = _ocr_pages(path, scanned_pages, config.ocr_dpi, config.ocr_grayscale,
+                               config.ocr_workers, config.tesseract_cmd)
+        for page_num, text in zip(scanned_pages, ocr_texts):
+            page_texts[page_num] = text
+
+    return "\n".join(page_texts).strip()
+
+def _is_scanned(doc) -> bool:
+    """
+    True if no page uses a font, i.e. the document has no text layer at all.
+    Reading the font lists is much cheaper than extracting text.
+    """
+    return all(not doc.get_page_fonts(page_num) for page_num in range(len(doc)))
+
+def _extract_text_range(path: str, start: int, stop: int) -> List[Optional[str]]:
+    """
+    Text of pages start..stop, one string per page; None for pages without text.
+    """
+    page_texts = []
+    with fitz.open(path) as doc:
+        for page_num in range(start, stop):
+            page_text = doc[page_num].get_text("text").strip()
+            page_texts.append(page_text or None)
+
+    return page_texts
+
+def _ocr_pages(path: str, page_nums: List[int], dpi: int, grayscale: bool,
+               workers: int, tesseract_cmd: str) -> List[str]:
+    """
+    OCR text of the given pages, in order. Pages are split into batches so each
+    worker opens the file once and renders its own pages.
+    """
+    workers = min(workers, len(page_nums))
+    if workers <= 1:
+        return _ocr_page_batch(path, page_nums, dpi, grayscale, tesseract_cmd)
+
+    parts = min(len(page_nums), workers * 4)
+    batches = [page_nums[len(page_nums) * i // parts:len(page_nums) * (i + 1) // parts] for i in range(parts)]
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_ocr_page_batch, path, batch, dpi, grayscale, tesseract_cmd)
+                       for batch in batches]
+            return [text for future in futures for text in future.result()]
+    except Exception as e:
+        print(f"Parallel OCR failed, falling back to a single process: {e}")
+        return _ocr_page_batch(path, page_nums, dpi, grayscale, tesseract_cmd)
+
+def _ocr_page_batch(path: str, page_nums: List[int], dpi: int, grayscale: bool, tesseract_cmd: str) -> List[str]:
+    """
+    Render pages at dpi (grayscale by default) and OCR them; failed pages give "".
     """
-    doc = fitz.open(path)
-    text = ""
-
-    for page in doc:
-        # Try direct text extraction first
-        page_text = page.get_text("text").strip()
-        if page_text:
-            text += page_text + "\n"
-        else:
-            # Fallback: OCR for scanned pages
-            pix = page.get_pixmap()
-            img = Image.open(io.BytesIO(pix.tobytes("png")))
-            ocr_text = pytesseract.image_to_string(img)
-            text += ocr_text.strip() + "\n"
-
-    return text.strip()
+    colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+    texts = []
+    with fitz.open(path) as doc:
+        for page_num in page_nums:
+            pix = doc[page_num].get_pixmap(dpi=dpi, colorspace=colorspace, alpha=False)
+            mode = "L" if pix.n == 1 else "RGB"
+            try:
+                texts.append(ocr_samples(mode, pix.width, pix.height, pix.stride, pix.samples_mv, tesseract_cmd))
+            except Exception as e:
+                print(f"OCR failed for page {page_num + 1}: {e}")
+                texts.append("")
+    return texts
 
 def extract_text_from_docx(path):
     """
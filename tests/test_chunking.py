@@ -1,6 +1,6 @@
 import pytest
 from core.rag.chunking.text_chunker import TextChunker
-from core.rag.schema import DocumentSchema, DocumentMetadata, DocumentSection
+from core.rag.schema import DocumentSchema, DocumentMetadata, DocumentSection, DocumentTable, DocumentFigure
 
 class TestChunking:
     """Test document chunking functionality"""
@@ -105,4 +105,126 @@ class TestChunking:
             assert chunk['metadata'].token_count <= 200
         
         # Verify we have reasonable number of chunks
-        assert len(chunks) >= 2  # At least short + part of long section
\ No newline at end of file
+        assert len(chunks) >= 2  # At least short + part of long section
+    
+    def test_batched_tokenization_matches_serial(self):
+        """Test that batched encoding matches per-item tiktoken calls"""
+        chunker = TextChunker(max_tokens=100, overlap_tokens=20, num_threads=2)
+        chunker.PARALLEL_MIN_WORK = 0  # Exercise the threaded path on a small document
+        document = self.create_test_document()
+        document.tables = [DocumentTable(
+            table_id="table_1",
+            headers=["Metric", "Value"],
+            rows=[["Revenue", "100"], ["Margin", "15%"]],
+            source_section="section_2",
+            page=1
+        )]
+        
+        chunks = chunker.chunk_document(document)
+        
+        # Windows are slices of the section text that end at the end of the section
+        content = document.sections[1].content
+        windows = [c for c in chunks if c['metadata'].section_id == "section_2" and c['metadata'].chunk_type == "text"]
+        for window in windows:
+            assert window['content'] == content[window['metadata'].char_start:window['metadata'].char_end]
+        assert windows[-1]['metadata'].char_end == len(content)
+        
+        # Special chunks get token counts from the batched encode too
+        table_chunk = chunks[-1]
+        assert table_chunk['metadata'].chunk_type == "table"
+        assert table_chunk['metadata'].token_count == len(chunker.encoding.encode(table_chunk['content']))
+        
+        # Closing shuts the tokenizer pool down; the next batch starts a new one
+        chunker.close()
+        assert chunker._executor is None
+        assert chunker.chunk_document(document) == chunks
+    
+    def test_windows_snap_to_sentence_boundaries(self):
+        """Test offset-based windows cut at sentence ends without splitting characters"""
+        chunker = TextChunker(max_tokens=60, overlap_tokens=15)
+        content = " ".join(f"Le café numéro {i} coûte {i * 3} € aujourd'hui." for i in range(80))
+        document = self.create_test_document()
+        document.sections = [DocumentSection(
+            section_id="section_3", title="Prix", content=content, page_start=2, page_end=3
+        )]
+        
+        chunks = chunker.chunk_document(document)
+        assert len(chunks) > 3
+        
+        for i, chunk in enumerate(chunks):
+            metadata = chunk['metadata']
+            assert chunk['content'] == content[metadata.char_start:metadata.char_end]
+            assert "\ufffd" not in chunk['content']
+            assert 0 < metadata.token_count <= 60
+            if i < len(chunks) - 1:
+                assert chunk['content'].endswith(".")
+            if i > 0:
+                assert chunk['content'].startswith("Le café")
+                # Consecutive windows overlap
+                assert metadata.char_start < chunks[i - 1]['metadata'].char_end
+        
+        assert chunks[0]['metadata'].char_start == 0
+        assert chunks[-1]['metadata'].char_end == len(content)
+    
+    def test_small_chunks_coalesced_with_sub_spans(self):
+        """Test adjacent small chunks on one page are merged and keep a sub-span map"""
+        chunker = TextChunker(max_tokens=100, overlap_tokens=10, min_tokens=40)
+        document = self.create_test_document()
+        document.sections = [
+            DocumentSection(section_id=f"sec_{i}", title=f"Note {i}", content=f"Note {i} applies to the fund.",
+                            page_start=1 if i < 3 else 2, page_end=1 if i < 3 else 2)
+            for i in range(4)
+        ] + [document.sections[1]]
+        document.figures = [
+            DocumentFigure(figure_id=f"fig_{i}", title=f"Chart {i}", figure_type="chart", source_section="sec_0", page=1)
+            for i in range(3)
+        ]
+        
+        chunks = chunker.chunk_document(document)
+        text_chunks = [c for c in chunks if c['metadata'].chunk_type == "text"]
+        figure_chunks = [c for c in chunks if c['metadata'].chunk_type == "figure"]
+        
+        # Page 1 notes merge together; the page 2 note stays alone; windows are never merged
+        assert [c['metadata'].chunk_id for c in text_chunks[:2]] == ["sec_0_chunk_1_merged_3", "sec_3_chunk_1"]
+        assert all(not c['metadata'].sub_spans for c in text_chunks[2:])
+        assert len(figure_chunks) == 1
+        
+        merged = text_chunks[0]
+        metadata = merged['metadata']
+        assert metadata.heading_chain == ["Note 0", "Note 1", "Note 2"]
+        assert metadata.token_count == len(chunker.encoding.encode(merged['content']))
+        assert [span['section_id'] for span in metadata.sub_spans] == ["sec_0", "sec_1", "sec_2"]
+        for i, span in enumerate(metadata.sub_spans):
+            assert merged['content'][span['start']:span['end']] == document.sections[i].content
+        
+        # Coalescing is off by default
+        assert len(TextChunker(max_tokens=100, overlap_tokens=10).chunk_document(document)) == len(chunks) + 4
+    
+    def test_large_table_split_into_row_groups(self):
+        """Test oversized tables are split into row groups that repeat the header"""
+        chunker = TextChunker(max_tokens=120, overlap_tokens=10)
+        document = self.create_test_document()
+        document.sections = []
+        rows = [[f"Line item {i}", f"{i * 1000:,}", f"{i * 1100:,}"] for i in range(60)]
+        document.tables = [DocumentTable(
+            table_id="table_1",
+            title="Balance Sheet",
+            headers=["Item", "2024", "2025"],
+            rows=rows,
+            source_section="section_2",
+            page=3
+        )]
+        
+        chunks = chunker.chunk_document(document)
+        assert len(chunks) > 1
+        assert [c['metadata'].chunk_id for c in chunks] == [f"table_1_chunk_{i}" for i in range(1, len(chunks) + 1)]
+        
+        seen_rows = []
+        for chunk in chunks:
+            content = chunk['content']
+            assert chunk['metadata'].token_count <= 120
+            assert content.startswith("Table: Balance Sheet (rows ")
+            assert "| Item | 2024 | 2025 |\n| --- | --- | --- |\n" in content
+            seen_rows.extend(line for line in content.splitlines() if line.startswith("| Line item"))
+        assert seen_rows == ["| " + " | ".join(row) + " |" for row in rows]
+        assert f"of {len(rows)})" in chunks[-1]['content'].splitlines()[0]
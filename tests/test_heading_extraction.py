@@ -3,8 +3,10 @@ import tempfile
 import os
 from docx import Document
 from fpdf import FPDF
+import fitz
 
 from core.rag.ingestion.heading_extractor import HeadingExtractor
+from core.rag.ingestion.pdf_extractor import PdfExtractor
 
 class TestHeadingExtraction:
     """Test dynamic heading extraction functionality"""
@@ -101,6 +103,99 @@ class TestHeadingExtraction:
         finally:
             os.unlink(pdf_path)
     
+    def test_pdf_extractor_sections_match_headings(self):
+        """Single-pass PdfExtractor builds the same sections as extract_pdf_headings"""
+        pdf_path = self.create_test_pdf_with_headings()
+    
+        try:
+            headings = HeadingExtractor().extract_pdf_headings(pdf_path)
+            document = PdfExtractor().extract(pdf_path)
+    
+            assert [(s.section_id, s.title, s.content, s.page_start, s.level) for s in document.sections] == \
+                [(h['section_id'], h['heading'], h['content'], h['page_start'], h['level']) for h in headings]
+    
+        finally:
+            os.unlink(pdf_path)
+    
+    def test_pdf_outline_sections(self):
+        """Bookmarked PDFs are cut at the outline entries instead of heuristic headings"""
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((72, 72), 'Annual Report', fontsize=20)
+        page.insert_text((72, 110), '1. Overview', fontsize=11)
+        page.insert_text((72, 130), 'Revenue grew in every segment.', fontsize=11)
+        page = doc.new_page()
+        page.insert_text((72, 72), 'Still part of the overview.', fontsize=11)
+        page.insert_text((72, 110), '2. Risk Factors', fontsize=11)
+        page.insert_text((72, 130), 'Fuel prices are volatile.', fontsize=11)
+        doc.set_toc([[1, '1. Overview', 1], [1, '2. Risk Factors', 2]])
+    
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
+            pdf_path = tmp.name
+        doc.save(pdf_path)
+    
+        try:
+            headings = HeadingExtractor().extract_pdf_headings(pdf_path)
+    
+            assert [(h['heading'], h['page_start'], h['page_end']) for h in headings] == [
+                ('Introduction', 1, 1), ('1. Overview', 1, 2), ('2. Risk Factors', 2, 2)
+            ]
+            assert headings[0]['content'] == 'Annual Report'
+            assert headings[1]['content'] == 'Revenue grew in every segment. Still part of the overview.'
+            assert headings[2]['content'] == 'Fuel prices are volatile.'
+    
+        finally:
+            os.unlink(pdf_path)
+    
+    def test_pdf_headings_relative_to_body_font(self):
+        """Heading sizes are judged against the document's body font, not a fixed point size"""
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((72, 72), 'Overview', fontsize=26)
+        page.insert_text((72, 110), 'Large print body text.', fontsize=20)
+        page.insert_text((72, 140), '2024', fontsize=26)
+        page.insert_text((72, 170), 'More body text at twenty points.', fontsize=20)
+        page.insert_text((72, 210), 'Key Terms', fontsize=20, fontname='hebo')
+        page.insert_text((72, 240), '3 Reasons Are Given In The Appendix For Every One Of These Choices', fontsize=20)
+        
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
+            pdf_path = tmp.name
+        doc.save(pdf_path)
+        
+        try:
+            headings = HeadingExtractor().extract_pdf_headings(pdf_path)
+            
+            assert [(h['heading'], h['level']) for h in headings] == [('Overview', 1), ('Key Terms', 2)]
+            assert headings[0]['content'] == 'Large print body text. 2024 More body text at twenty points.'
+            
+        finally:
+            os.unlink(pdf_path)
+    
+    def test_pdf_stacked_numbered_headings_stay_separate(self):
+        """A heading wrapped over two lines is joined, but a numbered heading right below another is not"""
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((72, 72), 'Annual Report', fontsize=20)
+        page.insert_text((72, 96), 'For The Board', fontsize=20)
+        page.insert_text((72, 130), 'Revenue grew in every segment this year.', fontsize=11)
+        page.insert_text((72, 170), '2. Scope', fontsize=20)
+        page.insert_text((72, 200), '2.1 Overview', fontsize=20)
+        page.insert_text((72, 230), 'The review covers all subsidiaries.', fontsize=11)
+        
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
+            pdf_path = tmp.name
+        doc.save(pdf_path)
+        
+        try:
+            headings = HeadingExtractor().extract_pdf_headings(pdf_path)
+            
+            # "2. Scope" has no text of its own, so only its subsection is kept
+            assert [h['heading'] for h in headings] == ['Annual Report For The Board', '2.1 Overview']
+            assert headings[1]['content'] == 'The review covers all subsidiaries.'
+            
+        finally:
+            os.unlink(pdf_path)
+    
     def test_heading_mapping(self):
         """Test mapping detected headings to target sections"""
         extractor = HeadingExtractor()
@@ -1,12 +1,20 @@
 import pytest
 import tempfile
 import os
+import io
+from unittest.mock import patch
+import fitz
+from PIL import Image
 from docx import Document
 from fpdf import FPDF
 
 from core.rag.ingestion.docx_extractor import DocxExtractor
 from core.rag.ingestion.pdf_extractor import PdfExtractor
 from core.rag.ingestion.extractor_factory import ExtractorFactory
+from core.rag.ingestion.ocr import ImageOcr
+from core.rag.ingestion.pdf_layout import may_contain_table
+from core.rag.ingestion.docx_layout import iter_body_blocks
+from core.utils.text_extractor import extract_text_from_pdf
 
 class TestIngestion:
     """Test document ingestion functionality"""
@@ -95,6 +103,80 @@ class TestIngestion:
         finally:
             os.unlink(pdf_path)
     
+    def test_parallel_pdf_extraction_matches_serial(self):
+        """Page ranges extracted in a process pool stitch back into the serial result"""
+        pdf = FPDF()
+        for page in range(6):
+            pdf.add_page()
+            if page % 3 == 0:
+                pdf.set_font('Arial', 'B', 16)
+                pdf.cell(40, 10, f'Section {page // 3 + 1}')
+                pdf.ln()
+            pdf.set_font('Arial', '', 12)
+            pdf.cell(40, 10, f'Body text on page {page + 1}.')
+
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
+            pdf.output(tmp.name)
+            pdf_path = tmp.name
+
+        try:
+            serial = PdfExtractor(workers=1).extract(pdf_path)
+            parallel = PdfExtractor(workers=2, parallel_min_pages=2).extract(pdf_path)
+
+            assert [s.dict() for s in parallel.sections] == [s.dict() for s in serial.sections]
+
+            # Section 1 spans pages 1-3, across the boundaries of the page ranges
+            section = next(s for s in parallel.sections if s.title == 'Section 1')
+            assert 'page 1' in section.content and 'page 3' in section.content
+
+        finally:
+            os.unlink(pdf_path)
+
+    def test_docx_images_are_ocred(self):
+        """Raster images in word/media go through the shared OCR path; thin images are skipped"""
+        logo = io.BytesIO()
+        Image.new('RGB', (120, 60), 'white').save(logo, format='PNG')
+        rule = io.BytesIO()
+        Image.new('RGB', (400, 4), 'black').save(rule, format='PNG')
+        doc = Document()
+        doc.add_heading('Branding', level=1)
+        doc.add_picture(logo)
+        doc.add_paragraph('The logo appears on every page.')
+        doc.add_picture(rule)
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            docx_path = os.path.join(tmp_dir, 'logo.docx')
+            doc.save(docx_path)
+            
+            with patch('core.rag.ingestion.ocr.ocr_samples', return_value='ACME') as ocr:
+                extractor = DocxExtractor(ocr_workers=0)
+                extractor.ocr = ImageOcr(workers=0, cache_path=os.path.join(tmp_dir, 'ocr_cache.jsonl'))
+                document = extractor.extract(docx_path)
+                
+                assert [(image.filename, image.extracted_text) for image in document.images] == [('image1.png', 'ACME')]
+                assert ocr.call_count == 1
+                assert [section.title for section in document.sections] == ['Branding']
+    
+    def test_docx_title_style_is_a_heading(self):
+        """A "Title" paragraph opens a level-1 section like "Heading 1"; "Heading N" keeps level N"""
+        doc = Document()
+        doc.add_heading('Annual Report', 0)
+        doc.add_paragraph('Prepared for the board.')
+        doc.add_heading('Outlook', level=2)
+        doc.add_paragraph('Growth continues.')
+        
+        assert [(block.style, block.heading_level) for block in iter_body_blocks(doc)] == [
+            ('Title', 1), ('Normal', 0), ('Heading 2', 2), ('Normal', 0)
+        ]
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            docx_path = os.path.join(tmp_dir, 'report.docx')
+            doc.save(docx_path)
+            document = DocxExtractor(ocr_workers=0).extract(docx_path)
+        
+        assert [section.title for section in document.sections] == ['Annual Report', 'Outlook']
+        assert document.sections[0].content == 'Prepared for the board.'
+    
     def test_extractor_factory(self):
         """Test extractor factory"""
         docx_path = self.create_test_docx()
@@ -117,8 +199,130 @@ class TestIngestion:
             os.unlink(docx_path)
             os.unlink(pdf_path)
     
+    def test_in_memory_sources_match_paths(self):
+        """Bytes and file objects extract like the file on disk, serially and in a process pool"""
+        docx_path = self.create_test_docx()
+        pdf_path = self.create_test_pdf()
+        
+        try:
+            for path in (docx_path, pdf_path):
+                with open(path, 'rb') as f:
+                    data = f.read()
+                
+                # Unnamed contents are recognized from their leading bytes
+                extractor_class = type(ExtractorFactory.get_extractor(path))
+                assert isinstance(ExtractorFactory.get_extractor(data), extractor_class)
+                assert isinstance(ExtractorFactory.get_extractor(io.BytesIO(data)), extractor_class)
+                
+                from_path = extractor_class().extract(path)
+                for source in (data, io.BytesIO(data)):
+                    document = extractor_class().extract(source, filename='upload' + os.path.splitext(path)[1])
+                    assert document.metadata.source_path == 'upload' + os.path.splitext(path)[1]
+                    assert [s.dict() for s in document.sections] == [s.dict() for s in from_path.sections]
+                    assert [t.dict() for t in document.tables] == [t.dict() for t in from_path.tables]
+            
+            pdf = fitz.open()
+            for page in range(4):
+                pdf.new_page().insert_text((72, 72), f'Body text on page {page + 1}.')
+            data = pdf.tobytes()
+            serial = PdfExtractor(workers=1).extract(data)
+            parallel = PdfExtractor(workers=2, parallel_min_pages=2).extract(data)
+            assert [s.dict() for s in parallel.sections] == [s.dict() for s in serial.sections]
+            assert 'page 4' in parallel.sections[0].content
+            
+        finally:
+            os.unlink(docx_path)
+            os.unlink(pdf_path)
+    
     def test_supported_filetypes(self):
         """Test supported filetypes"""
         supported = ExtractorFactory.supported_filetypes()
         assert 'docx' in supported
-        assert 'pdf' in supported
\ No newline at end of file
+        assert 'pdf' in supported
+    
+    def test_image_ocr_filters_and_deduplicates(self):
+        """Repeated images are OCRed once, tiny or thin images are skipped, results are cached"""
+        pdf = fitz.open()
+        logo = io.BytesIO()
+        Image.new('RGB', (120, 60), 'white').save(logo, format='PNG')
+        rule = io.BytesIO()
+        Image.new('RGB', (400, 4), 'black').save(rule, format='PNG')
+        for _ in range(3):
+            page = pdf.new_page()
+            page.insert_image(fitz.Rect(50, 50, 170, 110), stream=logo.getvalue())
+            page.insert_image(fitz.Rect(50, 200, 450, 204), stream=rule.getvalue())
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pdf_path = os.path.join(tmp_dir, 'logos.pdf')
+            pdf.save(pdf_path)
+            cache_path = os.path.join(tmp_dir, 'ocr_cache.jsonl')
+            
+            with patch('core.rag.ingestion.ocr.ocr_samples', return_value='ACME') as ocr:
+                extractor = PdfExtractor(workers=1, ocr_workers=0)
+                extractor.ocr = ImageOcr(workers=0, cache_path=cache_path)
+                document = extractor.extract(pdf_path)
+                
+                # One image entry per page for the logo, the rule is filtered out
+                assert [image.page for image in document.images] == [1, 2, 3]
+                assert all(image.extracted_text == 'ACME' for image in document.images)
+                assert ocr.call_count == 1
+                
+                # A new extractor reads the persisted result instead of running OCR
+                extractor.ocr = ImageOcr(workers=0, cache_path=cache_path)
+                document = extractor.extract(pdf_path)
+                assert document.images[0].extracted_text == 'ACME'
+                assert ocr.call_count == 1
+    
+    def test_pdf_text_ocr_fallback(self, monkeypatch):
+        """Pages without a text layer are rendered at OCR_DPI in grayscale and OCRed in page order"""
+        monkeypatch.setenv('OCR_WORKERS', '0')
+        monkeypatch.setenv('OCR_DPI', '144')
+        scan = io.BytesIO()
+        Image.new('RGB', (200, 100), 'white').save(scan, format='PNG')
+        
+        def fake_ocr(mode, width, height, stride, samples, tesseract_cmd):
+            assert mode == 'L'
+            return f'scanned {width}x{height}'
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pdf = fitz.open()
+            for _ in range(2):
+                pdf.new_page(width=200, height=100).insert_image(fitz.Rect(0, 0, 200, 100), stream=scan.getvalue())
+            scanned_path = os.path.join(tmp_dir, 'scanned.pdf')
+            pdf.save(scanned_path)
+            
+            pdf.insert_page(1, text='Typed page', width=200, height=100)
+            mixed_path = os.path.join(tmp_dir, 'mixed.pdf')
+            pdf.save(mixed_path)
+            
+            with patch('core.utils.text_extractor.ocr_samples', side_effect=fake_ocr):
+                assert extract_text_from_pdf(scanned_path) == 'scanned 400x200\nscanned 400x200'
+                assert extract_text_from_pdf(mixed_path) == 'scanned 400x200\nTyped page\nscanned 400x200'
+    
+    def test_table_prepass_skips_pages_without_rulings(self):
+        """pdfplumber only runs on pages with ruling lines, unless full scanning is forced"""
+        pdf = fitz.open()
+        page = pdf.new_page()
+        for y in (100, 130, 160):
+            page.draw_line((72, y), (372, y))
+        for x in (72, 222, 372):
+            page.draw_line((x, 100), (x, 160))
+        for (x, y), text in zip([(80, 120), (230, 120), (80, 150), (230, 150)], ['Year', 'Revenue', '2024', '1,200']):
+            page.insert_text((x, y), text)
+        pdf.new_page().insert_text((72, 72), 'Prose only, no rulings.')
+        pdf.new_page()  # No text layer, e.g. a scan
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pdf_path = os.path.join(tmp_dir, 'table.pdf')
+            pdf.save(pdf_path)
+            
+            assert may_contain_table(pdf[0])
+            assert not may_contain_table(pdf[1])
+            
+            for scan_all_tables, scanned_pages in ((False, [0]), (True, [0, 1, 2])):
+                extractor = PdfExtractor(workers=1, scan_all_tables=scan_all_tables)
+                with patch.object(extractor, '_extract_tables_from_page',
+                                  wraps=extractor._extract_tables_from_page) as extract_tables:
+                    document = extractor.extract(pdf_path)
+                assert [call.args[1] for call in extract_tables.call_args_list] == scanned_pages
+                assert document.tables[0].headers == ['Year', 'Revenue']
\ No newline at end of file
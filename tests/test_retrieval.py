@@ -1,11 +1,19 @@
 import pytest
 import tempfile
 import os
+import numpy as np
 from unittest.mock import Mock, patch
 
 from core.rag.vectorstore.faiss_store import FAISSVectorStore
 from core.rag.retrieval.hybrid_retriever import HybridRetriever
-from core.rag.schema import ChunkMetadata, RetrievalResult
+from core.rag.retrieval.reranker import CrossEncoderReranker
+from core.rag.retrieval.hits import Hit
+from core.rag.chunking.text_chunker import TextChunker
+from core.rag.pipeline import RAGPipeline
+from core.rag.schema import (
+    ChunkMetadata, RetrievalResult, RetrievalFilter,
+    DocumentSchema, DocumentMetadata, DocumentSection
+)
 
 class TestRetrieval:
     """Test retrieval functionality"""
@@ -127,10 +135,14 @@ class TestRetrieval:
             # Should return results with citations
             assert len(results) <= 2
             for result in results:
-                assert isinstance(result, RetrievalResult)
+                assert isinstance(result, Hit)
                 assert result.content != ""
-                assert result.metadata.doc_id != ""
-                assert result.metadata.chunk_id != ""
+                assert result.metadata['doc_id'] != ""
+                assert result.metadata['chunk_id'] != ""
+                
+                # Pydantic models are only built at the API boundary
+                assert isinstance(result.to_result(), RetrievalResult)
+                assert result.to_citation().chunk_id == result.metadata['chunk_id']
     
     @patch('core.rag.vectorstore.faiss_store.OpenAI')
     def test_doc_id_filtering(self, mock_openai):
@@ -161,7 +173,29 @@ class TestRetrieval:
             # Should only return results from doc2
             for result in results:
                 assert result.metadata.doc_id == 'doc2'
-    
+
+    @patch('core.rag.vectorstore.faiss_store.OpenAI')
+    def test_vectors_without_metadata_are_skipped(self, mock_openai):
+        """Test that a FAISS ID missing from metadata does not break queries"""
+        mock_client = Mock()
+        mock_client.embeddings.create.side_effect = lambda model, input: Mock(
+            data=[Mock(embedding=[0.1 * (i + 1), 0.2, 0.3] * 100) for i in range(len(input))]
+        )
+        mock_openai.return_value = mock_client
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            vector_store = FAISSVectorStore(index_dir=temp_dir)
+            vector_store.add_documents(self.create_test_chunks())
+
+            # As if the index was saved but the metadata write was lost
+            del vector_store.metadata['1']
+
+            results = vector_store.similarity_search("machine learning", k=3)
+            assert sorted(r.metadata.chunk_id for r in results) == ['chunk1', 'chunk3']
+
+            hits = HybridRetriever(vector_store).retrieve("machine learning", k=3)
+            assert sorted(hit.chunk_uid for hit in hits) == [0, 2]
+
     def test_citation_format(self):
         """Test that retrieval results include proper citation metadata"""
         chunks = self.create_test_chunks()
@@ -172,4 +206,625 @@ class TestRetrieval:
             assert metadata.doc_id != ""
             assert metadata.chunk_id != ""
             assert metadata.page_start > 0
-            assert len(metadata.heading_chain) > 0
\ No newline at end of file
+            assert len(metadata.heading_chain) > 0
+    
+    @patch('core.rag.vectorstore.faiss_store.OpenAI')
+    def test_bm25_index_persistence(self, mock_openai):
+        """Test that the BM25 index is loaded from disk instead of rebuilt"""
+        mock_client = Mock()
+        mock_response = Mock()
+        mock_response.data = [
+            Mock(embedding=[0.1, 0.2, 0.3] * 100),
+            Mock(embedding=[0.2, 0.3, 0.4] * 100),
+            Mock(embedding=[0.3, 0.4, 0.5] * 100)
+        ]
+        mock_client.embeddings.create.return_value = mock_response
+        mock_openai.return_value = mock_client
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            vector_store = FAISSVectorStore(index_dir=temp_dir)
+            vector_store.add_documents(self.create_test_chunks())
+            
+            retriever = HybridRetriever(vector_store)
+            expected = retriever.bm25_index.get_scores(['machine', 'learning'])
+            
+            # A fresh retriever over the same generation memory-maps the stored index
+            with patch.object(HybridRetriever, '_build_bm25_index') as build:
+                reloaded = HybridRetriever(FAISSVectorStore(index_dir=temp_dir))
+                build.assert_not_called()
+            
+            assert reloaded.bm25_index.n_docs == 3
+            assert list(reloaded.bm25_index.get_scores(['machine', 'learning'])) == list(expected)
+            
+            # Saving a rebuilt index replaces the files, so open mappings keep their data
+            doc_lens = list(reloaded.bm25_index.doc_lens)
+            retriever.bm25_index.build([0], [['only', 'one', 'chunk']], vector_store.generation)
+            retriever.bm25_index.save()
+            assert list(reloaded.bm25_index.doc_lens) == doc_lens
+            assert list(reloaded.bm25_index.get_scores(['machine', 'learning'])) == list(expected)
+            
+            # Any mutation of the vector store invalidates the stored generation
+            vector_store.generation += 1
+            with patch.object(HybridRetriever, '_build_bm25_index') as build:
+                HybridRetriever(vector_store)
+                build.assert_called_once()
+    
+    @patch('core.rag.vectorstore.faiss_store.OpenAI')
+    def test_candidate_expansion_for_filtered_queries(self, mock_openai):
+        """Test that restrictive filters are pushed down so no expansion round is needed"""
+        mock_client = Mock()
+        mock_response = Mock()
+        mock_response.data = [
+            Mock(embedding=[0.1, 0.2, 0.3] * 100),
+            Mock(embedding=[0.2, 0.3, 0.4] * 100),
+            Mock(embedding=[0.3, 0.4, 0.5] * 100)
+        ]
+        mock_client.embeddings.create.return_value = mock_response
+        mock_openai.return_value = mock_client
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            vector_store = FAISSVectorStore(index_dir=temp_dir)
+            vector_store.add_documents(self.create_test_chunks())
+            retriever = HybridRetriever(vector_store)
+            
+            mock_client.embeddings.create.return_value.data = [
+                Mock(embedding=[0.15, 0.25, 0.35] * 100)
+            ]
+            mock_client.embeddings.create.reset_mock()
+            
+            # doc2's only chunk ranks last for this query and has no BM25 overlap
+            results = retriever.retrieve("machine learning", k=1, doc_ids=['doc2'])
+            
+            assert [r.metadata['chunk_id'] for r in results] == ['chunk3']
+            assert retriever.last_expansion_rounds == 1
+            assert retriever.stats['expansion_rounds_total'] == 1
+            
+            # The query is embedded once and reused across rounds
+            assert mock_client.embeddings.create.call_count == 1
+    
+    @patch('core.rag.vectorstore.faiss_store.OpenAI')
+    def test_retrieval_filter_pushdown(self, mock_openai):
+        """Test chunk attribute filters applied to both retrieval legs"""
+        mock_client = Mock()
+        mock_response = Mock()
+        mock_response.data = [
+            Mock(embedding=[0.1, 0.2, 0.3] * 100),
+            Mock(embedding=[0.2, 0.3, 0.4] * 100),
+            Mock(embedding=[0.3, 0.4, 0.5] * 100)
+        ]
+        mock_client.embeddings.create.return_value = mock_response
+        mock_openai.return_value = mock_client
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            chunks = self.create_test_chunks()
+            chunks[2]['metadata'].chunk_type = 'table'
+            vector_store = FAISSVectorStore(index_dir=temp_dir)
+            vector_store.add_documents(chunks)
+            retriever = HybridRetriever(vector_store)
+            
+            mock_client.embeddings.create.return_value.data = [
+                Mock(embedding=[0.15, 0.25, 0.35] * 100)
+            ]
+            
+            results = retriever.retrieve("machine learning", k=3, filters=RetrievalFilter(chunk_types=['table']))
+            assert [r.metadata['chunk_id'] for r in results] == ['chunk3']
+            
+            results = retriever.retrieve("machine learning", k=3, filters=RetrievalFilter(page_min=2, page_max=5))
+            assert [r.metadata['chunk_id'] for r in results] == ['chunk2']
+            
+            results = retriever.retrieve("machine learning", k=3, filters=RetrievalFilter(section_prefix='ai'))
+            assert [r.metadata['chunk_id'] for r in results] == ['chunk1']
+            
+            # doc_ids intersect with the filter's own document list
+            results = retriever.retrieve("machine learning", k=3, doc_ids=['doc1'],
+                                         filters=RetrievalFilter(doc_ids=['doc1', 'doc2'], page_max=1))
+            assert [r.metadata['chunk_id'] for r in results] == ['chunk1']
+            
+            # Columns follow deletions
+            vector_store.delete_documents(['doc2'])
+            assert len(vector_store.filter_ids(RetrievalFilter(chunk_types=['table']))) == 0
+            assert vector_store.filter_ids(RetrievalFilter()) is None
+    
+    @patch('core.rag.vectorstore.faiss_store.OpenAI')
+    def test_hierarchical_retrieval(self, mock_openai):
+        """Test coarse-to-fine retrieval through persisted document centroids"""
+        mock_client = Mock()
+        mock_response = Mock()
+        mock_response.data = [
+            Mock(embedding=[1.0, 0.0, 0.0] * 100),
+            Mock(embedding=[0.9, 0.1, 0.0] * 100),
+            Mock(embedding=[0.0, 0.0, 1.0] * 100)
+        ]
+        mock_client.embeddings.create.return_value = mock_response
+        mock_openai.return_value = mock_client
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            vector_store = FAISSVectorStore(index_dir=temp_dir)
+            vector_store.add_documents(self.create_test_chunks())
+            
+            # Centroids are persisted and reloaded with the index
+            vector_store = FAISSVectorStore(index_dir=temp_dir)
+            assert len(vector_store.centroids['document']) == 2
+            assert len(vector_store.centroids['section']) == 3
+            
+            retriever = HybridRetriever(vector_store, mode="hierarchical", level="document", fanout=1)
+            mock_client.embeddings.create.return_value.data = [
+                Mock(embedding=[0.0, 0.1, 1.0] * 100)
+            ]
+            
+            # BM25 matches doc1, but only doc2 is routed to by its centroid
+            results = retriever.retrieve("machine learning", k=3)
+            assert [r.metadata['chunk_id'] for r in results] == ['chunk3']
+            
+            vector_store.delete_documents(['doc2'])
+            retriever.update_index()
+            assert len(vector_store.centroids['document']) == 1
+            results = retriever.retrieve("machine learning", k=3)
+            assert sorted(r.metadata['chunk_id'] for r in results) == ['chunk1', 'chunk2']
+    
+    @patch('core.rag.vectorstore.faiss_store.OpenAI')
+    def test_global_chunk_ids(self, mock_openai):
+        """Test that chunks sharing a per-document chunk_id stay distinct"""
+        mock_client = Mock()
+        mock_response = Mock()
+        mock_response.data = [
+            Mock(embedding=[0.1, 0.2, 0.3] * 100),
+            Mock(embedding=[0.2, 0.3, 0.4] * 100),
+            Mock(embedding=[0.3, 0.4, 0.5] * 100)
+        ]
+        mock_client.embeddings.create.return_value = mock_response
+        mock_openai.return_value = mock_client
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            vector_store = FAISSVectorStore(index_dir=temp_dir)
+            chunks = self.create_test_chunks()
+            for chunk in chunks:
+                chunk['metadata'].chunk_id = 'sec_001_chunk_1'
+            vector_store.add_documents(chunks)
+            
+            assert [c['metadata'].chunk_uid for c in chunks] == [0, 1, 2]
+            
+            retriever = HybridRetriever(vector_store)
+            mock_client.embeddings.create.return_value.data = [
+                Mock(embedding=[0.15, 0.25, 0.35] * 100)
+            ]
+            results = retriever.retrieve("machine learning", k=3)
+            assert sorted(r.chunk_uid for r in results) == [0, 1, 2]
+            
+            # Deleting a document removes its IDs without re-embedding the rest
+            mock_client.embeddings.create.reset_mock()
+            vector_store.delete_documents(['doc1'])
+            assert mock_client.embeddings.create.call_count == 0
+            assert vector_store.get_stats()['total_chunks'] == 1
+            assert list(vector_store.metadata.keys()) == ['2']
+    
+    @patch('core.rag.vectorstore.faiss_store.OpenAI')
+    def test_text_arena_shares_section_text(self, mock_openai):
+        """Test that overlapping windows are stored once and read back as slices"""
+        mock_client = Mock()
+        mock_client.embeddings.create.side_effect = lambda model, input: Mock(
+            data=[Mock(embedding=[0.1 * (i + 1), 0.2, 0.3] * 100) for i in range(len(input))]
+        )
+        mock_openai.return_value = mock_client
+        
+        section = DocumentSection(
+            section_id='sec_001',
+            title='Café Results',
+            content=' '.join(f'Café revenue line {i} grew steadily.' for i in range(60)),
+            page_start=1,
+            page_end=2
+        )
+        document = DocumentSchema(metadata=DocumentMetadata(doc_id='doc1'), sections=[section])
+        chunks = TextChunker(max_tokens=60, overlap_tokens=10).chunk_document(document)
+        assert len(chunks) > 3
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            vector_store = FAISSVectorStore(index_dir=temp_dir)
+            vector_store.add_documents(chunks)
+            
+            # One copy of the section instead of one per overlapping window
+            assert len(vector_store.arena) == len(section.content.encode('utf-8'))
+            assert all('content' not in entry for entry in vector_store.metadata.values())
+            
+            reloaded = FAISSVectorStore(index_dir=temp_dir)
+            for chunk in chunks:
+                assert reloaded.get_content(chunk['metadata'].chunk_uid) == chunk['content']
+            
+            # Deleting compacts the arena down to the surviving windows
+            survivor = self.create_test_chunks()[2]
+            reloaded.add_documents([survivor])
+            reloaded.delete_documents(['doc1'])
+            assert reloaded.get_content(survivor['metadata'].chunk_uid) == survivor['content']
+            assert len(reloaded.arena) == len(survivor['content'].encode('utf-8'))
+
+    @patch('core.rag.vectorstore.faiss_store.OpenAI')
+    def test_arena_compaction_waits_for_metadata_save(self, mock_openai):
+        """Test that an unsaved compaction leaves the saved spans readable"""
+        mock_client = Mock()
+        mock_client.embeddings.create.side_effect = lambda model, input: Mock(
+            data=[Mock(embedding=[0.1 * (i + 1), 0.2, 0.3] * 100) for i in range(len(input))]
+        )
+        mock_openai.return_value = mock_client
+
+        chunks = self.create_test_chunks()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            vector_store = FAISSVectorStore(index_dir=temp_dir)
+            vector_store.add_documents(chunks)
+
+            # The process dies after compacting but before the new spans are saved
+            with patch.object(vector_store, '_save_index'):
+                vector_store.delete_documents(['doc1'])
+            assert vector_store.get_content(2) == chunks[2]['content']
+
+            reloaded = FAISSVectorStore(index_dir=temp_dir)
+            assert [reloaded.get_content(uid) for uid in range(3)] == [c['content'] for c in chunks]
+
+            # A completed save switches to the compacted file and deletes the old one
+            reloaded.delete_documents(['doc1'])
+            assert [name for name in os.listdir(temp_dir) if name.startswith('text_arena')] == ['text_arena.2.bin']
+            assert FAISSVectorStore(index_dir=temp_dir).get_content(2) == chunks[2]['content']
+
+    @patch('core.rag.vectorstore.faiss_store.OpenAI')
+    def test_streaming_ingest_in_micro_batches(self, mock_openai):
+        """Test that a chunk generator is embedded in bounded batches and saved once"""
+        mock_client = Mock()
+        batch_sizes = []
+        
+        def create_embeddings(model, input):
+            batch_sizes.append(len(input))
+            return Mock(data=[Mock(embedding=[0.1 * (i + 1), 0.2, 0.3] * 100) for i in range(len(input))])
+        
+        mock_client.embeddings.create.side_effect = create_embeddings
+        mock_openai.return_value = mock_client
+        
+        section = DocumentSection(
+            section_id='sec_001',
+            title='Results',
+            content=' '.join(f'Revenue line {i} grew steadily.' for i in range(60)),
+            page_start=1,
+            page_end=2
+        )
+        document = DocumentSchema(metadata=DocumentMetadata(doc_id='doc1'), sections=[section])
+        chunker = TextChunker(max_tokens=60, overlap_tokens=10)
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            vector_store = FAISSVectorStore(index_dir=temp_dir)
+            with patch.object(vector_store, '_save_index', wraps=vector_store._save_index) as save:
+                added = vector_store.add_documents_stream(chunker.iter_chunks(document), batch_size=2)
+            
+            expected = chunker.chunk_document(document)
+            assert added == len(expected) > 4
+            assert max(batch_sizes) == 2
+            assert sum(batch_sizes) == added
+            save.assert_called_once()
+            assert vector_store.generation == 1
+            
+            # Windows split across batches still share one copy of the section
+            assert len(vector_store.arena) == len(section.content.encode('utf-8'))
+            assert [vector_store.get_content(uid) for uid in range(added)] == [c['content'] for c in expected]
+
+    @patch('core.rag.vectorstore.faiss_store.OpenAI')
+    def test_failed_stream_rolls_back(self, mock_openai):
+        """Test that an embedding failure mid-stream leaves the last saved state intact"""
+        mock_client = Mock()
+        calls = []
+
+        def create_embeddings(model, input):
+            calls.append(len(input))
+            if len(calls) == 3:
+                raise RuntimeError("embedding service unavailable")
+            return Mock(data=[Mock(embedding=[0.1 * len(calls), 0.2, 0.3] * 100) for _ in input])
+
+        mock_client.embeddings.create.side_effect = create_embeddings
+        mock_openai.return_value = mock_client
+
+        chunks = self.create_test_chunks()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            vector_store = FAISSVectorStore(index_dir=temp_dir)
+            vector_store.add_documents(chunks[:1])
+            saved = {uid: dict(entry) for uid, entry in vector_store.metadata.items()}
+
+            # The second batch fails after the first one was indexed
+            with pytest.raises(RuntimeError):
+                vector_store.add_documents_stream(chunks[1:], batch_size=1)
+
+            assert vector_store.metadata == saved
+            assert vector_store.index.ntotal == 1
+            assert vector_store.next_chunk_uid == 1
+            assert vector_store.generation == 1
+            assert vector_store.dedup.find(chunks[1]['content'])[0] is None
+            assert vector_store.filter_ids(RetrievalFilter(doc_ids=['doc1'])).tolist() == [0]
+
+            # Re-ingesting the same chunks works once the service recovers
+            assert vector_store.add_documents_stream(chunks[1:], batch_size=1) == 2
+            assert vector_store.index.ntotal == 3
+            assert [vector_store.get_content(uid) for uid in range(3)] == [c['content'] for c in chunks]
+
+    @patch.dict(os.environ, {'DEDUP_NEAR_DUPLICATES': 'true'})
+    @patch('core.rag.vectorstore.faiss_store.OpenAI')
+    def test_duplicate_chunks_share_canonical_vector(self, mock_openai):
+        """Test exact and near-duplicate chunks are not embedded and keep their provenance"""
+        mock_client = Mock()
+        embedded = []
+
+        def create_embeddings(model, input):
+            embedded.extend(input)
+            return Mock(data=[Mock(embedding=[0.1 * (len(embedded) - i), 0.2, 0.3] * 100) for i in range(len(input))])
+
+        mock_client.embeddings.create.side_effect = create_embeddings
+        mock_openai.return_value = mock_client
+
+        boilerplate = ('Forward-looking statements in this report involve risks and uncertainties '
+                       'that could cause actual results to differ materially from those projected, '
+                       'including changes in market conditions, regulation and competition. Readers '
+                       'should not place undue reliance on these statements, which speak only as of '
+                       'the date they are made. The company undertakes no obligation to update or '
+                       'revise any forward-looking statement, whether as a result of new information, '
+                       'future events or otherwise, except as required by applicable securities law. '
+                       'Additional factors are described under risk factors in the annual filing.')
+        chunks = self.create_test_chunks()
+        for i, (doc_id, content) in enumerate([
+            ('doc1', boilerplate),
+            ('doc2', boilerplate),  # Exact duplicate
+            ('doc3', boilerplate.replace('this report', 'this annual report'))  # Near duplicate
+        ]):
+            chunks.append({
+                'content': content,
+                'metadata': ChunkMetadata(
+                    doc_id=doc_id, chunk_id=f'legal_{i}', page_start=9, page_end=9,
+                    section_id='legal', heading_chain=['Legal'], chunk_type='text', token_count=30
+                )
+            })
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            vector_store = FAISSVectorStore(index_dir=temp_dir)
+            vector_store.add_documents(chunks)
+
+            assert len(embedded) == 4
+            assert vector_store.index.ntotal == 4
+            assert vector_store.get_stats()['duplicate_chunks'] == 2
+            assert vector_store.canonical_of == {4: 3, 5: 3}
+            assert vector_store.get_content(4) == boilerplate
+            assert 'annual report' in vector_store.get_content(5)
+
+            # A filtered query reaches the duplicate through the canonical vector
+            retriever = HybridRetriever(vector_store)
+            results = retriever.retrieve("forward-looking risks", k=3,
+                                         filters=RetrievalFilter(doc_ids=['doc2'], page_min=9))
+            assert [r.chunk_uid for r in results] == [4]
+            citation = results[0].to_citation()
+            assert citation.doc_id == 'doc2'
+            assert {source['doc_id'] for source in citation.also_found_in} == {'doc1', 'doc3'}
+
+            # Deleting the canonical copy promotes a duplicate without re-embedding
+            vector_store.delete_documents(['doc1'])
+            assert len(embedded) == 5  # Only the query above was embedded
+            assert vector_store.index.ntotal == 2
+            assert vector_store.canonical_of == {5: 4}
+
+            reloaded = FAISSVectorStore(index_dir=temp_dir)
+            assert reloaded.canonical_of == {5: 4}
+            assert reloaded.dedup.find(boilerplate)[0] == 4
+            uids, _ = reloaded.search_ids(reloaded.index.reconstruct(4).reshape(1, -1), k=1,
+                                          allowed_ids=reloaded.filter_ids(RetrievalFilter(doc_ids=['doc3'])))
+            assert uids.tolist() == [5]
+
+    @patch('core.rag.vectorstore.faiss_store.OpenAI')
+    def test_near_duplicates_stay_searchable_by_default(self, mock_openai):
+        """Test that a near duplicate keeps its own vector and its distinct terms match lexically"""
+        mock_client = Mock()
+        embedded = []
+
+        def create_embeddings(model, input):
+            embedded.extend(input)
+            return Mock(data=[Mock(embedding=[0.1 * (len(embedded) - i), 0.2, 0.3] * 100) for i in range(len(input))])
+
+        mock_client.embeddings.create.side_effect = create_embeddings
+        mock_openai.return_value = mock_client
+
+        clause = ('The supplier shall deliver all goods to the buyer at the agreed location within thirty days '
+                  'of the purchase order, bear the risk of loss until delivery, and replace any goods found '
+                  'to be defective on inspection at its own cost and without undue delay. The buyer may '
+                  'withhold payment for defective goods until they are replaced, and either party may '
+                  'terminate this agreement on sixty days written notice if the other party materially '
+                  'breaches it and fails to cure the breach within that period.')
+        chunks = self.create_test_chunks()
+        for i, (doc_id, content) in enumerate([
+            ('doc1', clause),
+            ('doc2', clause),  # Exact duplicate
+            ('doc3', clause.replace('thirty days', 'thirty days, perishables'))
+        ]):
+            chunks.append({
+                'content': content,
+                'metadata': ChunkMetadata(
+                    doc_id=doc_id, chunk_id=f'clause_{i}', page_start=1, page_end=1,
+                    section_id='terms', heading_chain=['Terms'], chunk_type='text', token_count=40
+                )
+            })
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            vector_store = FAISSVectorStore(index_dir=temp_dir)
+            vector_store.add_documents(chunks)
+
+            assert len(embedded) == 5
+            assert vector_store.canonical_of == {4: 3}
+
+            # Only the lexical leg is weighted; the mocked query vector carries no meaning
+            retriever = HybridRetriever(vector_store, alpha=0.0)
+            results = retriever.retrieve("perishables", k=1)
+            assert results[0].chunk_uid == 5
+            assert results[0].metadata['doc_id'] == 'doc3'
+            assert 'perishables' in results[0].content
+
+    @patch('core.rag.vectorstore.faiss_store.OpenAI')
+    def test_update_document_embeds_only_changed_chunks(self, mock_openai):
+        """Test re-ingesting a revised document keeps unchanged chunks and tombstones removed ones"""
+        mock_client = Mock()
+        embedded = []
+
+        def create_embeddings(model, input):
+            embedded.extend(input)
+            return Mock(data=[Mock(embedding=[0.1 * (len(embedded) - i), 0.2, 0.3] * 100) for i in range(len(input))])
+
+        mock_client.embeddings.create.side_effect = create_embeddings
+        mock_openai.return_value = mock_client
+
+        def document(contents):
+            sections = [DocumentSection(section_id=f'sec_{i:03d}', title=f'Section {i}', content=content,
+                                        page_start=i + 1, page_end=i + 1)
+                        for i, content in enumerate(contents)]
+            return DocumentSchema(metadata=DocumentMetadata(doc_id='doc1'), sections=sections)
+
+        chunker = TextChunker(max_tokens=200, overlap_tokens=20)
+        original = document(['Revenue grew in every segment.', 'Costs were flat.', 'Outlook is cautious.'])
+        revised = document(['Revenue grew in every segment.', 'Costs fell sharply.', 'Outlook is cautious.'])
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            vector_store = FAISSVectorStore(index_dir=temp_dir)
+            vector_store.add_documents_stream(chunker.iter_chunks(original))
+            uids = {vector_store.get_content(uid): uid for uid in range(3)}
+            embedded.clear()
+
+            # sec_000 is known unchanged; sec_002 is re-chunked but matches by content hash
+            revised_sections = revised.copy(update={'sections': revised.sections[1:]})
+            changes = vector_store.update_document('doc1', chunker.iter_chunks(revised_sections),
+                                                   keep_sections=['sec_000'])
+
+            assert changes == {'added': 1, 'unchanged': 2, 'removed': 1}
+            assert embedded == ['Costs fell sharply.']
+            assert vector_store.index.ntotal == 3
+            assert vector_store.generation == 2
+            contents = {vector_store.get_content(int(uid)): int(uid) for uid in vector_store.metadata}
+            assert set(contents) == {'Revenue grew in every segment.', 'Costs fell sharply.', 'Outlook is cautious.'}
+            assert contents['Outlook is cautious.'] == uids['Outlook is cautious.']
+            assert 'Costs were flat.' not in contents
+            assert len(vector_store.filter_ids(RetrievalFilter(doc_ids=['doc1']))) == 3
+
+            # Matched chunks are rewritten in place, so attribute rows stay in chunk ID order
+            assert vector_store.attributes.chunk_uids.tolist() == sorted(contents.values())
+
+    @patch('core.rag.pipeline.ExtractorFactory.get_extractor')
+    @patch('core.rag.generation.report_generator.OpenAI')
+    @patch('core.rag.vectorstore.faiss_store.OpenAI')
+    def test_failed_update_is_retried_against_previous_revision(self, mock_openai, mock_generator_openai, get_extractor):
+        """Test that a failed re-ingest keeps the stored revision, so the retry re-embeds its changes"""
+        mock_client = Mock()
+        embedded = []
+        failing = []
+
+        def create_embeddings(model, input):
+            if failing:
+                raise RuntimeError("embedding service unavailable")
+            embedded.extend(input)
+            return Mock(data=[Mock(embedding=[0.1 * (len(embedded) - i), 0.2, 0.3] * 100) for i in range(len(input))])
+
+        mock_client.embeddings.create.side_effect = create_embeddings
+        mock_openai.return_value = mock_client
+
+        def document(contents):
+            sections = [DocumentSection(section_id=f'sec_{i:03d}', title=f'Section {i}', content=content,
+                                        page_start=i + 1, page_end=i + 1)
+                        for i, content in enumerate(contents)]
+            return DocumentSchema(metadata=DocumentMetadata(doc_id=f'doc_{len(embedded)}'), sections=sections)
+
+        original = ['Revenue grew in every segment.', 'Costs were flat.']
+        revised = ['Revenue grew in every segment.', 'Costs fell sharply.']
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            directories = {'DATA_DIR': temp_dir, 'STRUCTURED_DIR': os.path.join(temp_dir, 'structured'),
+                           'INDEX_DIR': os.path.join(temp_dir, 'index'), 'USE_RERANKER': 'false'}
+            with patch.dict(os.environ, directories):
+                pipeline = RAGPipeline()
+                get_extractor.return_value.extract.side_effect = lambda *args, **kwargs: document(original)
+                doc_id = pipeline.ingest_document(b'v1', source_key='report', filename='report.pdf')['doc_id']
+
+                get_extractor.return_value.extract.side_effect = lambda *args, **kwargs: document(revised)
+                failing.append(True)
+                with pytest.raises(RuntimeError):
+                    pipeline.ingest_document(b'v2', source_key='report', filename='report.pdf')
+                assert pipeline._load_structured(doc_id).sections[1].content == 'Costs were flat.'
+
+                failing.clear()
+                embedded.clear()
+                result = pipeline.ingest_document(b'v2', source_key='report', filename='report.pdf')
+
+            assert result['doc_id'] == doc_id
+            assert embedded == ['Costs fell sharply.']
+            assert result['changes']['added'] == 1 and result['changes']['removed'] == 1
+            contents = {pipeline.vector_store.get_content(int(uid)) for uid in pipeline.vector_store.metadata}
+            assert contents == set(revised)
+
+    def test_reranker_reorders_and_caches(self):
+        """Test that the reranker reorders the fused head and caches scores"""
+        results = [
+            Hit(i, 1.0 - i * 0.1, chunk['content'], chunk['metadata'].dict())
+            for i, chunk in enumerate(self.create_test_chunks())
+        ]
+        
+        model = Mock()
+        model.predict.side_effect = lambda pairs, **kwargs: [
+            0.9 if 'revenue' in text else 0.1 for _, text in pairs
+        ]
+        reranker = CrossEncoderReranker(model=model, batch_size=2)
+        
+        reranked = reranker.rerank("revenue growth", results)
+        assert reranked[0].metadata['chunk_id'] == 'chunk3'
+        assert model.predict.call_count == 2  # 3 candidates in batches of 2
+        
+        # Second call is served entirely from the score cache
+        reranker.rerank("revenue growth", reranked)
+        assert model.predict.call_count == 2
+        assert reranker.stats['cache_hits'] == 3
+    
+    def test_reranker_budget_falls_back_to_fused_order(self):
+        """Test that an exhausted time budget returns the fused order"""
+        results = [
+            Hit(i, 1.0 - i * 0.1, chunk['content'], chunk['metadata'].dict())
+            for i, chunk in enumerate(self.create_test_chunks())
+        ]
+        
+        model = Mock()
+        model.predict.side_effect = lambda pairs, **kwargs: [0.5] * len(pairs)
+        reranker = CrossEncoderReranker(model=model, batch_size=1, time_budget_ms=0)
+        
+        reranked = reranker.rerank("revenue growth", results)
+        assert [r.metadata['chunk_id'] for r in reranked] == ['chunk1', 'chunk2', 'chunk3']
+        assert reranker.stats['budget_exhausted'] == 1
+    
+    def test_mmr_is_invariant_to_relevance_scale(self):
+        """Test that MMR picks the same results for fused and cross-encoder score scales"""
+        contents = ['revenue grew in every segment', 'revenue grew in every segment', 'costs were flat']
+        retriever = HybridRetriever.__new__(HybridRetriever)
+        retriever.vector_store = Mock(get_content=lambda uid: contents[uid])
+        
+        chunk_uids = np.arange(3, dtype=np.int64)
+        fused = np.array([1.0, 0.6, 0.5])
+        selected = [retriever._apply_mmr(chunk_uids, scores, k=2)[0].tolist()
+                    for scores in (fused, fused * 10 - 3)]
+        
+        # The near-identical second chunk loses to the distinct third on both scales
+        assert selected == [[0, 2], [0, 2]]
+
+    def test_fused_tail_does_not_compete_with_reranked_head(self):
+        """Test that MMR only compares cross-encoder scores and the tail fills spare slots"""
+        contents = ['revenue grew in q1', 'revenue grew in q2', 'revenue grew in q3', 'costs were flat']
+        retriever = HybridRetriever.__new__(HybridRetriever)
+        retriever.vector_store = Mock(get_content=lambda uid: contents[uid],
+                                      get_hit=lambda uid, score: Hit(uid, score, contents[uid], {}))
+        logits = {0: 12.0, 1: -4.0, 2: -5.0}
+        retriever.reranker = Mock(top_n=3)
+        retriever.reranker.rerank.side_effect = lambda query, hits: [
+            Hit(hit.chunk_uid, logits[hit.chunk_uid], hit.content, hit.metadata) for hit in hits
+        ]
+
+        chunk_uids = np.arange(4, dtype=np.int64)
+        fused = np.array([0.033, 0.032, 0.031, 0.016])
+
+        # The distinct fused tail chunk would beat the low logits if both scales were mixed
+        uids, scores = retriever._rerank_and_diversify("revenue", chunk_uids, fused, k=2)
+        assert uids.tolist() == [0, 1]
+        assert scores.tolist() == [12.0, -4.0]
+
+        uids, scores = retriever._rerank_and_diversify("revenue", chunk_uids, fused, k=4)
+        assert uids.tolist() == [0, 1, 2, 3]
+        assert scores[-1] == 0.016